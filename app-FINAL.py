@@ -1,93 +1,29 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors # Import for potential future use or consistency
-from datetime import datetime
 import numpy as np
-from scipy.optimize import minimize
-import os # For checking if openpyxl is available
-
-# --- Risk Questionnaire Definitions ---
-questions = {
-    1: {"question": "How old are you?", "options": ["Over 60", "45-60", "30-44", "Under 30"], "scores": [1, 2, 3, 4]},
-    2: {"question": "What is your investment experience?", "options": ["I don’t have any experience", "I have some experience", "I have a strong educational background in a related field", "I’m an experienced investor"], "scores": [1, 2, 3, 4]},
-    3: {"question": "What is an ETF?", "options": ["I don’t know", "A diversified investment fund that only trades commodities", "A diversified, index-tracking investment fund that does not trade on exchanges", "A diversified, index-tracking investment fund that trades on exchanges"], "scores": [1, 2, 3, 4]},
-    4: {"question": "Main goal of your investment", "options": ["Capital preservation", "Conservative investment", "General investment", "Capital growth"], "scores": [1, 2, 3, 4]},
-    5: {"question": "What is your investment horizon?", "options": ["<5 years", "5-10 years", "10-15 years", ">15 years"], "scores": [1, 2, 3, 4]},
-    6: {"question": "Do you prefer guaranteed small gains or potential big gains with risk?", "options": ["Guarantees only", "Smaller gains and contained risk", "Moderate gain and moderate risk", "Big gains with high risk"], "scores": [1, 2, 3, 4]},
-    7: {"question": "What is your tolerance of market swings?", "options": ["Low", "Medium-low", "Medium-high", "High"], "scores": [1, 2, 3, 4]},
-    8: {"question": "Do you prefer a strategy that:", "options": ["It is able to provide reassurance during high volatile market periods", "It is aligned with Stock market Performance", "It is aligned with Bond market Performance", "Tries to Beat the market"], "scores": [1, 2, 3, 4]},
-    9: {"question": "What’s the worst-case decline you’re comfortable seeing in 1 year?", "options": ["Less than 10%", "10-20%", "20-30%", "More than 30%"], "scores": [1, 2, 3, 4]},
-    10: {"question": "What would you do if you hear the market is down 20%?", "options": ["I sell a majority of my financial assets", "I sell a minority of my financial assets", "I maintain my position", "I buy more"], "scores": [1, 2, 3, 4]},
-    11: {"question": "Do you have any preference for ESG (environmental, social, governance) investments?", "options": ["Yes, I want a portfolio with sustainable investments", "No, I don’t take the sustainable factor into consideration"], "scores": [4, 1]},
-    12: {"question": "Do you have any preference for the investment strategy of your Roboadvisor?", "options": ["Yes, I want an active strategy", "No, I want a passive strategy"], "scores": [4, 1]}
-}
-
-# --- Portfolio Data (for fixed allocation scenario) ---
-# This data will be used if Q11 and Q12 are both "yes"
-portfolio_data_fixed = {
-    2: {
-        'category_allocation': {'Bond': 1.00, 'Equity': 0.00, 'others': 0.00},
-        'specific_etf_allocation': {'SUSB': 0.45, 'EAGG': 0.41, 'VCEB': 0.14}
-    },
-    3: {
-        'category_allocation': {'Bond': 1.0, 'Equity': 0.0, 'Others': 0.00},
-        'specific_etf_allocation': {'SUSB': 0.5, 'EAGG': 0.36, 'VCEB': 0.14}
-    },
-    4: {
-        'category_allocation': {'Bond': 0.89, 'Equity': 0.11, 'Others': 0.00},
-        'specific_etf_allocation': {'SUSB': 0.4493, 'EAGG': 0.1902, 'VCEB': 0.2591, 'ESGV': 0.0507, 'USSG': 0.0507}
-    },
-    5: {
-        'category_allocation': {'Bond': 0.75, 'Equity': 0.25, 'Others': 0.00},
-        'specific_etf_allocation': {'SUSB': 0.133, 'EAGG': 0.133, 'VCEB': 0.134, 'ESGV': 0.30, 'USSG': 0.30}
-    },
-    6: {
-        'category_allocation': {'Bond': 0.63, 'Equity': 0.37, 'Others': 0.00},
-        'specific_etf_allocation': {'SUSB': 0.061 ,'EAGG': 0.3764, 'VCEB': 0.19, 'USSG': 0.1863, 'ESGU': 0.1863}
-    },
-    7: {
-        'category_allocation': {'Bond': 0.00, 'Equity': 1.0, 'Others': 0.0},
-        'specific_etf_allocation': {'ESGV': 0.1, 'USSG': 0.55, 'ESGU': 0.35}
-    },
-    8: {
-        'category_allocation': {'Bond': 0.00, 'Equity': 0.61, 'Others': 0.39},
-        'specific_etf_allocation': {'ESGV': 0.2535, 'USSG': 0.2265, 'ESGU': 0.2335, 'GRES':0.1365, 'NURE':0.15}
-    },
-    9: {
-        'category_allocation': {'Bond': 0.00, 'Equity': 0.90, 'Real Estate': 0.10, 'Cash': 0.00},
-        'specific_etf_allocation': {'ESGV': 0.3353, 'USSG': 0.3353, 'ESGU': 0.30, 'GRES':0.1647, 'NURE':0.1647}
-    },
-}
-
-# --- Portfolio Data (for optimization scenario, from mean_var_esg.py) ---
-# This data defines the universe of assets available for optimization for each risk level
-risk_level_assets_optimized = {
-    2: ['SUSB','EAGG','VCEB'],
-    3: ['SUSB','EAGG','VCEB'],
-    4: ['SUSB','EAGG','VCEB','ESGV','USSG','ESGU'],
-    5: ['SUSB','EAGG','VCEB','ESGV','USSG','ESGU'],
-    6: ['SUSB', 'EAGG', 'ESGV', 'USSG', 'ESGU'],
-    7: ['ESGV','USSG','ESGU'],
-    8: ['ESGV','USSG','ESGU','GRES','NURE'],
-    9: ['ESGV','USSG','ESGU','GRES','NURE']
-}
-
-# Mapping ETFs to their categories (used in both scenarios for plotting)
-etf_to_category = {
-    'SUSB': 'Bond', 'EAGG': 'Bond', 'VCEB': 'Bond',
-    'ESGV': 'Equity', 'USSG': 'Equity', 'ESGU': 'Equity', 'VOO': 'Equity', 'IBIT': 'Equity',
-    'XLRE': 'Real Estate', 'SCHH': 'Real Estate',
-}
-
+import importlib.util # For checking if openpyxl is available
+from price_store import PriceStore
+from price_providers import provider_from_env, fetch_prices
+from returns_matrix import shared_returns_matrix
+from moments import shared_moment_cache
+from constraints import compile_constraints, constraint_specs_from_fixed
+from universes import (analysis_end_date, analysis_start_date, investment_horizon_years, optimization_constraints,
+                       projection_settings, questions, rebalancing_settings, resampling_settings, risk_level_objectives,
+                       stress_test_settings, universe_download_tickers, universes, walk_forward_settings)
+from scoring import risk_profile
+from figure_cache import FigureCache
+# matplotlib and the analysis modules (which load scipy) are imported on the results page, the only one that uses them
+
+# --- Portfolio Data ---
+# Fixed portfolios, optimizable assets and categories of this app's universe (see universes.py)
+universe = 'esg'
+portfolio_data_fixed = universes[universe]['portfolio_data_fixed']
+risk_level_assets_optimized = universes[universe]['risk_level_assets_optimized']
+etf_to_category = universes[universe]['etf_to_category']
+benchmark_etf = universes[universe]['benchmark_etf']
 
 # Define all unique tickers across both fixed and optimized portfolios, plus risk-free rate
-all_unique_tickers_for_download = sorted(list(set(
-    [etf for data in portfolio_data_fixed.values() for etf in data['specific_etf_allocation'].keys()] +
-    [etf for tickers_list in risk_level_assets_optimized.values() for etf in tickers_list] +
-    ['^IRX'] # Add ^IRX for risk-free rate
-)))
+all_unique_tickers_for_download = universe_download_tickers[universe]
 
 # --- Plotting Functions (shared) ---
 def plot_pie_chart_with_details(data_dict, title, figsize=(9, 9), autopct='%1.1f%%', startangle=140):
@@ -113,183 +49,284 @@ def plot_pie_chart_with_details(data_dict, title, figsize=(9, 9), autopct='%1.1f
     ax.axis('equal')
     return fig # Return the figure object for Streamlit
 
-# --- Functions for Portfolio Optimization ---
-@st.cache_data # Cache this function to avoid re-downloading data
-def download_historical_prices(tickers, start_date, end_date):
-    """Downloads historical 'Adj Close' price data from Yahoo Finance for a given period."""
-    if not tickers:
-        st.error("No tickers provided for download.")
-        #
-        return pd.DataFrame(), pd.DataFrame(), 0.0 # Changed to return three values
-
-    st.info(f"Downloading historical data for {tickers} from {start_date} to {end_date}...")
-    try:
-        data = yf.download(tickers, start=start_date, end=end_date, progress=False)
-        if data.empty:
-            st.error("No data downloaded. Check ticker symbols or date range.")
-    
-            return pd.DataFrame(), pd.DataFrame(), 0.0 # Changed to return three values
-
-        if 'Adj Close' in data.columns:
-            price_data = data['Adj Close']
-        elif 'Close' in data.columns:
-            price_data = data['Close']
-        else:
-            # Handle case where data might be a single Series or DataFrame with one column
-            if isinstance(data, pd.DataFrame) and len(data.columns) == 1:
-                price_data = data.iloc[:, 0]
-            elif isinstance(data, pd.Series):
-                price_data = data
-            else:
-                return pd.DataFrame(), pd.DataFrame(), 0.0 # Changed to return three values
-
-        if isinstance(price_data, pd.Series): # Ensure it's a DataFrame for consistency
-            price_data = price_data.to_frame()
+def plot_efficient_frontier(frontier, optimal_point, title, random_cloud=None, figsize=(10, 6)):
+    fig, ax = plt.subplots(figsize=figsize)
+    if random_cloud is not None:
+        sample = random_cloud['sample']
+        points = ax.scatter(sample[:, 1] * 100, sample[:, 0] * 100, c=sample[:, 2], cmap='viridis', s=4, alpha=0.4)
+        fig.colorbar(points, ax=ax, label='Sharpe Ratio')
+        ax.plot(random_cloud['hull_volatility'] * 100, random_cloud['hull_return'] * 100, color='gray',
+                linestyle='--', label=f"Best of {random_cloud['count']:,} Random Portfolios")
+    ax.plot(frontier['volatility'] * 100, frontier['return'] * 100, label='Efficient Frontier')
+    ax.scatter([optimal_point['volatility'][0] * 100], [optimal_point['return'][0] * 100],
+               color='red', marker='*', s=200, zorder=3, label='Optimized Portfolio')
+    ax.set_title(title)
+    ax.set_xlabel('Annualized Volatility (%)')
+    ax.set_ylabel('Annualized Return (%)')
+    ax.grid(True)
+    ax.legend()
+    return fig
 
-        price_data = price_data.dropna(axis=1, how='all') # Drop columns that are all NaN
-        price_data = price_data.dropna(axis=0, how='all') # Drop rows that are all NaN
-        
-        if price_data.empty:
-            st.error("After cleaning, no valid price data remains.")
-        
-            return pd.DataFrame(), pd.DataFrame(), 0.0 # Changed to return three values
-
-        # --- risk_free_rate_annual ---
-        risk_free_rate_annual = 0.0
-        if '^IRX' in price_data.columns: # Check if '^IRX' is in the final price_data
-            rf_series = price_data['^IRX'].dropna()
-            if not rf_series.empty:
-                daily_risk_free_rate = rf_series.mean() / 100.0 / 252 # Convert to daily rate if ^IRX is annual in data
-                risk_free_rate_annual = (1 + daily_risk_free_rate)**252 - 1
-                st.info(f"Calculated Annual Risk-Free Rate: {risk_free_rate_annual*100:.2f}%")
-            else:
-                st.warning("No valid risk-free rate data (^IRX) for the specified period. Using 0 as risk-free rate for Sharpe calculation.")
-        else:
-            st.warning("'^IRX' ticker not found in downloaded data. Using 0 as risk-free rate for Sharpe calculation.")
-        
-        prices_for_portfolios = price_data.drop(columns=['^IRX'], errors='ignore')
-        returns_data = prices_for_portfolios.pct_change().dropna(axis=0, how='all').dropna(axis=1, how='all')
-        
-        return prices_for_portfolios, returns_data, risk_free_rate_annual
-    except Exception as e:
-        st.error(f"Error downloading or processing data: {e}")
+def plot_growth_chart(dates, values, title, figsize=(12, 6)):
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.plot(dates, values)
+    ax.set_title(title)
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Portfolio Value (Indexed)')
+    ax.grid(True)
+    return fig
 
-        return pd.DataFrame(), pd.DataFrame(), 0.0 # Changed to return three values
+def plot_fixed_levels_chart(growth_table, highlighted_level, figsize=(12, 6)):
+    fig, ax = plt.subplots(figsize=figsize)
+    for level, growth in growth_table.items():
+        ax.plot(growth.index, growth.values, label=f'Risk Level {level}', linewidth=2.5 if level == highlighted_level else 1)
+    ax.set_title('Fixed Portfolios Over Time (Indexed to 100)')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Portfolio Value (Indexed)')
+    ax.legend()
+    ax.grid(True)
+    return fig
+
+def plot_wealth_projection(bands, figsize=(12, 6)):
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.fill_between(bands.index, bands[0.05], bands[0.95], alpha=0.2, label='5th-95th Percentile')
+    ax.fill_between(bands.index, bands[0.25], bands[0.75], alpha=0.4, label='25th-75th Percentile')
+    ax.plot(bands.index, bands[0.5], label='Median')
+    ax.set_title('Projected Portfolio Value (Indexed to 100)')
+    ax.set_xlabel('Years')
+    ax.set_ylabel('Portfolio Value (Indexed)')
+    ax.legend()
+    ax.grid(True)
+    return fig
+
+@st.cache_resource # One chart cache per process: identical charts are drawn once for every session
+def get_figure_cache():
+    return FigureCache()
+
+def show_chart(plot_function, *args, **kwargs):
+    """Shows plot_function(*args, **kwargs) as an image from the figure cache; False when there was nothing to plot."""
+    chart = get_figure_cache().render(plot_function, *args, **kwargs)
+    if chart is None:
+        return False
+    st.image(chart)
+    return True
 
+# --- Functions for Portfolio Optimization ---
+def show_diagnostics(diagnostics):
+    # Shows the info/warning/error messages returned by the recommendation engine
+    for item in diagnostics:
+        getattr(st, item['level'])(item['message'])
 
-def portfolio_variance(weights, covariance):
-    return weights.T @ covariance @ weights
+@st.cache_resource # One on-disk price store per process, shared by every session
+def get_price_store():
+    return PriceStore()
 
-def portfolio_return(weights, returns):
-    return weights.T @ returns
+@st.cache_resource # Provider is chosen once per process (PRICE_PROVIDER / PRICE_FIXTURE_PATH)
+def get_price_provider():
+    return provider_from_env()
 
-def negative_sharpe_ratio(weights, mean_returns, covariance, risk_free_rate_annual):
-    port_ret_daily = portfolio_return(weights, mean_returns)
-    port_std_daily = np.sqrt(portfolio_variance(weights, covariance))
+@st.cache_data # Cache this function to avoid re-reading the store on every rerun
+def download_historical_prices(tickers, start_date, end_date):
+    """Loads historical 'Adj Close' or 'Close' prices, fetching from the configured provider only the date ranges not yet stored on disk."""
+    market_data = load_market_data(tickers, start_date, end_date, get_price_provider(), get_price_store())
+    show_diagnostics(market_data['diagnostics'])
+    return market_data['prices'], market_data['returns'], market_data['risk_free_rate_annual']
 
-    annual_port_ret = (1 + port_ret_daily)**252 - 1
-    annual_port_std = port_std_daily * np.sqrt(252)
-    
-    if annual_port_std == 0:
-        return -np.inf if annual_port_ret - risk_free_rate_annual > 0 else np.inf
-    
-    sharpe = (annual_port_ret - risk_free_rate_annual) / annual_port_std
-    return -sharpe
+@st.cache_resource # One read-only returns matrix per data snapshot, shared by every session
+def get_returns_matrix(tickers, start_date, end_date):
+    _, returns_data, _ = download_historical_prices(tickers, start_date, end_date)
+    return shared_returns_matrix(returns_data)
 
-def optimize_portfolio(returns_df, tickers, risk_free_rate_annual):
-    asset_returns = returns_df[tickers].dropna(axis=0, how='any')
 
-    if asset_returns.empty or asset_returns.shape[0] < 2:
-        st.warning(f"Warning: Not enough valid return data available for optimization with tickers: {tickers}.")
+def risk_level_constraints(tickers, risk_level):
+    # The optimized portfolio's constraints, so the frontier and the random cloud cover the portfolios it could pick
+    constraint_specs = constraint_specs_from_fixed(portfolio_data_fixed, etf_to_category, **optimization_constraints)
+    if risk_level not in constraint_specs:
         return None
-
-    mean_returns = asset_returns.mean()
-    covariance_matrix = asset_returns.cov()
-    num_assets = len(tickers)
-
-    if num_assets == 0:
+    return compile_constraints(list(tickers), **constraint_specs[risk_level])
+
+@st.cache_data # The frontier depends only on the data snapshot, the universe and the risk level's constraints, so all users share it
+def compute_efficient_frontier(snapshot_key, tickers, risk_level, risk_free_rate_annual, _moment_cache, num_points=100):
+    mean_returns, covariance_matrix = _moment_cache.moments(list(tickers))
+    return efficient_frontier(mean_returns, covariance_matrix, risk_free_rate_annual, num_points,
+                              constraints=risk_level_constraints(tickers, risk_level))
+
+@st.cache_data # Same reasoning as the frontier: one random-portfolio cloud per snapshot, universe and risk level
+def compute_random_portfolios(snapshot_key, tickers, risk_level, risk_free_rate_annual, _moment_cache, num_samples=200_000):
+    mean_returns, covariance_matrix = _moment_cache.moments(list(tickers))
+    return simulate_random_portfolios(mean_returns, covariance_matrix, risk_free_rate_annual, num_samples,
+                                      constraints=risk_level_constraints(tickers, risk_level))
+
+@st.cache_data # Optimized portfolios depend only on the data snapshot, so every level is solved once for all users
+def compute_risk_level_table(snapshot_key, risk_free_rate_annual, _moment_cache, engine=None):
+    return optimize_universe(_moment_cache, universe, risk_free_rate_annual, engine or DEFAULT_ENGINE)
+
+@st.cache_data # Every level's walk-forward backtest depends only on the longer history snapshot
+def compute_walk_forward_table(snapshot_key, risk_free_rate_annual, _returns_matrix, engine=None):
+    constraint_specs = constraint_specs_from_fixed(portfolio_data_fixed, etf_to_category, **optimization_constraints)
+    return walk_forward_all_levels(_returns_matrix, risk_level_assets_optimized, risk_free_rate_annual,
+                                   walk_forward_settings['window'], walk_forward_settings['step'], walk_forward_settings['expanding'],
+                                   engine or DEFAULT_ENGINE, objectives=risk_level_objectives, constraint_specs=constraint_specs,
+                                   processes=1) # Inline: a process pool per cache miss would compete with the server's sessions
+
+@st.cache_data # Keyed by the snapshot and the allocation, so identical portfolios are simulated once
+def compute_rebalancing_comparison(snapshot_key, allocation_items, risk_free_rate_annual, _returns_matrix):
+    allocation = dict(allocation_items)
+    tickers = [t for t in allocation if t in _returns_matrix.column_index]
+    if not tickers:
         return None
-
-    initial_weights = np.array([1/num_assets] * num_assets)
-    bounds = tuple((0, 1) for _ in range(num_assets))
-    constraints = ({'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1, 'jac': lambda weights: np.ones_like(weights)})
-
-    optimized_results = minimize(negative_sharpe_ratio,
-                                 initial_weights,
-                                 args=(mean_returns, covariance_matrix, risk_free_rate_annual),
-                                 method='SLSQP',
-                                 bounds=bounds,
-                                 constraints=constraints,
-                                 options={'disp': False})
-
-    if optimized_results.success:
-        optimized_weights = optimized_results.x
-        optimized_weights /= np.sum(optimized_weights) # Re-normalize
-        portfolio_allocation_raw = {tickers[i]: weight for i, weight in enumerate(optimized_weights) if weight > 1e-4}
-
-        if portfolio_allocation_raw:
-            total_weight = sum(portfolio_allocation_raw.values())
-            if total_weight > 0 :
-                 portfolio_allocation_final = {ticker: weight / total_weight for ticker, weight in portfolio_allocation_raw.items()}
-                 return portfolio_allocation_final
-            else:
-                st.warning("Warning: All optimized weights are near zero after filtering. Optimization might not be meaningful.")
-                return None
-        else:
-            return None
-    else:
-        st.error(f"Optimization failed: {optimized_results.message}")
+    daily_returns_assets, return_dates = _returns_matrix.complete_rows(tickers)
+    if len(return_dates) < 2:
+        return None
+    weights = np.array([allocation[t] for t in tickers], dtype=float)
+    comparison = compare_policies(daily_returns_assets, return_dates, weights / weights.sum(), risk_free_rate_annual,
+                                  cost_rate=rebalancing_settings['cost_rate'], band=rebalancing_settings['threshold_band'])
+    return comparison.loc[0]
+
+def display_rebalancing_policies(returns_matrix, allocation, risk_free_rate_annual):
+    comparison = compute_rebalancing_comparison(returns_matrix.key, tuple(sorted(allocation.items())), risk_free_rate_annual, returns_matrix)
+    if comparison is None:
+        return
+    st.write(f"### Rebalancing Policies (with {rebalancing_settings['cost_rate'] * 100:.2f}% cost per trade):")
+    st.write("The metrics above assume the portfolio is rebalanced every day at no cost. How it would have done under other policies:")
+    labels = {'daily': 'Daily', 'buy_and_hold': 'Buy and hold', 'monthly': 'Monthly', 'quarterly': 'Quarterly', 'annual': 'Annual',
+              'threshold': f"{rebalancing_settings['threshold_band'] * 100:.0f}% drift band"}
+    table = comparison.rename(index=labels)[['total_return', 'annualized_return', 'sharpe', 'rebalances', 'turnover', 'cost']]
+    table.columns = ['Total Return (%)', 'Annualized Return (%)', 'Sharpe Ratio', 'Rebalances', 'Turnover (x)', 'Cost (% of Initial)']
+    st.dataframe(table.round(2))
+
+def all_portfolio_allocations(snapshot_key, risk_free_rate_annual, moment_cache):
+    # Every fixed and optimized portfolio of the universe, keyed by ('Fixed' | 'Optimized', risk level)
+    allocations = {('Fixed', level): data['specific_etf_allocation'] for level, data in portfolio_data_fixed.items()}
+    risk_level_table = compute_risk_level_table(snapshot_key, risk_free_rate_annual, moment_cache)
+    allocations.update({('Optimized', level): allocation for level, allocation in risk_level_table['allocation'].items() if allocation})
+    return allocations
+
+@st.cache_data # Every fixed and optimized portfolio of the universe in one batched pass per snapshot
+def compute_risk_metrics_table(snapshot_key, risk_free_rate_annual, _returns_matrix, _moment_cache):
+    allocations = all_portfolio_allocations(snapshot_key, risk_free_rate_annual, _moment_cache)
+    return risk_metrics_for_allocations(_returns_matrix, allocations, risk_free_rate_annual, benchmark_etf)
+
+@st.cache_data # Keyed by the snapshot, the allocation and the horizon, so identical requests share one simulation
+def compute_wealth_projection(snapshot_key, allocation_items, horizon_years, _returns_matrix, _moment_cache):
+    allocation = dict(allocation_items)
+    tickers = [t for t in allocation if t in _returns_matrix.column_index]
+    if not tickers:
+        return None
+    weights = np.array([allocation[t] for t in tickers], dtype=float)
+    weights = weights / weights.sum()
+    settings = {'num_paths': projection_settings['num_paths'], 'seed': projection_settings['seed'],
+                'processes': 1} # 20k paths run in well under a second inline; no process pool per request
+    try:
+        if projection_settings['method'] == 'bootstrap':
+            daily_returns_assets, _ = _returns_matrix.complete_rows(tickers)
+            return project_wealth('bootstrap', horizon_years, daily_returns=np.asarray(daily_returns_assets) @ weights,
+                                  block_size=projection_settings['block_size'], **settings)
+        mean_returns, covariance_matrix = _moment_cache.moments(tickers)
+        return project_wealth('gbm', horizon_years, daily_mean=weights @ mean_returns,
+                              daily_variance=weights @ covariance_matrix @ weights, **settings)
+    except ValueError:
         return None
 
-def calculate_portfolio_returns_and_sharpe(prices_df, specific_allocation, risk_free_rate_annual):
-    portfolio_tickers = list(specific_allocation.keys())
-    available_prices = prices_df[portfolio_tickers].dropna(axis=0, how='any')
-
-    if available_prices.empty or len(available_prices) < 2:
-        st.warning(f"Not enough valid historical price data for portfolio {portfolio_tickers}.")
-        return None, None, None, None
-
-    daily_returns_assets = available_prices.pct_change().dropna()
-
-    if daily_returns_assets.empty:
-        st.warning("Could not calculate daily returns for assets in the portfolio.")
-        return None, None, None, None
-
-    weights_series = pd.Series(specific_allocation).reindex(daily_returns_assets.columns).fillna(0)
-    if weights_series.sum() == 0:
-        st.warning("All weights are zero after reindexing. Cannot calculate portfolio returns.")
-        return None, None, None, None
-    weights_series = weights_series / weights_series.sum() # Ensure weights sum to 1 after reindexing
-
-    portfolio_daily_returns = (daily_returns_assets * weights_series).sum(axis=1)
-
-    portfolio_cumulative_growth = (1 + portfolio_daily_returns).cumprod()
-    total_cumulative_return = (portfolio_cumulative_growth.iloc[-1] - 1) * 100
-
-    first_date_data = portfolio_cumulative_growth.index[0]
-    last_date_data = portfolio_cumulative_growth.index[-1]
-    time_delta_days = (last_date_data - first_date_data).days
-
-    if time_delta_days > 0:
-        num_years = time_delta_days / 365.25
-        annualized_cumulative_return = ((1 + (total_cumulative_return / 100))**(1/num_years) - 1) * 100
-    else:
-        annualized_cumulative_return = total_cumulative_return
-
-    mean_daily_portfolio_return = portfolio_daily_returns.mean()
-    annualized_portfolio_return = (1 + mean_daily_portfolio_return)**252 - 1
-
-    annualized_portfolio_std = portfolio_daily_returns.std() * np.sqrt(252)
-
-    sharpe_ratio = None
-    if annualized_portfolio_std > 1e-6:
-        sharpe_ratio = (annualized_portfolio_return - risk_free_rate_annual) / annualized_portfolio_std
-    else:
-        st.warning("Warning: Annualized portfolio standard deviation is zero or near zero. Sharpe Ratio not meaningful.")
-
-    portfolio_cumulative_growth_indexed = portfolio_cumulative_growth * 100
-
-    return total_cumulative_return, annualized_cumulative_return, sharpe_ratio, portfolio_cumulative_growth_indexed
+def display_wealth_projection(returns_matrix, moment_cache, allocation, horizon_years):
+    projection = compute_wealth_projection(returns_matrix.key, tuple(sorted(allocation.items())), horizon_years, returns_matrix, moment_cache)
+    if projection is None:
+        return
+    bands = projection['quantiles']
+    st.write(f"### Projected Growth over {horizon_years} Years:")
+    method = "historical returns resampled in monthly blocks" if projection['method'] == 'bootstrap' else "the portfolio's historical mean and volatility"
+    st.write(f"{projection['num_paths']:,} simulated paths from {method}, starting from 100.")
+    show_chart(plot_wealth_projection, bands)
+    final = bands.iloc[-1]
+    st.write(f"After {horizon_years} years: median **{final[0.5]:.0f}**, 5th percentile **{final[0.05]:.0f}**, "
+             f"95th percentile **{final[0.95]:.0f}**. Chance of ending below the initial value: **{projection['probability_of_loss'] * 100:.1f}%**.")
+
+def display_risk_metrics(returns_matrix, moment_cache, portfolio_kind, risk_level, risk_free_rate_annual):
+    risk_metrics_table = compute_risk_metrics_table(returns_matrix.key, risk_free_rate_annual, returns_matrix, moment_cache)
+    if (portfolio_kind, risk_level) not in risk_metrics_table.index:
+        return
+    metrics = risk_metrics_table.loc[(portfolio_kind, risk_level)]
+    rows = [
+        ("Annualized Volatility", f"{metrics['volatility'] * 100:.2f}%"),
+        ("Sortino Ratio", f"{metrics['sortino']:.2f}"),
+        ("Maximum Drawdown", f"{metrics['max_drawdown'] * 100:.2f}%"),
+        ("Calmar Ratio", f"{metrics['calmar']:.2f}"),
+        ("Daily VaR (95%)", f"{metrics['var'] * 100:.2f}%"),
+        ("Daily CVaR (95%)", f"{metrics['cvar'] * 100:.2f}%"),
+        (f"Beta vs {benchmark_etf}", f"{metrics['beta']:.2f}"),
+        (f"Tracking Error vs {benchmark_etf}", f"{metrics['tracking_error'] * 100:.2f}%"),
+    ]
+    st.write("### Risk Metrics:")
+    st.dataframe(pd.DataFrame(rows, columns=['Metric', 'Value']).set_index('Metric'))
+
+@st.cache_data # All fixed portfolios from one weight matrix product per snapshot; a visit only picks a column
+def compute_fixed_portfolio_results(snapshot_key, risk_free_rate_annual, _returns_matrix):
+    return evaluate_fixed_portfolios(_returns_matrix, universe, risk_free_rate_annual)
+
+@st.cache_resource # Scenario windows are history: each is read from the price store once per process and kept as a float32 matrix
+def get_scenario_matrix(scenario):
+    # (ReturnsMatrix or None, problems): a window whose prices do not cover it is left out rather than replayed short
+    window = STRESS_SCENARIOS[scenario]
+    tickers = [t for t in all_unique_tickers_for_download if t != '^IRX']
+    try:
+        price_data = fetch_prices(get_price_provider(), tickers, window['start'], window['end'], get_price_store())
+    except Exception as e:
+        return None, [f"prices could not be loaded ({e})"]
+    problems = window_problems(price_data.dropna(how='all').index, window['start'], window['end'])
+    if problems:
+        return None, problems
+    return shared_returns_matrix(scenario_returns(price_data), dtype=np.float32), []
+
+@st.cache_data # Every portfolio replayed through every scenario in one pass per snapshot
+def compute_stress_table(snapshot_key, risk_free_rate_annual, _moment_cache):
+    allocations = all_portfolio_allocations(snapshot_key, risk_free_rate_annual, _moment_cache)
+    scenario_matrices = {scenario: get_scenario_matrix(scenario)[0] for scenario in stress_test_settings['scenarios']}
+    return stress_test_scenarios(scenario_matrices, allocations, stress_test_settings['min_coverage'])
+
+def display_stress_tests(returns_matrix, moment_cache, portfolio_kind, risk_level, risk_free_rate_annual):
+    for scenario in stress_test_settings['scenarios']:
+        problems = get_scenario_matrix(scenario)[1]
+        if problems:
+            st.warning(f"Stress test '{STRESS_SCENARIOS[scenario]['label']}' skipped: its price data does not cover "
+                       f"{STRESS_SCENARIOS[scenario]['start']} to {STRESS_SCENARIOS[scenario]['end']} ({'; '.join(problems)}).")
+    stress_table = compute_stress_table(returns_matrix.key, risk_free_rate_annual, moment_cache)
+    if stress_table.empty:
+        return
+    try:
+        results = stress_table.xs((portfolio_kind, risk_level), level=1)
+    except KeyError:
+        return
+    rows = []
+    for scenario, result in results.iterrows():
+        label = STRESS_SCENARIOS[scenario]['label']
+        if np.isnan(result['drawdown']):
+            rows.append((label, "-", "-", "-", "-", f"{result['coverage'] * 100:.0f}%"))
+            continue
+        if np.isnan(result['recovery_days']):
+            recovery = f"Not by {STRESS_SCENARIOS[scenario]['end']}"
+        else:
+            recovery = f"{result['recovery_days']:.0f} trading days"
+        rows.append((label, f"{result['drawdown'] * 100:.2f}%", f"{result['peak_date'].date()} to {result['trough_date'].date()}",
+                     recovery, f"{result['total_return'] * 100:.2f}%", f"{result['coverage'] * 100:.0f}%"))
+    st.write("### Historical Stress Tests:")
+    st.dataframe(pd.DataFrame(rows, columns=['Scenario', 'Maximum Drawdown', 'Peak to Trough', 'Recovery',
+                                             'Return over Window', 'Weight Covered']).set_index('Scenario'))
+    missing = results.loc[results['coverage'] < 1, 'missing']
+    if not missing.empty:
+        st.write(f"ETFs launched after a scenario began are left out and the remaining weights scaled up; scenarios where less than "
+                 f"{stress_test_settings['min_coverage'] * 100:.0f}% of the portfolio existed are skipped. Left out: "
+                 + "; ".join(f"{tickers} ({STRESS_SCENARIOS[scenario]['label']})" for scenario, tickers in missing.items()) + ".")
+
+def fixed_portfolio_performance(fixed_portfolio_results, risk_level, specific_allocation):
+    # Same outputs and warnings as calculate_portfolio_returns_and_sharpe, read from the precomputed results
+    performance = performance_from_results(fixed_portfolio_results, risk_level, specific_allocation)
+    show_diagnostics(performance['diagnostics'])
+    return performance['total_return'], performance['annualized_return'], performance['sharpe'], performance['growth']
+
+def calculate_portfolio_returns_and_sharpe(returns_matrix, specific_allocation, risk_free_rate_annual):
+    performance = portfolio_performance(returns_matrix, specific_allocation, risk_free_rate_annual)
+    show_diagnostics(performance['diagnostics'])
+    return performance['total_return'], performance['annualized_return'], performance['sharpe'], performance['growth']
 
 # --- Main Streamlit App Logic ---
 st.set_page_config(layout="wide") # Use a wide layout for better display of charts
@@ -297,11 +334,8 @@ st.title("Robo-Advisor Portfolio Recommender")
 st.markdown("Welcome to your personalized investment portfolio recommender!")
 
 # Check for openpyxl dependency
-try:
-    import openpyxl
-    openpyxl_available = True
-except ImportError:
-    openpyxl_available = False
+openpyxl_available = importlib.util.find_spec("openpyxl") is not None # Found without importing it; pandas imports it when writing Excel
+if not openpyxl_available:
     st.warning("The 'openpyxl' library is not found. Excel download functionality will be disabled. Please install it (`pip install openpyxl`) for full features.")
 
 # State management for multi-step form (optional, but good for complex forms)
@@ -317,6 +351,8 @@ if 'q12_pref' not in st.session_state:
     st.session_state.q12_pref = False
 if 'determined_risk_level' not in st.session_state:
     st.session_state.determined_risk_level = None
+if 'horizon_years' not in st.session_state:
+    st.session_state.horizon_years = investment_horizon_years[1]
 
 # --- Page 1: Personal Information ---
 if st.session_state.page == 'info':
@@ -348,6 +384,7 @@ elif st.session_state.page == 'questionnaire':
     total_score = 0
     answer_q11_idx = None
     answer_q12_idx = None
+    answer_q5_idx = None
 
     answers = {}
     
@@ -364,7 +401,9 @@ elif st.session_state.page == 'questionnaire':
             score = question_data['scores'][answer_idx]
             total_score += score
             
-            if i == 11:
+            if i == 5:
+                answer_q5_idx = answer_idx
+            elif i == 11:
                 answer_q11_idx = answer_idx
             elif i == 12:
                 answer_q12_idx = answer_idx
@@ -375,38 +414,14 @@ elif st.session_state.page == 'questionnaire':
     if submitted_answers:
         st.session_state.risk_score = total_score
         st.session_state.q11_pref = (answer_q11_idx == 0 and questions[11]["options"][answer_q11_idx] == "Yes, I want a portfolio with sustainable investments")
+        st.session_state.horizon_years = investment_horizon_years[answer_q5_idx]
         st.session_state.q12_pref = (answer_q12_idx == 0 and questions[12]["options"][answer_q12_idx] == "Yes, I want an active strategy")
 
         st.subheader("Your Risk Profile Assessment")
         st.write(f"Your total score is: {st.session_state.risk_score}")
 
-        determined_risk_level = None
-        risk_label = "Undefined Profile"
-        if 10 <= st.session_state.risk_score <= 11:
-            risk_label = "Ultra Conservative"
-            determined_risk_level = 2
-        elif 12 <= st.session_state.risk_score <= 14:
-            risk_label = "Conservative"
-            determined_risk_level = 3
-        elif 15 <= st.session_state.risk_score <= 19:
-            risk_label = "Cautiously Moderate"
-            determined_risk_level = 4
-        elif 20 <= st.session_state.risk_score <= 24:
-            risk_label = "Moderate"
-            determined_risk_level = 5
-        elif 25 <= st.session_state.risk_score <= 29:
-            risk_label = "Moderate Growth"
-            determined_risk_level = 6
-        elif 30 <= st.session_state.risk_score <= 34:
-            risk_label = "Growth"
-            determined_risk_level = 7
-        elif 35 <= st.session_state.risk_score <= 38:
-            risk_label = "Opportunistic"
-            determined_risk_level = 8
-        elif 39 <= st.session_state.risk_score <= 40:
-            risk_label = "Aggressive Growth"
-            determined_risk_level = 9
-        else:
+        risk_label, determined_risk_level = risk_profile(st.session_state.risk_score)
+        if determined_risk_level is None:
             st.warning("Your total score falls outside the defined risk profile ranges.")
 
         st.session_state.determined_risk_level = determined_risk_level
@@ -430,6 +445,20 @@ elif st.session_state.page == 'questionnaire':
 # --- Page 3: Results and Portfolio Analysis ---
 elif st.session_state.page == 'results':
     st.header("3. Your Personalized Portfolio Recommendation")
+
+    # Only this page plots and optimizes; Python imports these once per process, on the first visit
+    import matplotlib.pyplot as plt
+    from optimization import DEFAULT_ENGINE
+    from objectives import OBJECTIVE_LABELS
+    from frontier import efficient_frontier, portfolio_metrics
+    from random_portfolios import simulate_random_portfolios
+    from backtest import walk_forward_all_levels
+    from rebalancing import compare_policies
+    from risk_metrics import risk_metrics_for_allocations
+    from projection import project_wealth
+    from stress_scenarios import STRESS_SCENARIOS, scenario_returns, stress_test_scenarios, window_problems
+    from recommendation import (evaluate_fixed_portfolios, load_market_data, optimize_universe, performance_from_results,
+                                portfolio_performance)
     
     determined_risk_level = st.session_state.determined_risk_level
     prefers_esg = st.session_state.q11_pref
@@ -442,9 +471,7 @@ elif st.session_state.page == 'results':
             st.experimental_rerun()
         st.stop()
 
-    # Define the fixed historical analysis period for returns and Sharpe Ratio
-    analysis_start_date = datetime(2023, 1, 1).date()
-    analysis_end_date = datetime(2024, 12, 31).date()
+    # The historical analysis period for returns and Sharpe Ratio is fixed in universes.py
 
     # Load and process data (cached)
     prices_for_portfolios, returns_data, risk_free_rate_annual = download_historical_prices(
@@ -454,9 +481,12 @@ elif st.session_state.page == 'results':
     if prices_for_portfolios.empty or returns_data.empty:
         st.error("Cannot proceed with portfolio analysis due to data issues.")
         st.stop()
+    returns_matrix = get_returns_matrix(all_unique_tickers_for_download, analysis_start_date, analysis_end_date)
+    moment_cache = shared_moment_cache(returns_matrix)
     
     if prefers_esg or prefers_active_strategy:
-        st.subheader(f"Sharpe Ratio Optimized Portfolio for Risk Level {determined_risk_level}")
+        objective_label = OBJECTIVE_LABELS[risk_level_objectives.get(determined_risk_level, 'max_sharpe')]
+        st.subheader(f"{objective_label} Portfolio for Risk Level {determined_risk_level}")
         
         selected_tickers_for_optimization = risk_level_assets_optimized.get(determined_risk_level, [])
         available_tickers_for_optimization = [t for t in selected_tickers_for_optimization if t in returns_data.columns and not returns_data[t].isnull().all()]
@@ -484,17 +514,28 @@ elif st.session_state.page == 'results':
                 st.stop()
         else:
             optimal_allocation = None
+            weight_dispersion = None
             if len(available_tickers_for_optimization) == 1:
                 optimal_allocation = {available_tickers_for_optimization[0]: 1.0}
                 st.info(f"Only one asset ({available_tickers_for_optimization[0]}) available for optimization. Allocating 100% to it.")
             else:
-                optimal_allocation = optimize_portfolio(returns_data, available_tickers_for_optimization, risk_free_rate_annual)
+                risk_level_table = compute_risk_level_table(returns_matrix.key, risk_free_rate_annual, moment_cache)
+                optimal_allocation = risk_level_table.loc[determined_risk_level, 'allocation']
+                weight_dispersion = risk_level_table.loc[determined_risk_level, 'dispersion']
+                if optimal_allocation is None:
+                    st.warning(risk_level_table.loc[determined_risk_level, 'problem'])
 
             if optimal_allocation and sum(optimal_allocation.values()) > 0:
                 st.write("### Optimal Portfolio Allocation (ETFs):")
                 allocation_df = pd.DataFrame(optimal_allocation.items(), columns=['ETF', 'Weight'])
                 allocation_df['Weight (%)'] = allocation_df['Weight'] * 100
                 st.dataframe(allocation_df[['ETF', 'Weight (%)']].set_index('ETF'))
+                if weight_dispersion:
+                    st.write(f"Weights are averaged over {resampling_settings['num_resamples']} bootstrap resamples of the returns. "
+                             "Spread of each ETF's weight across resamples (%):")
+                    dispersion_df = pd.DataFrame(weight_dispersion).T * 100
+                    dispersion_df.columns = ['Std. Dev.', '5th Percentile', '95th Percentile', 'Held in Resamples']
+                    st.dataframe(dispersion_df.round(1))
 
                 category_allocation_optimized = {cat: 0.0 for cat in set(etf_to_category.values())}
                 for etf, weight in optimal_allocation.items():
@@ -504,10 +545,7 @@ elif st.session_state.page == 'results':
                 category_allocation_optimized = {cat: weight for cat, weight in category_allocation_optimized.items() if weight > 0.001}
                 
                 # Plotting category allocation
-                fig_cat = plot_pie_chart_with_details(category_allocation_optimized, f'Optimized Portfolio Allocation by Category (Risk Level {determined_risk_level})')
-                if fig_cat:
-                    st.pyplot(fig_cat)
-                    plt.close(fig_cat) # Close the figure to free up memory
+                show_chart(plot_pie_chart_with_details, category_allocation_optimized, f'Optimized Portfolio Allocation by Category (Risk Level {determined_risk_level})')
 
                 # Detailed allocation within categories
                 st.write("### Detailed Allocation within Categories:")
@@ -522,12 +560,8 @@ elif st.session_state.page == 'results':
                     if category_total_weight_in_portfolio > 0.001:
                         if len(allocation_dict) > 1:
                             normalized_allocation_dict = {etf: weight / category_total_weight_in_portfolio for etf, weight in allocation_dict.items()}
-                            fig_detail = plot_pie_chart_with_details(normalized_allocation_dict,
-                                                                    f'Optimized Detailed Allocation within {category}')
-                            if fig_detail:
-                                st.pyplot(fig_detail)
-                                plt.close(fig_detail)
-                            else:
+                            if not show_chart(plot_pie_chart_with_details, normalized_allocation_dict,
+                                              f'Optimized Detailed Allocation within {category}'):
                                 st.write(f"No detailed plot for {category} due to insufficient data.")
                         elif len(allocation_dict) == 1:
                             etf, weight = list(allocation_dict.items())[0]
@@ -535,8 +569,20 @@ elif st.session_state.page == 'results':
                     else:
                         st.write(f"Category '{category}' has negligible allocation in this optimized portfolio.")
 
+                # Efficient frontier of this risk level's universe, with the optimized portfolio on it
+                if len(available_tickers_for_optimization) > 1:
+                    frontier = compute_efficient_frontier(returns_matrix.key, tuple(available_tickers_for_optimization),
+                                                          determined_risk_level, risk_free_rate_annual, moment_cache)
+                    mean_returns, covariance_matrix = moment_cache.moments(available_tickers_for_optimization)
+                    optimal_weights = np.array([optimal_allocation.get(t, 0.0) for t in available_tickers_for_optimization])
+                    optimal_point = portfolio_metrics(optimal_weights, mean_returns, covariance_matrix, risk_free_rate_annual)
+                    random_cloud = compute_random_portfolios(returns_matrix.key, tuple(available_tickers_for_optimization),
+                                                             determined_risk_level, risk_free_rate_annual, moment_cache)
+                    show_chart(plot_efficient_frontier, frontier, optimal_point, f'Efficient Frontier (Risk Level {determined_risk_level})',
+                               random_cloud=random_cloud)
+
                 total_ret, annualized_ret, sharpe_ratio, portfolio_cumulative_growth_indexed = calculate_portfolio_returns_and_sharpe(
-                    prices_for_portfolios, optimal_allocation, risk_free_rate_annual
+                    returns_matrix, optimal_allocation, risk_free_rate_annual
                 )
 
                 if total_ret is not None and annualized_ret is not None:
@@ -550,14 +596,8 @@ elif st.session_state.page == 'results':
 
                     # Plot portfolio growth over time
                     if portfolio_cumulative_growth_indexed is not None and not portfolio_cumulative_growth_indexed.empty:
-                        fig_growth, ax_growth = plt.subplots(figsize=(12, 6))
-                        ax_growth.plot(portfolio_cumulative_growth_indexed.index, portfolio_cumulative_growth_indexed.values)
-                        ax_growth.set_title('Portfolio Performance Over Time (Indexed to 100)')
-                        ax_growth.set_xlabel('Date')
-                        ax_growth.set_ylabel('Portfolio Value (Indexed)')
-                        ax_growth.grid(True)
-                        st.pyplot(fig_growth)
-                        plt.close(fig_growth)
+                        show_chart(plot_growth_chart, portfolio_cumulative_growth_indexed.index, portfolio_cumulative_growth_indexed.values,
+                                   'Portfolio Performance Over Time (Indexed to 100)')
                         
                         # Save to Excel button only if openpyxl is available
                         if openpyxl_available:
@@ -576,6 +616,32 @@ elif st.session_state.page == 'results':
                             st.info("Install 'openpyxl' (`pip install openpyxl`) to enable Excel download.")
                     else:
                         st.warning("Could not calculate or plot portfolio value history.")
+                    display_risk_metrics(returns_matrix, moment_cache, 'Optimized', determined_risk_level, risk_free_rate_annual)
+                    display_stress_tests(returns_matrix, moment_cache, 'Optimized', determined_risk_level, risk_free_rate_annual)
+                    display_rebalancing_policies(returns_matrix, optimal_allocation, risk_free_rate_annual)
+                    display_wealth_projection(returns_matrix, moment_cache, optimal_allocation, st.session_state.horizon_years)
+
+                # Out-of-sample check: the metrics above are measured on the same data the weights were fitted to
+                history_matrix = get_returns_matrix(all_unique_tickers_for_download, walk_forward_settings['history_start'], analysis_end_date)
+                history_problems = window_problems(history_matrix.dates, walk_forward_settings['history_start'], analysis_end_date)
+                if history_problems: # A shorter history than claimed would overstate how much out-of-sample evidence there is
+                    backtest = None
+                    st.warning(f"Walk-forward backtest skipped: the price history does not cover {walk_forward_settings['history_start']} "
+                               f"to {analysis_end_date} ({'; '.join(history_problems)}).")
+                else:
+                    walk_forward_table = compute_walk_forward_table(history_matrix.key, risk_free_rate_annual, history_matrix)
+                    backtest = walk_forward_table.loc[determined_risk_level, 'backtest']
+                    if backtest is None:
+                        st.warning(walk_forward_table.loc[determined_risk_level, 'problem'])
+                if backtest is not None:
+                    lookback = "all previous" if walk_forward_settings['expanding'] else f"the previous {walk_forward_settings['window']}"
+                    st.write("### Out-of-Sample (Walk-Forward) Performance:")
+                    st.write(f"Re-optimized every {walk_forward_settings['step']} trading days on {lookback} trading days, "
+                             f"held from {backtest['dates'][0].date()} to {backtest['dates'][-1].date()}.")
+                    st.write(f"Annualized Return: **{backtest['return'] * 100:.2f}%**")
+                    if not np.isnan(backtest['sharpe']):
+                        st.write(f"Annualized Sharpe Ratio: **{backtest['sharpe']:.2f}**")
+                    show_chart(plot_growth_chart, backtest['dates'], backtest['growth'], 'Walk-Forward Portfolio Performance (Indexed to 100)')
             else:
                 st.error("Portfolio optimization failed to produce a valid allocation.")
 
@@ -596,10 +662,7 @@ elif st.session_state.page == 'results':
         st.dataframe(allocation_df[['ETF', 'Weight (%)']].set_index('ETF'))
 
         # Plotting category allocation
-        fig_cat = plot_pie_chart_with_details(category_allocation, f'Fixed Portfolio Allocation by Category (Risk Level {determined_risk_level})')
-        if fig_cat:
-            st.pyplot(fig_cat)
-            plt.close(fig_cat)
+        show_chart(plot_pie_chart_with_details, category_allocation, f'Fixed Portfolio Allocation by Category (Risk Level {determined_risk_level})')
 
         # Detailed allocation within categories
         st.write("### Detailed Allocation within Categories:")
@@ -622,12 +685,8 @@ elif st.session_state.page == 'results':
                         etf: weight / category_total_weight_in_portfolio
                         for etf, weight in allocation_dict.items()
                     }
-                    fig_detail = plot_pie_chart_with_details(normalized_allocation_dict,
-                                                                f'Fixed Detailed Allocation within {category}')
-                    if fig_detail:
-                        st.pyplot(fig_detail)
-                        plt.close(fig_detail)
-                    else:
+                    if not show_chart(plot_pie_chart_with_details, normalized_allocation_dict,
+                                      f'Fixed Detailed Allocation within {category}'):
                         st.write(f"No detailed plot for {category} due to insufficient data.")
                 elif len(allocation_dict) == 1:
                     etf, weight = list(allocation_dict.items())[0]
@@ -635,8 +694,9 @@ elif st.session_state.page == 'results':
             else:
                 st.write(f"Category '{category}' has negligible allocation in this fixed portfolio.")
 
-        total_ret, annualized_ret, sharpe_ratio, portfolio_cumulative_growth_indexed = calculate_portfolio_returns_and_sharpe(
-            prices_for_portfolios, specific_etf_allocation, risk_free_rate_annual
+        fixed_portfolio_results = compute_fixed_portfolio_results(returns_matrix.key, risk_free_rate_annual, returns_matrix)
+        total_ret, annualized_ret, sharpe_ratio, portfolio_cumulative_growth_indexed = fixed_portfolio_performance(
+            fixed_portfolio_results, determined_risk_level, specific_etf_allocation
         )
 
         if total_ret is not None and annualized_ret is not None:
@@ -650,14 +710,8 @@ elif st.session_state.page == 'results':
 
             # Plot portfolio growth over time
             if portfolio_cumulative_growth_indexed is not None and not portfolio_cumulative_growth_indexed.empty:
-                fig_growth, ax_growth = plt.subplots(figsize=(12, 6))
-                ax_growth.plot(portfolio_cumulative_growth_indexed.index, portfolio_cumulative_growth_indexed.values)
-                ax_growth.set_title('Portfolio Performance Over Time (Indexed to 100)')
-                ax_growth.set_xlabel('Date')
-                ax_growth.set_ylabel('Portfolio Value (Indexed)')
-                ax_growth.grid(True)
-                st.pyplot(fig_growth)
-                plt.close(fig_growth)
+                show_chart(plot_growth_chart, portfolio_cumulative_growth_indexed.index, portfolio_cumulative_growth_indexed.values,
+                           'Portfolio Performance Over Time (Indexed to 100)')
 
                 # Save to Excel button only if openpyxl is available
                 if openpyxl_available:
@@ -675,6 +729,18 @@ elif st.session_state.page == 'results':
                     st.info("Install 'openpyxl' (`pip install openpyxl`) to enable Excel download.")
             else:
                 st.warning("Could not calculate or plot portfolio value history.")
+            display_risk_metrics(returns_matrix, moment_cache, 'Fixed', determined_risk_level, risk_free_rate_annual)
+            display_stress_tests(returns_matrix, moment_cache, 'Fixed', determined_risk_level, risk_free_rate_annual)
+            display_rebalancing_policies(returns_matrix, specific_etf_allocation, risk_free_rate_annual)
+            display_wealth_projection(returns_matrix, moment_cache, specific_etf_allocation, st.session_state.horizon_years)
+
+            # Every fixed portfolio was evaluated in the same matrix product, so comparing levels costs nothing extra
+            with st.expander("Compare All Fixed Portfolios"):
+                comparison_df = fixed_portfolio_results['metrics'][['total_return', 'annualized_return', 'sharpe']].copy()
+                comparison_df.index.name = 'Risk Level'
+                comparison_df.columns = ['Total Return (%)', 'Annualized Return (%)', 'Sharpe Ratio']
+                st.dataframe(comparison_df.round(2))
+                show_chart(plot_fixed_levels_chart, fixed_portfolio_results['growth'], determined_risk_level)
     
     st.markdown("---")
     if st.button("Start Over"):
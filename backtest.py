@@ -0,0 +1,155 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from constraints import compile_constraints
+from objectives import SCENARIO_OBJECTIVES, solve_objective
+from optimization import DEFAULT_ENGINE, TRADING_DAYS
+
+# --- Walk-Forward Backtest ---
+# Re-optimizes on a rolling (or expanding) lookback window every `step` trading days and holds the
+# weights, drifting with prices, over the following out-of-sample period. Window moments come from
+# cumulative sums of returns and of their outer products, so every window's mean and covariance is
+# a difference of two prefix sums instead of a new .cov() call.
+
+
+def rebalance_schedule(num_days, window, step, expanding=False):
+    """(starts, ends) of the lookback windows [start, end); each end is also a rebalance day."""
+    ends = np.arange(window, num_days, step)
+    starts = np.zeros_like(ends) if expanding else ends - window
+    return starts, ends
+
+
+def window_moments(returns, starts, ends):
+    """Mean returns (K x n) and sample covariances (K x n x n) of returns[start:end] for every window at once."""
+    returns = np.asarray(returns, dtype=float)
+    num_days, num_assets = returns.shape
+    sums = np.zeros((num_days + 1, num_assets))
+    np.cumsum(returns, axis=0, out=sums[1:])
+    products = np.zeros((num_days + 1, num_assets, num_assets))
+    np.cumsum(returns[:, :, None] * returns[:, None, :], axis=0, out=products[1:])
+
+    counts = (ends - starts).astype(float)
+    mean_returns = (sums[ends] - sums[starts]) / counts[:, None]
+    second_moments = products[ends] - products[starts]
+    covariance = (second_moments - counts[:, None, None] * mean_returns[:, :, None] * mean_returns[:, None, :]) / (counts[:, None, None] - 1)
+    return mean_returns, covariance
+
+
+def _optimize_windows(task):
+    returns, starts, ends, mean_returns, covariance, risk_free_rate_annual, objective, engine, constraints = task
+    weights = np.full(mean_returns.shape, np.nan)
+    for k in range(len(ends)):
+        scenarios = returns[starts[k]:ends[k]] if objective in SCENARIO_OBJECTIVES else None
+        result = solve_objective(objective, mean_returns[k], covariance[k], risk_free_rate_annual, scenarios, engine, constraints)
+        if result.success:
+            w = np.clip(result.x, 0, None)
+            w[w <= 1e-4] = 0.0 # Same filter as optimization.allocation_from_result
+            if w.sum() > 0:
+                weights[k] = w / w.sum()
+    return weights
+
+
+def hold_between_rebalances(returns, ends, weights):
+    """
+    Daily portfolio returns from ends[0] on when weights[k] is bought at the close of day ends[k] - 1 and
+    left to drift until the next rebalance. Done for all periods at once from one cumulative product.
+    """
+    returns = np.asarray(returns, dtype=float)
+    growth = np.cumprod(1 + returns, axis=0)
+    growth = np.vstack([np.ones(returns.shape[1]), growth]) # growth[t] = value of 1 bought before day 0, after day t - 1
+    period = np.repeat(np.arange(len(ends)), np.diff(np.append(ends, len(returns))))
+    days = np.arange(ends[0], len(returns))
+    # Value of each period's holdings at the close of every day, relative to the rebalance close
+    value = np.einsum('ti,ti->t', weights[period], growth[days + 1] / growth[ends[period]])
+    previous = np.where(days == ends[period], 1.0, np.r_[np.nan, value[:-1]])
+    return value / previous - 1
+
+
+def walk_forward(returns, dates, risk_free_rate_annual, window=TRADING_DAYS, step=21, expanding=False,
+                 objective='max_sharpe', engine=DEFAULT_ENGINE, constraints=None, processes=1, pool=None):
+    """
+    Walk-forward backtest of one universe over complete (T x n) daily returns.
+
+    Returns a dict with 'rebalance_dates' (first day each weights row is held), 'weights' (K x n; a
+    failed window keeps the previous weights, starting from equal weights), 'converged' (K), 'dates'
+    and 'daily_returns' of the out-of-sample period, 'growth' (indexed to 100) and its annualized
+    'return', 'volatility' and 'sharpe'.
+    processes > 1 splits the windows across a process pool: `pool` when given, otherwise one created for this call.
+    """
+    returns = np.asarray(returns, dtype=float)
+    num_days, num_assets = returns.shape
+    starts, ends = rebalance_schedule(num_days, window, step, expanding)
+    if not len(ends):
+        raise ValueError(f"Need more than {window} days of returns for a {window}-day lookback window, got {num_days}.")
+    mean_returns, covariance = window_moments(returns, starts, ends)
+
+    if num_assets == 1:
+        weights = np.ones((len(ends), 1))
+    else:
+        chunks = np.array_split(np.arange(len(ends)), max(1, min(processes, len(ends))))
+        tasks = [(returns, starts[c], ends[c], mean_returns[c], covariance[c], risk_free_rate_annual, objective, engine, constraints)
+                 for c in chunks]
+        if len(tasks) > 1 and pool is not None:
+            weights = np.vstack(list(pool.map(_optimize_windows, tasks)))
+        elif len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=len(tasks)) as own_pool:
+                weights = np.vstack(list(own_pool.map(_optimize_windows, tasks)))
+        else:
+            weights = _optimize_windows(tasks[0])
+    converged = ~np.isnan(weights).any(axis=1)
+    weights = pd.DataFrame(weights).ffill().fillna(1 / num_assets).to_numpy() # Keep the last good weights
+
+    daily_returns = hold_between_rebalances(returns, ends, weights)
+    growth = 100 * np.cumprod(1 + daily_returns)
+    years = len(daily_returns) / TRADING_DAYS
+    annual_return = (growth[-1] / 100)**(1 / years) - 1
+    annual_volatility = daily_returns.std(ddof=1) * np.sqrt(TRADING_DAYS) if len(daily_returns) > 1 else np.nan
+    sharpe = (annual_return - risk_free_rate_annual) / annual_volatility if annual_volatility and annual_volatility > 1e-12 else np.nan
+    return {
+        'rebalance_dates': dates[ends], 'weights': weights, 'converged': converged,
+        'dates': dates[ends[0]:], 'daily_returns': daily_returns, 'growth': growth,
+        'return': annual_return, 'volatility': annual_volatility, 'sharpe': sharpe,
+    }
+
+
+def walk_forward_all_levels(returns_matrix, risk_level_assets, risk_free_rate_annual, window=TRADING_DAYS, step=21,
+                            expanding=False, engine=DEFAULT_ENGINE, objectives=None, constraint_specs=None, processes=None):
+    """
+    walk_forward for every risk level of a universe on its complete rows of a ReturnsMatrix. Returns a
+    DataFrame indexed by risk level with columns 'tickers', 'backtest' (the walk_forward dict, or None),
+    'problem' and the out-of-sample 'return', 'volatility' and 'sharpe'.
+    processes=None uses one worker per CPU, in a single pool shared by every level; 1 runs inline.
+    """
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) if processes > 1 else nullcontext() as pool:
+        return _walk_forward_levels(returns_matrix, risk_level_assets, risk_free_rate_annual, window, step, expanding,
+                                    engine, objectives, constraint_specs, processes, pool)
+
+
+def _walk_forward_levels(returns_matrix, risk_level_assets, risk_free_rate_annual, window, step, expanding, engine,
+                         objectives, constraint_specs, processes, pool):
+    rows = []
+    for risk_level, selected_tickers in risk_level_assets.items():
+        tickers = [t for t in selected_tickers if t in returns_matrix.column_index]
+        row = {'risk_level': risk_level, 'tickers': tickers, 'backtest': None, 'problem': None,
+               'return': np.nan, 'volatility': np.nan, 'sharpe': np.nan}
+        try:
+            if not tickers:
+                raise ValueError(f"No return data for any of {selected_tickers}.")
+            constraints = None
+            if constraint_specs and risk_level in constraint_specs and len(tickers) > 1:
+                constraints = compile_constraints(tickers, **constraint_specs[risk_level])
+            block, dates = returns_matrix.complete_rows(tickers)
+            backtest = walk_forward(np.asarray(block), dates, risk_free_rate_annual, window, step, expanding,
+                                    (objectives or {}).get(risk_level, 'max_sharpe'), engine, constraints, processes, pool)
+        except ValueError as e:
+            row['problem'] = f"Backtest failed: {e}"
+        else:
+            row.update({'backtest': backtest, 'return': backtest['return'], 'volatility': backtest['volatility'],
+                        'sharpe': backtest['sharpe']})
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('risk_level').sort_index()
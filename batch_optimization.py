@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import OptimizeResult
+
+from constraints import compile_constraints
+from frontier import portfolio_metrics
+from objectives import objective_inputs, solve_objective
+from optimization import DEFAULT_ENGINE, allocation_from_result
+from resampling import resampled_optimization
+
+# --- All Risk Levels in One Call ---
+# The optimized portfolio of a risk level depends only on the data snapshot, not on the user, so every
+# level of a universe (app.py's conventional one or app-FINAL.py's ESG one) is solved once and
+# served from a table.
+
+
+def _level_row(risk_level, tickers, objective, allocation, problem, mean_returns, covariance_matrix, risk_free_rate_annual):
+    metrics = {'return': np.nan, 'volatility': np.nan, 'sharpe': np.nan}
+    if allocation:
+        weights = np.array([allocation.get(t, 0.0) for t in tickers])
+        metrics = {k: float(v[0]) for k, v in portfolio_metrics(weights, mean_returns, covariance_matrix, risk_free_rate_annual).items()}
+    return {'risk_level': risk_level, 'tickers': list(tickers), 'objective': objective, 'allocation': allocation, 'problem': problem,
+            'dispersion': None, **metrics}
+
+
+def _optimize_level(task):
+    risk_level, tickers, mean_returns, covariance_matrix, scenarios, risk_free_rate_annual, engine, objective, constraints = task
+    if len(tickers) == 1:
+        allocation, problem = {tickers[0]: 1.0}, None
+    else:
+        result = solve_objective(objective, mean_returns, covariance_matrix, risk_free_rate_annual, scenarios, engine, constraints)
+        allocation, problem = allocation_from_result(tickers, result)
+    return _level_row(risk_level, tickers, objective, allocation, problem, mean_returns, covariance_matrix, risk_free_rate_annual)
+
+
+def _resample_level(task, returns_block, num_resamples, seed, processes):
+    risk_level, tickers, mean_returns, covariance_matrix, scenarios, risk_free_rate_annual, engine, objective, constraints = task
+    if len(tickers) == 1:
+        return _optimize_level(task)
+    resampled = resampled_optimization(returns_block, risk_free_rate_annual, num_resamples, seed, processes,
+                                       objective, engine, constraints)
+    result = OptimizeResult(x=resampled['weights'], success=resampled['num_failed'] < num_resamples,
+                            message="Every bootstrap resample failed to optimize.")
+    allocation, problem = allocation_from_result(tickers, result)
+    row = _level_row(risk_level, tickers, objective, allocation, problem, mean_returns, covariance_matrix, risk_free_rate_annual)
+    row['dispersion'] = {t: {stat: float(resampled[stat][i]) for stat in ('std', 'p05', 'p95', 'selection_frequency')}
+                         for i, t in enumerate(tickers)}
+    return row
+
+
+def optimize_all_risk_levels(moment_cache, risk_level_assets, risk_free_rate_annual, engine=DEFAULT_ENGINE, processes=None,
+                             constraint_specs=None, objectives=None, num_resamples=0, resample_seed=0):
+    """
+    Optimizes every risk level of a universe ({risk_level: [tickers]}) against one moment cache.
+
+    Tickers without returns in the snapshot are skipped, as on the results page. Returns a DataFrame
+    indexed by risk level with columns 'tickers', 'objective', 'allocation' ({ticker: weight} or None),
+    'problem' (why allocation is None), 'dispersion' and the annualized 'return', 'volatility' and 'sharpe'.
+    processes=None uses one worker per CPU (capped at the number of levels); 1 solves inline.
+    constraint_specs optionally maps risk levels to constraints.compile_constraints keyword arguments.
+    objectives optionally maps risk levels to an objectives.OBJECTIVES name; the default is 'max_sharpe'.
+    num_resamples > 0 averages the weights of that many bootstrap resamples of each level's complete
+    rows (resampling.resampled_optimization) and fills 'dispersion' with {ticker: weight statistics};
+    the process pool then runs over resamples instead of levels.
+    """
+    tasks, rows = [], []
+    for risk_level, selected_tickers in risk_level_assets.items():
+        objective = (objectives or {}).get(risk_level, 'max_sharpe')
+        tickers = [t for t in selected_tickers if t in moment_cache.returns_matrix.column_index]
+        if not tickers or moment_cache.min_observations(tickers) < 2:
+            rows.append({'risk_level': risk_level, 'tickers': tickers, 'objective': objective, 'allocation': None,
+                         'problem': f"Warning: Not enough valid return data available for optimization with tickers: {selected_tickers}.",
+                         'dispersion': None, 'return': np.nan, 'volatility': np.nan, 'sharpe': np.nan})
+            continue
+        constraints = None
+        if constraint_specs and risk_level in constraint_specs:
+            try:
+                constraints = compile_constraints(tickers, **constraint_specs[risk_level])
+            except ValueError as e:
+                rows.append({'risk_level': risk_level, 'tickers': tickers, 'objective': objective, 'allocation': None,
+                             'problem': f"Optimization failed: {e}",
+                             'dispersion': None, 'return': np.nan, 'volatility': np.nan, 'sharpe': np.nan})
+                continue
+        mean_returns, covariance_matrix, scenarios = objective_inputs(moment_cache, tickers, objective)
+        tasks.append((risk_level, tickers, mean_returns, covariance_matrix, scenarios, risk_free_rate_annual, engine,
+                      objective, constraints))
+
+    if num_resamples:
+        rows.extend(_resample_level(task, np.asarray(moment_cache.returns_matrix.complete_rows(task[1])[0]), num_resamples,
+                                    resample_seed, processes) for task in tasks)
+    elif min(processes or os.cpu_count() or 1, len(tasks)) > 1:
+        with ProcessPoolExecutor(max_workers=min(processes or os.cpu_count(), len(tasks))) as pool:
+            rows.extend(pool.map(_optimize_level, tasks))
+    else:
+        rows.extend(_optimize_level(task) for task in tasks)
+
+    table = pd.DataFrame(rows, columns=['risk_level', 'tickers', 'objective', 'allocation', 'problem', 'dispersion',
+                                       'return', 'volatility', 'sharpe'])
+    return table.set_index('risk_level').sort_index()
@@ -0,0 +1,136 @@
+import argparse
+import json
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+from optimization import DEFAULT_ENGINE, ENGINES
+from recommendation import Recommender
+from scoring import OPTION_COUNTS, score_clients
+from universes import analysis_end_date, analysis_start_date, questions, universes
+
+logger = logging.getLogger(__name__)
+
+# --- Batch Recommendations ---
+# Recommends a portfolio for every client of a CSV/Parquet file with the same engine as the apps, without
+# Streamlit. Each row needs answers q1..q12 as option numbers (1 = first option, in the apps' order);
+# other columns are copied to the output. Prices come from PRICE_PROVIDER / PRICE_FIXTURE_PATH as in the apps.
+#
+#   python batch_recommend.py clients.csv --universe esg --output recommendations.csv
+#   python batch_recommend.py clients.parquet --scores-only --output scores.parquet
+
+ANSWER_COLUMNS = [f"q{question_id}" for question_id in sorted(questions)]
+SCORE_COLUMNS = ['risk_score', 'risk_label', 'risk_level']
+MAX_REPORTED_ROWS = 10 # Invalid rows listed in the error message
+OUTPUT_COLUMNS = ['risk_score', 'risk_label', 'risk_level', 'portfolio', 'allocation', 'total_return', 'annualized_return',
+                  'sharpe', 'diagnostics']
+
+
+def read_table(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+
+
+def write_table(frame, path):
+    if path is None or path == "-":
+        frame.to_csv(sys.stdout, index=False)
+    elif path.endswith(".parquet"):
+        frame.to_parquet(path, index=False)
+    elif path.endswith(".jsonl"):
+        frame.to_json(path, orient="records", lines=True)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def answer_matrix(clients):
+    """
+    (N x 12) 0-based option indices from a clients frame. Raises ValueError naming the rows (1 = first
+    client) whose answers are missing, not whole numbers or not an option of their question.
+    """
+    missing = [c for c in ANSWER_COLUMNS if c not in clients.columns]
+    if missing:
+        raise ValueError(f"Missing answer columns: {', '.join(missing)}.")
+    answers = clients[ANSWER_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    valid = (answers == np.floor(answers)) & (answers >= 1) & (answers <= OPTION_COUNTS) # NaN fails every test
+    invalid_rows = np.flatnonzero(~valid.all(axis=1))
+    if len(invalid_rows):
+        details = []
+        for row in invalid_rows[:MAX_REPORTED_ROWS]:
+            column = int((~valid[row]).argmax())
+            value = clients[ANSWER_COLUMNS[column]].iloc[row]
+            details.append(f"row {row + 1}: {ANSWER_COLUMNS[column]} is {getattr(value, 'item', lambda: value)()!r}, "
+                           f"not an option number between 1 and {OPTION_COUNTS[column]}")
+        more = f"; and {len(invalid_rows) - MAX_REPORTED_ROWS} more" if len(invalid_rows) > MAX_REPORTED_ROWS else ""
+        raise ValueError(f"{len(invalid_rows)} client(s) with invalid answers: {'; '.join(details)}{more}.")
+    return answers.astype(np.int64) - 1
+
+
+def score_table(clients):
+    """score_clients for a clients frame, indexed like it."""
+    return score_clients(answer_matrix(clients)).set_index(clients.index)
+
+
+def portfolio_table(recommender, keys):
+    """recommended_portfolio of every (risk_level, optimized) in keys as a frame of OUTPUT_COLUMNS, indexed by them."""
+    rows = {}
+    for risk_level, optimized in keys:
+        recommendation = recommender.recommended_portfolio(int(risk_level), bool(optimized))
+        row = {k: recommendation[k] for k in ('portfolio', 'total_return', 'annualized_return', 'sharpe')}
+        row['allocation'] = json.dumps(recommendation['allocation']) if recommendation['allocation'] else None
+        row['diagnostics'] = "; ".join(f"{d['level']}: {d['message']}" for d in recommendation['diagnostics'] if d['level'] != 'info')
+        rows[(risk_level, optimized)] = row
+    index = pd.MultiIndex.from_tuples(list(rows), names=['risk_level', 'optimized'])
+    return pd.DataFrame(list(rows.values()), index=index, columns=[c for c in OUTPUT_COLUMNS if c not in SCORE_COLUMNS])
+
+
+def recommend_clients(clients, recommender):
+    """
+    OUTPUT_COLUMNS for every row of a clients frame, appended to its non-answer columns. Answers are
+    scored in bulk and each client is joined to the recommendation of its (risk level, ESG/active
+    preference), which is computed once per distinct pair.
+    """
+    scores = score_table(clients)
+    keys = scores.loc[scores['risk_level'].notna(), ['risk_level', 'optimized']].drop_duplicates()
+    portfolios = portfolio_table(recommender, keys.itertuples(index=False))
+    results = scores.join(portfolios, on=['risk_level', 'optimized'])
+    results.loc[scores['risk_level'].isna(), 'diagnostics'] = "error: Could not determine a valid risk level."
+    results.loc[scores['error'].notna(), 'diagnostics'] = "error: " + scores['error'].dropna()
+    return pd.concat([clients.drop(columns=ANSWER_COLUMNS), results[OUTPUT_COLUMNS]], axis=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommend portfolios for a file of questionnaire answers")
+    parser.add_argument("clients", help="CSV or Parquet file with columns q1..q12 (option numbers starting at 1)")
+    parser.add_argument("--universe", choices=sorted(universes), default="conventional")
+    parser.add_argument("--output", help="CSV, Parquet or .jsonl output file (default: CSV on stdout)")
+    parser.add_argument("--start", default=analysis_start_date.isoformat(), help="Start of the analysis window")
+    parser.add_argument("--end", default=analysis_end_date.isoformat(), help="End of the analysis window")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default=DEFAULT_ENGINE, help="Max-Sharpe optimizer engine")
+    parser.add_argument("--scores-only", action="store_true", help="Only score the answers; no market data or portfolios")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s", stream=sys.stderr)
+
+    clients = read_table(args.clients)
+    try:
+        answer_matrix(clients) # Rejects the file before any market data is loaded
+    except ValueError as e:
+        logger.error("%s: %s", args.clients, e)
+        return 2
+    if args.scores_only:
+        scores = score_table(clients)
+        write_table(pd.concat([clients.drop(columns=ANSWER_COLUMNS), scores[SCORE_COLUMNS + ['error']]], axis=1), args.output)
+        logger.info("Scored %d clients", len(clients))
+        return 0
+    recommender = Recommender(args.universe, args.start, args.end, engine=args.engine)
+    for item in recommender.diagnostics:
+        logger.log(logging.getLevelName(item['level'].upper()), item['message'])
+    if recommender.returns_matrix is None:
+        return 1
+    write_table(recommend_clients(clients, recommender), args.output)
+    logger.info("Wrote recommendations for %d clients", len(clients))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,603 @@
+import argparse
+import ast
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from backtest import rebalance_schedule, walk_forward, window_moments
+from figure_cache import FigureCache
+from frontier import efficient_frontier, portfolio_metrics
+from objectives import (_risk_parity_cyclical, risk_contributions, solve_min_cvar, solve_min_variance,
+                        solve_risk_parity)
+from optimization import TRADING_DAYS, solve_max_sharpe, solve_max_sharpe_qp
+from portfolio_matrix import PortfolioMatrix
+from price_providers import RISK_FREE_TICKER, FilePriceProvider, save_price_fixture
+from price_store import PriceStore
+from projection import HistogramQuantiles, lognormal_parameters, project_wealth
+from random_portfolios import simulate_random_portfolios
+from recommendation import portfolio_performance, universe_tickers
+from recommendation_service import RecommendationService
+from rebalancing import POLICIES, policy_mask, simulate_rebalancing
+from risk_metrics import risk_metric_suite
+from scoring import OPTION_COUNTS, risk_profile, score_answers, score_clients
+from streaming_metrics import MetricsStore
+from stress_scenarios import stress_test
+from resampling import resampled_optimization
+from returns_matrix import ReturnsMatrix
+
+# --- Benchmarks ---
+# Run with: python benchmarks.py <name>. Inputs are synthetic so results do not depend on the network.
+
+
+def synthetic_returns(num_assets, num_days=504, seed=0):
+    """(num_days x num_assets) daily returns of a 3-factor model with ETF-like magnitudes."""
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0.0, 0.008, size=(num_assets, 3))
+    idiosyncratic = rng.uniform(0.002, 0.015, size=num_assets)
+    volatility = np.sqrt((loadings**2).sum(axis=1) + idiosyncratic**2)
+    drift = 0.0001 + volatility * rng.uniform(0.0, 0.06, size=num_assets) # Annual Sharpe roughly 0 to 1
+    factors = rng.normal(0.0, 1.0, size=(num_days, 3))
+    return factors @ loadings.T + rng.normal(size=(num_days, num_assets)) * idiosyncratic + drift
+
+
+def synthetic_moments(num_assets, num_days=504, seed=0):
+    """Daily mean returns and covariance of synthetic_returns."""
+    returns = synthetic_returns(num_assets, num_days, seed)
+    return returns.mean(axis=0), np.cov(returns, rowvar=False)
+
+
+def _time(fn, repeats):
+    best = np.inf
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def bench_solver(sizes=(3, 5, 10, 25, 50, 100, 250, 500), risk_free_rate_annual=0.04, repeats=3):
+    """SLSQP max-Sharpe with finite-difference vs analytic gradient."""
+    print(f"{'assets':>6} {'gradient':>10} {'nit':>5} {'nfev':>7} {'njev':>5} {'ms':>10} {'sharpe':>8} {'ok':>4}")
+    for n in sizes:
+        mean_returns, covariance = synthetic_moments(n)
+        for use_gradient in (False, True):
+            result, seconds = _time(lambda: solve_max_sharpe(mean_returns, covariance, risk_free_rate_annual, use_gradient), repeats)
+            print(f"{n:>6} {'analytic' if use_gradient else 'finite':>10} {result.nit:>5} {result.nfev:>7} {result.njev:>5} "
+                  f"{seconds * 1000:>10.2f} {-result.fun:>8.3f} {str(result.success):>4}")
+
+
+
+def bench_engines(sizes=(3, 5, 6, 10, 25, 50, 100, 250, 500), seeds=(0, 1, 2), risk_free_rate_annual=0.04):
+    """SLSQP (analytic gradient) vs the tangency QP: compounded annual Sharpe, weight gap and wall time."""
+    print(f"{'assets':>6} {'seed':>4} {'slsqp sharpe':>12} {'qp sharpe':>10} {'max |dw|':>9} {'slsqp ms':>10} {'qp ms':>8}")
+    for n in sizes:
+        for seed in seeds:
+            mean_returns, covariance = synthetic_moments(n, seed=seed)
+            slsqp, slsqp_seconds = _time(lambda: solve_max_sharpe(mean_returns, covariance, risk_free_rate_annual), 1)
+            qp, qp_seconds = _time(lambda: solve_max_sharpe_qp(mean_returns, covariance, risk_free_rate_annual), 3)
+            print(f"{n:>6} {seed:>4} {-slsqp.fun:>12.4f} {-qp.fun:>10.4f} {np.abs(slsqp.x - qp.x).max():>9.4f} "
+                  f"{slsqp_seconds * 1000:>10.2f} {qp_seconds * 1000:>8.2f}")
+
+
+
+def bench_frontier(sizes=(3, 6, 25, 50), num_points=200, risk_free_rate_annual=0.04):
+    """Warm-started frontier of num_points targets in both modes."""
+    print(f"{'assets':>6} {'mode':>10} {'points':>6} {'converged':>9} {'ms':>9}")
+    for n in sizes:
+        mean_returns, covariance = synthetic_moments(n)
+        for mode in ('return', 'volatility'):
+            frontier, seconds = _time(lambda: efficient_frontier(mean_returns, covariance, risk_free_rate_annual, num_points, mode), 1)
+            print(f"{n:>6} {mode:>10} {num_points:>6} {frontier['converged'].sum():>9} {seconds * 1000:>9.1f}")
+
+
+
+def bench_random(sizes=(3, 6, 25), num_samples=2_000_000, risk_free_rate_annual=0.04):
+    """Chunked Dirichlet random-portfolio cloud, single process vs a process pool."""
+    pool_sizes = sorted({1, os.cpu_count() or 1})
+    print(f"{'assets':>6} {'procs':>5} {'samples':>10} {'s':>7} {'samples/s':>12} {'best sharpe':>11}")
+    for n in sizes:
+        mean_returns, covariance = synthetic_moments(n)
+        for processes in pool_sizes:
+            cloud, seconds = _time(lambda: simulate_random_portfolios(mean_returns, covariance, risk_free_rate_annual,
+                                                                      num_samples, processes=processes), 1)
+            print(f"{n:>6} {processes:>5} {num_samples:>10,} {seconds:>7.2f} {num_samples / seconds:>12,.0f} {cloud['best_sharpe']:>11.3f}")
+
+
+def bench_objectives(sizes=(3, 6, 25, 100), num_days=504, risk_free_rate_annual=0.04):
+    """Each objective against the existing max-Sharpe SLSQP path, plus generic SLSQP baselines for min variance and risk parity."""
+    budget = {'type': 'eq', 'fun': lambda w: np.sum(w) - 1, 'jac': lambda w: np.ones_like(w)}
+    print(f"{'assets':>6} {'objective':>22} {'ms':>9} {'volatility':>10} {'sharpe':>7} {'cvar95':>7} {'max rc gap':>10}")
+    for n in sizes:
+        returns = synthetic_returns(n, num_days)
+        mean_returns, covariance = returns.mean(axis=0), np.cov(returns, rowvar=False)
+        scaled = covariance / np.mean(np.diag(covariance))
+        equal = np.full(n, 1 / n)
+        repeats = 3 if n < 100 else 1
+
+        def slsqp(objective):
+            return minimize(objective, equal, method='SLSQP', bounds=[(0, 1)] * n, constraints=[budget],
+                            options={'disp': False, 'maxiter': 500}).x
+
+        def ccd():
+            y, _ = _risk_parity_cyclical(scaled, equal, 1e-10, 100_000)
+            return y / y.sum()
+
+        runs = {
+            'max_sharpe (slsqp)': lambda: solve_max_sharpe(mean_returns, covariance, risk_free_rate_annual).x,
+            'min_variance (qp)': lambda: solve_min_variance(covariance).x,
+            'min_variance (slsqp)': lambda: slsqp(lambda w: w @ scaled @ w),
+            'risk_parity (newton)': lambda: solve_risk_parity(covariance).x,
+            'risk_parity (cyclical)': ccd,
+            'risk_parity (slsqp)': lambda: slsqp(lambda w: np.sum((risk_contributions(w, covariance) - 1 / n)**2)),
+            'min_cvar (lp)': lambda: solve_min_cvar(returns).x,
+        }
+        for name, run in runs.items():
+            weights, seconds = _time(run, repeats)
+            metrics = portfolio_metrics(weights, mean_returns, covariance, risk_free_rate_annual)
+            losses = -(returns @ weights)
+            cvar = losses[losses >= np.quantile(losses, 0.95)].mean()
+            rc_gap = np.abs(risk_contributions(weights, covariance) - 1 / n).max()
+            print(f"{n:>6} {name:>22} {seconds * 1000:>9.2f} {metrics['volatility'][0]:>10.4f} {metrics['sharpe'][0]:>7.3f} "
+                  f"{cvar:>7.4f} {rc_gap:>10.2e}")
+
+
+def bench_resample(sizes=(6, 25), num_resamples=200, risk_free_rate_annual=0.04):
+    """Bootstrap-resampled max-Sharpe, single process vs a process pool, with the average weight dispersion."""
+    pool_sizes = sorted({1, os.cpu_count() or 1})
+    print(f"{'assets':>6} {'procs':>5} {'resamples':>9} {'s':>7} {'resamples/s':>11} {'mean std':>8} {'failed':>6}")
+    for n in sizes:
+        returns = synthetic_returns(n)
+        for processes in pool_sizes:
+            resampled, seconds = _time(lambda: resampled_optimization(returns, risk_free_rate_annual, num_resamples,
+                                                                      processes=processes), 1)
+            print(f"{n:>6} {processes:>5} {num_resamples:>9} {seconds:>7.2f} {num_resamples / seconds:>11.1f} "
+                  f"{resampled['std'].mean():>8.4f} {resampled['num_failed']:>6}")
+
+
+def bench_walk_forward(num_years=10, level_sizes=(3, 3, 5, 6, 6, 5, 5, 6), window=252, step=21, risk_free_rate_annual=0.04):
+    """Walk-forward backtest of eight risk levels: prefix-sum window moments vs per-window .cov(), and the full run."""
+    num_days = num_years * TRADING_DAYS
+    dates = pd.bdate_range("2015-01-01", periods=num_days)
+    print(f"{'level':>5} {'assets':>6} {'windows':>7} {'cov() ms':>9} {'prefix ms':>9} {'max |dcov|':>10} {'engine':>6} {'total ms':>9} {'oos sharpe':>10}")
+    total = 0.0
+    for level, n in enumerate(level_sizes, start=2):
+        returns = synthetic_returns(n, num_days, seed=level)
+        starts, ends = rebalance_schedule(num_days, window, step)
+        frame = pd.DataFrame(returns)
+        pandas_covariances, pandas_seconds = _time(lambda: np.array([frame.iloc[a:b].cov().to_numpy() for a, b in zip(starts, ends)]), 3)
+        (_, covariance), prefix_seconds = _time(lambda: window_moments(returns, starts, ends), 3)
+        for engine in ('slsqp', 'qp'):
+            backtest, seconds = _time(lambda: walk_forward(returns, dates, risk_free_rate_annual, window, step, engine=engine), 1)
+            total += seconds
+            print(f"{level:>5} {n:>6} {len(ends):>7} {pandas_seconds * 1000:>9.1f} {prefix_seconds * 1000:>9.2f} "
+                  f"{np.abs(covariance - pandas_covariances).max():>10.1e} {engine:>6} {seconds * 1000:>9.1f} {backtest['sharpe']:>10.3f}")
+    print(f"All levels, both engines: {total:.2f} s")
+
+
+def bench_rebalance(portfolio_counts=(8, 1_000, 5_000), num_assets=6, num_years=10, cost_rate=0.001):
+    """Every rebalancing policy over num_years of daily returns for P portfolios at once."""
+    returns = synthetic_returns(num_assets, num_years * TRADING_DAYS)
+    dates = pd.bdate_range("2015-01-01", periods=len(returns))
+    print(f"{'portfolios':>10} {'policy':>12} {'mask ms':>9} {'simulate ms':>11} {'mean rebalances':>15} {'mean turnover':>13}")
+    for count in portfolio_counts:
+        weights = np.random.default_rng(0).dirichlet(np.ones(num_assets), size=count)
+        for policy in POLICIES:
+            mask, mask_seconds = _time(lambda: np.broadcast_to(policy_mask(policy, returns, dates, weights), (count, len(returns))), 1)
+            (_, turnover), seconds = _time(lambda: simulate_rebalancing(returns, weights, mask, cost_rate), 1)
+            print(f"{count:>10,} {policy:>12} {mask_seconds * 1000:>9.1f} {seconds * 1000:>11.1f} "
+                  f"{mask[:, 1:].sum(axis=1).mean():>15.1f} {turnover.mean():>13.2f}")
+
+
+def bench_store(num_tickers=30, windows=(("2023-01-01", "2024-12-31"), ("2007-10-01", "2012-12-31"),
+                                          ("2020-02-01", "2021-06-30"), ("2022-01-01", "2024-12-31"),
+                                          ("2005-01-01", "2024-12-31"))):
+    """
+    Price store gap fetching over windows requested in an order that leaves holes between them (a later
+    window, then an earlier one, then ones in between). Also the regression check: every window must
+    read back exactly the provider's prices, with only the uncovered days fetched.
+    """
+    dates = pd.bdate_range("2005-01-03", "2024-12-31")
+    prices = pd.DataFrame(np.cumprod(1 + synthetic_returns(num_tickers, len(dates)), axis=0), index=dates,
+                          columns=[f"T{i}" for i in range(num_tickers)])
+    prices.iloc[:dates.searchsorted(pd.Timestamp("2015-05-05")), -1] = np.nan # Launched after the first windows
+    fetched_rows = []
+
+    def fetch(tickers, start_date, end_date):
+        window = prices.loc[(prices.index >= pd.Timestamp(start_date)) & (prices.index < pd.Timestamp(end_date)), tickers]
+        fetched_rows.append(len(window))
+        return window
+
+    print(f"{'window':>23} {'fetches':>7} {'rows fetched':>12} {'ms':>8} {'matches':>7}")
+    correct = True
+    with tempfile.TemporaryDirectory() as directory:
+        store = PriceStore(directory)
+        for start_date, end_date in windows:
+            fetched_rows.clear()
+            started = time.perf_counter()
+            price_data = store.get_prices(list(prices.columns), start_date, end_date, fetch)
+            seconds = time.perf_counter() - started
+            expected = prices.loc[(prices.index >= pd.Timestamp(start_date)) & (prices.index < pd.Timestamp(end_date))]
+            matches = price_data.shape == expected.shape and np.allclose(price_data.to_numpy(), expected.to_numpy(), equal_nan=True)
+            correct &= matches
+            print(f"{start_date + '..' + end_date:>23} {len(fetched_rows):>7} {sum(fetched_rows):>12,} {seconds * 1000:>8.0f} {str(matches):>7}")
+    print(f"Every window read back the provider's prices: {correct}")
+    if not correct:
+        raise SystemExit(1)
+
+
+def _full_recompute(returns_matrix, risk_free_rate_annual):
+    # The results page's metrics from the whole history: calculate_portfolio_returns_and_sharpe (through
+    # recommendation.portfolio_performance) and the risk metrics table's maximum drawdown
+    performance = portfolio_performance(returns_matrix, {returns_matrix.tickers[0]: 1.0}, risk_free_rate_annual)
+    max_drawdown = risk_metric_suite(np.ones((1, 1)), returns_matrix.values, risk_free_rate_annual)['max_drawdown'].iloc[0]
+    return performance['total_return'], performance['annualized_return'], performance['sharpe'], max_drawdown
+
+
+def _streamed(accumulator, risk_free_rate_annual):
+    return (accumulator.total_return(), accumulator.annualized_return(), accumulator.sharpe_ratio(risk_free_rate_annual),
+            accumulator.max_drawdown)
+
+
+def _relative_difference(actual, expected):
+    return max(abs(a - e) / max(abs(e), 1e-12) for a, e in zip(actual, expected))
+
+
+def bench_streaming(num_years=10, new_days=250, num_portfolios=8, risk_free_rate_annual=0.04, tolerance=1e-9):
+    """
+    Streaming metrics vs a full recompute with the results page's functions on every new trading day.
+    Also the equivalence check: after every new day, and after the state is persisted and reloaded, total
+    and annualized return, Sharpe ratio and maximum drawdown must match the full recompute within `tolerance`.
+    """
+    returns = synthetic_returns(num_portfolios, num_years * TRADING_DAYS + new_days)
+    dates = pd.bdate_range("2015-01-01", periods=len(returns))
+    history = num_years * TRADING_DAYS
+    print(f"{'portfolio':>9} {'full recompute us/day':>21} {'streaming us/day':>16} {'max rel diff':>12} {'persisted':>9}")
+    worst = 0.0
+    with tempfile.TemporaryDirectory() as directory:
+        store = MetricsStore(os.path.join(directory, "metrics.json"))
+        for p in range(num_portfolios):
+            series = pd.Series(returns[:, p], index=dates)
+            store.update(f"portfolio:{p}", series.iloc[:history], save=False)
+            started = time.perf_counter()
+            expected = [_full_recompute(ReturnsMatrix(returns[:day + 1, p:p + 1], [f"P{p}"], dates[:day + 1]), risk_free_rate_annual)
+                        for day in range(history, len(series))]
+            full_seconds = (time.perf_counter() - started) / new_days
+            actual = []
+            accumulator = store.get(f"portfolio:{p}")
+            started = time.perf_counter()
+            for day in range(history, len(series)):
+                accumulator.update(series.iloc[day], series.index[day])
+                actual.append(_streamed(accumulator, risk_free_rate_annual))
+            streaming_seconds = (time.perf_counter() - started) / new_days
+
+            store.save()
+            reloaded = MetricsStore(store.path).get(f"portfolio:{p}")
+            actual.append(_streamed(reloaded, risk_free_rate_annual))
+            diff = max(_relative_difference(a, e) for a, e in zip(actual, expected + expected[-1:]))
+            worst = max(worst, diff)
+            print(f"{p:>9} {full_seconds * 1e6:>21.1f} {streaming_seconds * 1e6:>16.1f} {diff:>12.1e} {str(reloaded.count == len(series)):>9}")
+    print(f"Equivalent to the full recompute after every day within {tolerance:g}: {worst <= tolerance}")
+    if worst > tolerance:
+        raise SystemExit(1)
+
+
+def _risk_metrics_loop(weights, returns, risk_free_rate_annual, benchmark_returns):
+    # One portfolio at a time with pandas, the way the results page evaluates a single portfolio
+    benchmark = pd.Series(benchmark_returns)
+    for w in weights:
+        daily = pd.Series(returns @ w)
+        growth = (1 + daily).cumprod()
+        annual_return = (1 + daily.mean())**TRADING_DAYS - 1
+        volatility = daily.std() * np.sqrt(TRADING_DAYS)
+        _ = ((annual_return - risk_free_rate_annual) / volatility, (growth / growth.cummax() - 1).min(),
+             -daily.quantile(0.05), daily.cov(benchmark) / benchmark.var(), (daily - benchmark).std() * np.sqrt(TRADING_DAYS))
+
+
+def bench_risk_metrics(portfolio_counts=(16, 1_000, 10_000), num_assets=12, num_years=10, risk_free_rate_annual=0.04):
+    """Batched risk metric suite vs a per-portfolio pandas loop (loop timed on at most 1,000 portfolios)."""
+    returns = synthetic_returns(num_assets, num_years * TRADING_DAYS)
+    print(f"{'portfolios':>10} {'batched ms':>10} {'loop ms':>10} {'portfolios/s':>13}")
+    for count in portfolio_counts:
+        weights = np.random.default_rng(0).dirichlet(np.ones(num_assets), size=count)
+        _, seconds = _time(lambda: risk_metric_suite(weights, returns, risk_free_rate_annual, returns[:, 0]), 1)
+        looped = min(count, 1_000)
+        _, loop_seconds = _time(lambda: _risk_metrics_loop(weights[:looped], returns, risk_free_rate_annual, returns[:, 0]), 1)
+        print(f"{count:>10,} {seconds * 1000:>10.1f} {loop_seconds * count / looped * 1000:>10.1f} {count / seconds:>13,.0f}")
+
+
+def _fixed_portfolio_loop(returns_matrix, allocations, risk_free_rate_annual):
+    # One allocation at a time, the way calculate_portfolio_returns_and_sharpe evaluates a portfolio
+    for allocation in allocations.values():
+        tickers = list(allocation)
+        block, dates = returns_matrix.complete_rows(tickers)
+        weights = np.array([allocation[t] for t in tickers])
+        daily = pd.Series(np.asarray(block) @ (weights / weights.sum()), index=dates)
+        growth = (1 + daily).cumprod()
+        _ = ((growth.iloc[-1] - 1) * 100, ((1 + daily.mean())**TRADING_DAYS - 1 - risk_free_rate_annual) / (daily.std() * np.sqrt(TRADING_DAYS)))
+
+
+def bench_fixed_matrix(portfolio_counts=(8, 100, 1_000), num_tickers=30, num_years=10, risk_free_rate_annual=0.04):
+    """All fixed-style allocations from one PortfolioMatrix product vs one evaluation per allocation."""
+    rng = np.random.default_rng(0)
+    returns = synthetic_returns(num_tickers, num_years * TRADING_DAYS)
+    returns[:rng.integers(0, 500), rng.choice(num_tickers, 5, replace=False)] = np.nan # ETFs with a later inception
+    tickers = [f"ETF{i}" for i in range(num_tickers)]
+    returns_matrix = ReturnsMatrix(returns, tickers, pd.bdate_range("2015-01-01", periods=len(returns)))
+    print(f"{'portfolios':>10} {'matrix ms':>10} {'loop ms':>10} {'speedup':>8}")
+    for count in portfolio_counts:
+        allocations = {}
+        for p in range(count):
+            held = rng.choice(tickers, rng.integers(3, 7), replace=False)
+            allocations[p] = dict(zip(held, rng.dirichlet(np.ones(len(held)))))
+        _, seconds = _time(lambda: PortfolioMatrix.from_returns_matrix(allocations, returns_matrix).evaluate(returns_matrix, risk_free_rate_annual), 3)
+        _, loop_seconds = _time(lambda: _fixed_portfolio_loop(returns_matrix, allocations, risk_free_rate_annual), 1)
+        print(f"{count:>10,} {seconds * 1000:>10.1f} {loop_seconds * 1000:>10.1f} {loop_seconds / seconds:>7.1f}x")
+
+
+def bench_projection(path_counts=(10_000, 50_000, 200_000), horizon_years=30, processes=None):
+    """Streaming-percentile wealth projection: wall time and summary memory vs storing every path."""
+    daily_returns = synthetic_returns(1, 10 * TRADING_DAYS)[:, 0]
+    mean, variance = daily_returns.mean(), daily_returns.var(ddof=1)
+    num_steps = horizon_years * 12
+    summary_bytes = HistogramQuantiles(np.zeros(num_steps), np.ones(num_steps)).counts.nbytes
+    print(f"{'paths':>8} {'gbm ms':>8} {'boot ms':>8} {'summary MB':>11} {'all paths MB':>13}")
+    for count in path_counts:
+        _, gbm_seconds = _time(lambda: project_wealth('gbm', horizon_years, mean, variance, num_paths=count, processes=processes), 1)
+        _, bootstrap_seconds = _time(lambda: project_wealth('bootstrap', horizon_years, daily_returns=daily_returns, num_paths=count,
+                                                            processes=processes), 1)
+        print(f"{count:>8,} {gbm_seconds * 1000:>8.0f} {bootstrap_seconds * 1000:>8.0f} {summary_bytes / 1e6:>11.1f} "
+              f"{count * num_steps * 8 / 1e6:>13.1f}")
+
+    # Histogram percentiles against exact percentiles of the same stored paths
+    log_mean, log_std = lognormal_parameters(mean, variance)
+    days = 21 * np.arange(1, num_steps + 1)
+    log_growth = np.cumsum(np.random.default_rng(0).normal(log_mean * 21, log_std * np.sqrt(21), size=(20_000, num_steps)), axis=1)
+    histogram = HistogramQuantiles(log_mean * days - 6 * log_std * np.sqrt(days), log_mean * days + 6 * log_std * np.sqrt(days))
+    histogram.update(log_growth)
+    levels = [0.05, 0.25, 0.5, 0.75, 0.95]
+    error = np.abs(np.exp(histogram.quantiles(levels)) / np.exp(np.quantile(log_growth, levels, axis=0).T) - 1).max()
+    print(f"Max relative error of streamed percentiles vs exact (20,000 paths): {error:.1e}")
+
+
+def _stress_test_loop(returns, allocations):
+    # One portfolio at a time with pandas: drawdown, trough and recovery
+    for allocation in allocations.values():
+        daily = returns[list(allocation)] @ pd.Series(allocation)
+        growth = (1 + daily).cumprod()
+        drawdown = growth / growth.cummax().clip(lower=1) - 1
+        trough = drawdown.idxmin()
+        peak = max(growth[:trough].max(), 1)
+        _ = (drawdown.min(), growth[trough:][growth[trough:] >= peak].index[:1])
+
+
+def bench_stress(portfolio_counts=(16, 1_000, 10_000), num_tickers=30, num_years=5):
+    """Stress-scenario replay of many allocations in one pass vs a per-portfolio pandas loop (loop capped at 1,000)."""
+    rng = np.random.default_rng(0)
+    tickers = [f"ETF{i}" for i in range(num_tickers)]
+    returns = pd.DataFrame(synthetic_returns(num_tickers, num_years * TRADING_DAYS), columns=tickers,
+                           index=pd.bdate_range("2007-10-01", periods=num_years * TRADING_DAYS))
+    returns_matrix = ReturnsMatrix(returns.to_numpy(np.float32), tickers, returns.index)
+    print(f"{'portfolios':>10} {'batched ms':>10} {'loop ms':>10} {'portfolios/s':>13}")
+    for count in portfolio_counts:
+        allocations = {}
+        for p in range(count):
+            held = rng.choice(tickers, rng.integers(3, 7), replace=False)
+            allocations[p] = dict(zip(held, rng.dirichlet(np.ones(len(held)))))
+        _, seconds = _time(lambda: stress_test(returns_matrix, allocations), 1)
+        looped = dict(list(allocations.items())[:1_000])
+        _, loop_seconds = _time(lambda: _stress_test_loop(returns, looped), 1)
+        print(f"{count:>10,} {seconds * 1000:>10.1f} {loop_seconds * count / len(looped) * 1000:>10.1f} {count / seconds:>13,.0f}")
+
+
+def bench_scoring(client_counts=(10_000, 100_000, 1_000_000)):
+    """Bulk questionnaire scoring with lookup tables and searchsorted vs score_answers/risk_profile per client (loop capped at 100,000)."""
+    rng = np.random.default_rng(0)
+    print(f"{'clients':>10} {'bulk ms':>10} {'loop ms':>10} {'clients/s':>13}")
+    for count in client_counts:
+        answers = rng.integers(0, OPTION_COUNTS, size=(count, len(OPTION_COUNTS)))
+        _, seconds = _time(lambda: score_clients(answers), 3)
+        looped = answers[:100_000].tolist()
+        _, loop_seconds = _time(lambda: [risk_profile(score_answers(row)) for row in looped], 1)
+        print(f"{count:>10,} {seconds * 1000:>10.1f} {loop_seconds * count / len(looped) * 1000:>10.1f} {count / seconds:>13,.0f}")
+
+
+def _growth_chart(growth, title):
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(growth)
+    ax.set_title(title)
+    ax.grid(True)
+    return fig
+
+
+def bench_figures(chart_counts=(4, 16), visits=20, formats=('png', 'svg')):
+    """
+    A results page's charts rendered by matplotlib on every visit vs served from a FigureCache: `visits`
+    page views of `chart_counts` distinct growth charts, the first view of each chart drawing it.
+    """
+    growth = np.cumprod(1 + synthetic_returns(8, num_days=2520), axis=0)
+    print(f"{'format':>6} {'charts':>6} {'uncached ms/page':>17} {'cached ms/page':>15} {'hit rate':>9} {'cache MB':>9}")
+    for format in formats:
+        for count in chart_counts:
+            titles = [f"Risk Level {i + 1}" for i in range(count)]
+            uncached = FigureCache(max_entries=0)
+            _, seconds = _time(lambda: [uncached.render(_growth_chart, growth, t, format=format) for t in titles], 1)
+            cache = FigureCache()
+            started = time.perf_counter()
+            for _ in range(visits):
+                for title in titles:
+                    cache.render(_growth_chart, growth, title, format=format)
+            cached_seconds = (time.perf_counter() - started) / visits
+            print(f"{format:>6} {count:>6} {seconds * 1000:>17.1f} {cached_seconds * 1000:>15.1f} "
+                  f"{cache.hits / (cache.hits + cache.misses):>9.0%} {cache.num_bytes / 1e6:>9.1f}")
+
+
+async def _load_test(host, port, concurrency, num_requests, answers):
+    # `concurrency` keep-alive clients posting one request after another; returns latencies in seconds
+    latencies = []
+
+    async def client(requests):
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in requests:
+            body = json.dumps({'answers': answers[i]}).encode()
+            started = time.perf_counter()
+            writer.write(f"POST /recommend HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            headers = {}
+            await reader.readline()
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+            await reader.readexactly(int(headers['content-length']))
+            latencies.append(time.perf_counter() - started)
+        writer.close()
+
+    await asyncio.gather(*(client(range(c, num_requests, concurrency)) for c in range(concurrency)))
+    return np.array(latencies)
+
+
+def bench_service(concurrency_levels=(1, 16, 64, 256), num_requests=4_000, batch_windows=(0.0, 0.002), num_years=2):
+    """Load test of the local recommendation service: throughput and p50/p99 latency with and without request batching."""
+    tickers = [t for t in universe_tickers('conventional') if t != RISK_FREE_TICKER]
+    dates = pd.bdate_range("2023-01-02", periods=num_years * TRADING_DAYS)
+    prices = pd.DataFrame(100 * np.cumprod(1 + synthetic_returns(len(tickers), len(dates)), axis=0), index=dates, columns=tickers)
+    prices[RISK_FREE_TICKER] = 4.5
+    rng = np.random.default_rng(0)
+    answers = (rng.integers(0, OPTION_COUNTS, size=(num_requests, len(OPTION_COUNTS))) + 1).tolist()
+
+    async def run(directory, batch_window):
+        service = RecommendationService(provider=FilePriceProvider(path), store=PriceStore(directory), batch_window=batch_window)
+        host, port = await service.start(port=0)
+        for concurrency in concurrency_levels:
+            batches = service.stats['batches']
+            started = time.perf_counter()
+            latencies = await _load_test(host, port, concurrency, num_requests, answers)
+            seconds = time.perf_counter() - started
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(f"{batch_window * 1000:>9.1f} {concurrency:>11} {num_requests / seconds:>10,.0f} {p50:>8.2f} {p99:>8.2f} "
+                  f"{num_requests / (service.stats['batches'] - batches):>10.1f}")
+        await service.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "prices.parquet")
+        save_price_fixture(prices, path)
+        print(f"{'window ms':>9} {'concurrency':>11} {'requests/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'batch size':>10}")
+        for batch_window in batch_windows:
+            asyncio.run(run(directory, batch_window))
+
+
+STARTUP_APPS = ('app.py', 'app-FINAL.py')
+STARTUP_HISTORY = os.environ.get("STARTUP_HISTORY", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".startup_history.jsonl"))
+_IMPORT_TIMER = """
+import importlib, json, sys, time
+report = {'missing': []}
+for group in ('startup', 'results'):
+    started = time.perf_counter()
+    for name in json.loads(sys.argv[1])[group]:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            report['missing'].append(name)
+    report[group] = time.perf_counter() - started
+print(json.dumps(report))
+"""
+_FIRST_PAGE_TIMER = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+started = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+print(json.dumps({'first_page': time.perf_counter() - started, 'failed': bool(app.exception),
+                  'heavy': sorted(m for m in ('scipy', 'matplotlib', 'yfinance') if m in sys.modules)}))
+"""
+
+
+def _app_imports(path):
+    """{'startup': modules imported at the top of a Streamlit app, 'results': modules imported inside its pages}."""
+    tree = ast.parse(open(path).read())
+    top_level = {id(node) for node in tree.body}
+    imports = {'startup': [], 'results': []}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [node.module] if isinstance(node, ast.ImportFrom) else [alias.name for alias in node.names]
+            imports['startup' if id(node) in top_level else 'results'] += names
+    return imports
+
+
+def _run_timer(script, *args):
+    output = subprocess.run([sys.executable, "-c", script, *args], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(output.stdout) if output.returncode == 0 else None
+
+
+def bench_startup(repeats=5):
+    """
+    Cold start of the Streamlit apps in fresh interpreters (best of `repeats`): import time of the modules
+    at the top of each app, of the ones its results page imports on top of those, and the time to render
+    the first page with streamlit's AppTest (skipped when streamlit is not installed). Each run is appended
+    to STARTUP_HISTORY and compared with the previous one, so startup regressions show up over time.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=directory).stdout.strip()
+    previous = {}
+    if os.path.exists(STARTUP_HISTORY):
+        with open(STARTUP_HISTORY) as f:
+            for line in f:
+                record = json.loads(line)
+                previous[record['app']] = record
+    print(f"{'app':>12} {'startup ms':>10} {'results ms':>10} {'first page ms':>13} {'previous run':>13}  notes")
+    with open(STARTUP_HISTORY, "a") as history:
+        for app in STARTUP_APPS:
+            imports = _app_imports(os.path.join(directory, app))
+            reports = [_run_timer(_IMPORT_TIMER, json.dumps(imports)) for _ in range(repeats)]
+            pages = [page for page in (_run_timer(_FIRST_PAGE_TIMER, app) for _ in range(repeats)) if page and not page['failed']]
+            record = {'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'commit': commit, 'app': app,
+                      'startup': min(r['startup'] for r in reports), 'results': min(r['results'] for r in reports),
+                      'first_page': min(p['first_page'] for p in pages) if pages else None,
+                      'heavy_on_first_page': pages[0]['heavy'] if pages else None, 'missing': reports[0]['missing']}
+            history.write(json.dumps(record) + "\n")
+            notes = []
+            if record['missing']:
+                notes.append(f"not installed: {', '.join(record['missing'])}")
+            if record['heavy_on_first_page']:
+                notes.append(f"first page loads {', '.join(record['heavy_on_first_page'])}")
+            first_page = f"{record['first_page'] * 1000:.0f}" if pages else "n/a"
+            before = previous.get(app)
+            if before: # Startup / first page milliseconds of the previous run
+                before = f"{before['startup'] * 1000:.0f}/{before['first_page'] * 1000:.0f}" if before['first_page'] else f"{before['startup'] * 1000:.0f}/n/a"
+            print(f"{app:>12} {record['startup'] * 1000:>10.0f} {record['results'] * 1000:>10.0f} {first_page:>13} "
+                  f"{before or 'n/a':>13}  {'; '.join(notes)}")
+
+
+BENCHMARKS = {
+    'solver': bench_solver,
+    'engines': bench_engines,
+    'frontier': bench_frontier,
+    'random': bench_random,
+    'objectives': bench_objectives,
+    'resample': bench_resample,
+    'walkforward': bench_walk_forward,
+    'rebalance': bench_rebalance,
+    'streaming': bench_streaming,
+    'store': bench_store,
+    'riskmetrics': bench_risk_metrics,
+    'fixedmatrix': bench_fixed_matrix,
+    'projection': bench_projection,
+    'stress': bench_stress,
+    'scoring': bench_scoring,
+    'figures': bench_figures,
+    'service': bench_service,
+    'startup': bench_startup,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Portfolio engine benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    BENCHMARKS[parser.parse_args().name]()
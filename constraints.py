@@ -0,0 +1,168 @@
+import numpy as np
+
+# --- Portfolio Constraints ---
+# Category min/max, per-asset caps and a maximum turnover against a reference (fixed) portfolio,
+# compiled into dense linear inequalities A x >= b over x = [weights, turnover slacks]. The budget
+# (sum of weights = 1) and long-only bounds are always implied. Turnover |w - w0| is linearized
+# with one slack t_i >= |w_i - w0_i| per asset, so every constraint has a constant Jacobian.
+
+
+class LinearConstraints:
+    """Compiled constraints for one ordered ticker universe."""
+
+    def __init__(self, tickers, A, b, upper_bounds, num_slacks=0, reference_weights=None):
+        self.tickers = list(tickers)
+        self.A = A
+        self.b = b
+        self.upper_bounds = upper_bounds
+        self.num_slacks = num_slacks
+        self.reference_weights = reference_weights
+
+    @property
+    def num_assets(self):
+        return len(self.tickers)
+
+    @property
+    def num_variables(self):
+        return self.num_assets + self.num_slacks
+
+    def bounds(self):
+        return [(0.0, ub) for ub in self.upper_bounds] + [(0.0, None)] * self.num_slacks
+
+    def slsqp_constraints(self):
+        """SLSQP constraint dicts over the full variable vector, with analytic (constant) Jacobians."""
+        n = self.num_assets
+        budget_jac = np.concatenate([np.ones(n), np.zeros(self.num_slacks)])
+        constraints = [{'type': 'eq', 'fun': lambda x: np.sum(x[:n]) - 1, 'jac': lambda x: budget_jac}]
+        if len(self.b):
+            A, b = self.A, self.b
+            constraints.append({'type': 'ineq', 'fun': lambda x: A @ x - b, 'jac': lambda x: A})
+        return constraints
+
+    def homogeneous_rows(self):
+        """
+        Rows G with G y >= 0 equivalent to the weight constraints under w = y / sum(y), for the
+        tangency QP. Only available without turnover slacks.
+        """
+        if self.num_slacks:
+            raise ValueError("Turnover constraints need slack variables and cannot be homogenized.")
+        rows = [self.A - self.b[:, None]]
+        capped = np.flatnonzero(self.upper_bounds < 1.0)
+        if len(capped):
+            caps = np.tile(self.upper_bounds[capped][:, None], (1, self.num_assets)) # cap * sum(y) - y_i >= 0
+            caps[np.arange(len(capped)), capped] -= 1.0
+            rows.append(caps)
+        return np.vstack(rows)
+
+    def initial_point(self):
+        n = self.num_assets
+        weights = self.reference_weights if self.reference_weights is not None else np.full(n, 1 / n)
+        weights = np.minimum(weights, self.upper_bounds)
+        weights = weights / weights.sum() if weights.sum() > 0 else np.full(n, 1 / n)
+        if not self.num_slacks:
+            return weights
+        return np.concatenate([weights, np.abs(weights - self.reference_weights)])
+
+    def feasible(self, weights, tolerance=1e-9):
+        """Which rows of a (P x n) matrix of fully-invested, long-only weights satisfy the constraints."""
+        weights = np.atleast_2d(weights)
+        x = weights
+        if self.num_slacks: # The tightest slacks are |w - w0|
+            x = np.hstack([weights, np.abs(weights - self.reference_weights)])
+        feasible = (weights <= self.upper_bounds + tolerance).all(axis=1)
+        if len(self.b):
+            feasible &= (x @ self.A.T >= self.b - tolerance).all(axis=1)
+        return feasible
+
+    def violation(self, weights):
+        """Largest constraint violation of a weights vector (0 when feasible)."""
+        x = weights
+        if self.num_slacks:
+            x = np.concatenate([weights, np.abs(weights - self.reference_weights)])
+        violations = [abs(np.sum(weights) - 1), np.max(weights - self.upper_bounds, initial=0.0), np.max(-weights, initial=0.0)]
+        if len(self.b):
+            violations.append(np.max(self.b - self.A @ x, initial=0.0))
+        return float(max(violations))
+
+
+def compile_constraints(tickers, etf_to_category=None, category_bounds=None, max_asset_weight=None,
+                        asset_caps=None, reference_allocation=None, max_turnover=None):
+    """
+    Compiles constraints for `tickers` into a LinearConstraints.
+
+    category_bounds: {category: (min, max)} on the summed weight of the universe's tickers in that
+        category (via etf_to_category). Categories with no ticker in the universe are skipped.
+    max_asset_weight / asset_caps: a cap for every asset and/or {ticker: cap} overrides.
+    reference_allocation / max_turnover: sum |w - w0| <= max_turnover against {ticker: weight};
+        reference weight held outside the universe counts as turnover that must be sold.
+    Raises ValueError when the constraints are infeasible on their face.
+    """
+    tickers = list(tickers)
+    n = len(tickers)
+    upper_bounds = np.full(n, 1.0 if max_asset_weight is None else float(max_asset_weight))
+    for ticker, cap in (asset_caps or {}).items():
+        if ticker in tickers:
+            upper_bounds[tickers.index(ticker)] = min(upper_bounds[tickers.index(ticker)], cap)
+    if upper_bounds.sum() < 1 - 1e-9:
+        raise ValueError(f"Asset caps sum to {upper_bounds.sum():.2f}, so the portfolio cannot be fully invested.")
+
+    rows, rhs = [], []
+    category_mins = 0.0
+    for category, (low, high) in (category_bounds or {}).items():
+        members = np.array([etf_to_category.get(t) == category for t in tickers], dtype=float)
+        if not members.any():
+            continue
+        category_mins += low
+        if low > 0:
+            rows.append(members)
+            rhs.append(low)
+        if high < 1:
+            rows.append(-members)
+            rhs.append(-high)
+    if category_mins > 1 + 1e-9:
+        raise ValueError(f"Category minimums add up to {category_mins:.2f}, more than the whole portfolio.")
+
+    num_slacks = 0
+    reference_weights = None
+    if reference_allocation is not None:
+        reference_weights = np.array([reference_allocation.get(t, 0.0) for t in tickers])
+    if max_turnover is not None:
+        if reference_weights is None:
+            raise ValueError("max_turnover needs a reference_allocation to measure turnover against.")
+        outside = sum(w for t, w in reference_allocation.items() if t not in tickers)
+        if outside > max_turnover + 1e-9:
+            raise ValueError(f"{outside:.2f} of the reference portfolio is outside this universe, above the turnover limit of {max_turnover:.2f}.")
+        num_slacks = n
+        rows = [np.concatenate([row, np.zeros(n)]) for row in rows]
+        identity = np.eye(n)
+        rows.extend(np.hstack([-identity, identity])) # t_i - w_i >= -w0_i
+        rhs.extend(-reference_weights)
+        rows.extend(np.hstack([identity, identity])) # t_i + w_i >= w0_i
+        rhs.extend(reference_weights)
+        rows.append(np.concatenate([np.zeros(n), -np.ones(n)])) # sum(t) <= max_turnover - outside
+        rhs.append(-(max_turnover - outside))
+
+    A = np.array(rows, dtype=float).reshape(len(rows), n + num_slacks)
+    return LinearConstraints(tickers, A, np.array(rhs, dtype=float), upper_bounds, num_slacks, reference_weights)
+
+
+def constraint_specs_from_fixed(portfolio_data_fixed, etf_to_category, category_tolerance=None,
+                                max_asset_weight=None, max_turnover=None):
+    """
+    Per-risk-level compile_constraints keyword arguments derived from the fixed portfolios:
+    category weights within +/- category_tolerance of 'category_allocation', an optional cap on every
+    asset and an optional turnover limit against 'specific_etf_allocation'. None disables a constraint.
+    """
+    specs = {}
+    for risk_level, portfolio in portfolio_data_fixed.items():
+        spec = {'etf_to_category': etf_to_category, 'max_asset_weight': max_asset_weight}
+        if category_tolerance is not None:
+            spec['category_bounds'] = {
+                category: (max(0.0, target - category_tolerance), min(1.0, target + category_tolerance))
+                for category, target in portfolio['category_allocation'].items()
+            }
+        if max_turnover is not None:
+            spec['reference_allocation'] = portfolio['specific_etf_allocation']
+            spec['max_turnover'] = max_turnover
+        specs[risk_level] = spec
+    return specs
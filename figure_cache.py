@@ -0,0 +1,131 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# --- Figure Cache ---
+# Rendered charts keyed by a hash of what they show: the plotting function's code and every argument it
+# gets (allocation, series, title, figure size, ...) plus the output format and resolution. Identical
+# charts (e.g. the same risk level's pies for every user) are drawn once per process and then served as
+# PNG/SVG bytes without touching matplotlib. Entries are evicted least recently used beyond max_entries
+# or max_bytes. Every figure drawn is closed after rendering, even when saving it fails.
+
+MAX_ENTRIES = 512
+MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_FORMAT = 'png'
+DEFAULT_DPI = 200 # st.pyplot's resolution
+
+
+def _feed(hasher, value):
+    # Type-tagged encoding, so e.g. [1, 2] and (1, 2) or '1' and 1 hash differently. Dicts keep their
+    # order: a pie's wedges and legend follow the allocation's order
+    hasher.update(type(value).__name__.encode())
+    if isinstance(value, dict):
+        hasher.update(str(len(value)).encode())
+        for key, item in value.items():
+            _feed(hasher, key)
+            _feed(hasher, item)
+    elif isinstance(value, (list, tuple)):
+        hasher.update(str(len(value)).encode())
+        for item in value:
+            _feed(hasher, item)
+    elif isinstance(value, (pd.Series, pd.DataFrame)):
+        _feed(hasher, value.index)
+        if isinstance(value, pd.DataFrame):
+            _feed(hasher, value.columns)
+        _feed(hasher, value.to_numpy())
+    elif isinstance(value, pd.Index):
+        _feed(hasher, value.to_numpy())
+    elif isinstance(value, np.ndarray):
+        hasher.update(f"{value.dtype.str}{value.shape}".encode())
+        if value.dtype.hasobject:
+            _feed(hasher, value.tolist())
+        else:
+            hasher.update(np.ascontiguousarray(value).tobytes())
+    else:
+        hasher.update(repr(value).encode())
+    hasher.update(b";")
+
+
+def _feed_code(hasher, code):
+    hasher.update(code.co_code)
+    _feed(hasher, code.co_names)
+    for constant in code.co_consts:
+        if isinstance(constant, type(code)):
+            _feed_code(hasher, constant)
+        else:
+            _feed(hasher, constant)
+
+
+def figure_key(plot_function, args=(), kwargs=None, format=DEFAULT_FORMAT, dpi=DEFAULT_DPI):
+    """Content hash of a chart: plot_function's code, its arguments and the output format/resolution."""
+    hasher = hashlib.sha256()
+    hasher.update(f"{plot_function.__module__}.{plot_function.__qualname__}".encode())
+    _feed_code(hasher, plot_function.__code__) # Editing the function invalidates its charts
+    _feed(hasher, list(args))
+    _feed(hasher, kwargs or {})
+    _feed(hasher, (format, dpi))
+    return hasher.hexdigest()
+
+
+def render_figure(fig, format=DEFAULT_FORMAT, dpi=DEFAULT_DPI):
+    """PNG/SVG bytes of a matplotlib figure, which is closed afterwards."""
+    import matplotlib.pyplot as plt # Only needed when a chart is actually drawn
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=format, dpi=dpi, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class FigureCache:
+    """Thread-safe LRU cache of rendered charts, shared by every session of the process."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> rendered bytes, least recently used first
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            chart = self.entries.get(key)
+            if chart is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return chart
+
+    def put(self, key, chart):
+        with self._lock:
+            if key in self.entries:
+                self.num_bytes -= len(self.entries.pop(key))
+            self.entries[key] = chart
+            self.num_bytes += len(chart)
+            while self.entries and (len(self.entries) > self.max_entries or self.num_bytes > self.max_bytes):
+                _, evicted = self.entries.popitem(last=False)
+                self.num_bytes -= len(evicted)
+
+    def render(self, plot_function, *args, format=DEFAULT_FORMAT, dpi=DEFAULT_DPI, **kwargs):
+        """
+        Bytes of the chart plot_function(*args, **kwargs) draws, from the cache when the same chart was
+        rendered before. plot_function returns a matplotlib figure, or None when there is nothing to plot
+        (not cached, so the function runs, and can warn, again next time).
+        """
+        key = figure_key(plot_function, args, kwargs, format, dpi)
+        chart = self.get(key)
+        if chart is None:
+            fig = plot_function(*args, **kwargs)
+            if fig is None:
+                return None
+            chart = render_figure(fig, format, dpi)
+            self.put(key, chart)
+        return chart
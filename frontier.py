@@ -0,0 +1,101 @@
+import numpy as np
+from scipy.optimize import minimize
+
+from optimization import TRADING_DAYS
+
+# --- Efficient Frontier ---
+# K long-only, fully-invested problems solved in sequence, each warm-started from its neighbour,
+# with every point's metrics computed afterwards in one vectorized pass over the (K x n) weights.
+# Optional linear constraints (constraints.py) restrict every point to the optimizer's feasible set.
+
+
+def portfolio_metrics(weights, mean_returns, covariance_matrix, risk_free_rate_annual):
+    """
+    Annualized return, volatility and Sharpe ratio for each row of a (P x n) weights matrix,
+    annualized the same way as the apps ((1+r)**252 compounding, sqrt(252) volatility).
+    """
+    weights = np.atleast_2d(weights)
+    daily_returns = weights @ mean_returns
+    daily_std = np.sqrt(np.maximum(np.einsum('pi,pi->p', weights @ covariance_matrix, weights), 0.0)) # Row-wise w' S w
+    annual_returns = (1 + daily_returns)**TRADING_DAYS - 1
+    annual_volatility = daily_std * np.sqrt(TRADING_DAYS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(annual_volatility > 1e-12, (annual_returns - risk_free_rate_annual) / annual_volatility, np.nan)
+    return {'return': annual_returns, 'volatility': annual_volatility, 'sharpe': sharpe}
+
+
+def _solve(objective, jac, start, constraints, bounds):
+    result = minimize(objective, start, jac=jac, method='SLSQP', bounds=bounds,
+                      constraints=constraints, options={'disp': False, 'maxiter': 200, 'ftol': 1e-12})
+    return result.x, result.success
+
+
+def _weights(x, num_assets):
+    weights = np.clip(x[:num_assets], 0, None)
+    return weights / weights.sum()
+
+
+def efficient_frontier(mean_returns, covariance_matrix, risk_free_rate_annual, num_points=50, mode='return', constraints=None):
+    """
+    Traces the long-only frontier from the minimum-variance portfolio to the highest-return portfolio.
+
+    mode='return' minimizes variance at evenly spaced target daily returns;
+    mode='volatility' maximizes return at evenly spaced target daily volatilities.
+    constraints is an optional constraints.LinearConstraints for the same ticker order, so the frontier
+    is traced over the same portfolios the optimizer may pick; the top end is then the highest-return
+    feasible portfolio rather than the highest-return asset.
+    Returns a dict with 'weights' (K x n), 'targets', 'converged' and the portfolio_metrics arrays.
+    """
+    if mode not in ('return', 'volatility'):
+        raise ValueError(f"Unknown frontier mode '{mode}'. Use 'return' or 'volatility'.")
+    mean_returns = np.asarray(mean_returns, dtype=float)
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    num_assets = len(mean_returns)
+
+    # Variables are [weights, turnover slacks] under constraints; objectives only see the weights
+    if constraints is None:
+        num_variables, bounds, start = num_assets, [(0, 1)] * num_assets, np.full(num_assets, 1 / num_assets)
+        base = [{'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones_like(x)}]
+    else:
+        num_variables, bounds, start = constraints.num_variables, constraints.bounds(), constraints.initial_point()
+        base = constraints.slsqp_constraints()
+    padding = np.zeros(num_variables - num_assets)
+    mean_jac = np.concatenate([mean_returns, padding])
+
+    def variance(x):
+        return x[:num_assets] @ covariance_matrix @ x[:num_assets]
+
+    def variance_jac(x):
+        return np.concatenate([2 * covariance_matrix @ x[:num_assets], padding])
+
+    min_variance_x, _ = _solve(variance, variance_jac, start, base, bounds)
+    min_variance_weights = _weights(min_variance_x, num_assets)
+    if constraints is None:
+        top_weights = np.eye(num_assets)[int(np.argmax(mean_returns))]
+    else:
+        top_x, _ = _solve(lambda x: -(x @ mean_jac), lambda x: -mean_jac, min_variance_x, base, bounds)
+        top_weights = _weights(top_x, num_assets)
+
+    if mode == 'return':
+        targets = np.linspace(min_variance_weights @ mean_returns, top_weights @ mean_returns, num_points)
+    else:
+        targets = np.linspace(np.sqrt(min_variance_weights @ covariance_matrix @ min_variance_weights),
+                              np.sqrt(top_weights @ covariance_matrix @ top_weights), num_points)
+
+    weights = np.empty((num_points, num_assets))
+    converged = np.zeros(num_points, dtype=bool)
+    x = min_variance_x
+    for k, target in enumerate(targets):
+        if mode == 'return':
+            target_constraint = {'type': 'eq', 'fun': lambda x, t=target: x @ mean_jac - t, 'jac': lambda x: mean_jac}
+            x, converged[k] = _solve(variance, variance_jac, x, base + [target_constraint], bounds)
+        else:
+            target_constraint = {'type': 'ineq', 'fun': lambda x, t=target: t**2 - variance(x), 'jac': lambda x: -variance_jac(x)}
+            x, converged[k] = _solve(lambda x: -(x @ mean_jac), lambda x: -mean_jac, x, base + [target_constraint], bounds)
+        weights[k] = _weights(x, num_assets) # x warm starts the next, neighbouring target
+        if constraints is not None and constraints.violation(weights[k]) > 1e-6:
+            converged[k] = False
+
+    frontier = {'weights': weights, 'targets': targets, 'converged': converged}
+    frontier.update(portfolio_metrics(weights, mean_returns, covariance_matrix, risk_free_rate_annual))
+    return frontier
@@ -0,0 +1,125 @@
+import threading
+
+import numpy as np
+
+# --- Moment Cache ---
+# Every risk-level universe is a subset of the downloaded tickers, so the mean vector and covariance
+# matrix are computed once for the whole universe per data snapshot and then sliced by integer index.
+# By default a sub-universe's moments use the rows where all of its own tickers have returns, as
+# returns_df[tickers].dropna() did: when those are the universe's complete rows the precomputed
+# moments are sliced, otherwise the sub-universe is computed once on its own rows and kept.
+
+SUBSET_SAMPLE = 'subset' # Every moment of a sub-universe uses only the rows where all of its tickers have returns
+COMMON_SAMPLE = 'common' # Every moment uses only the rows where all tickers in the universe have returns
+PAIRWISE = 'pairwise' # Each mean uses all of its asset's rows; each covariance uses the rows both assets share
+POLICIES = (SUBSET_SAMPLE, COMMON_SAMPLE, PAIRWISE)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class MomentCache:
+    """Daily mean returns and covariance for every ticker of a ReturnsMatrix."""
+
+    def __init__(self, returns_matrix, policy=SUBSET_SAMPLE):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown NaN policy '{policy}'. Use one of {', '.join(POLICIES)}.")
+        self.returns_matrix = returns_matrix
+        self.policy = policy
+        values = np.asarray(returns_matrix.values, dtype=np.float64)
+        if policy == PAIRWISE:
+            self.mean, self.covariance, self.observations = _pairwise_moments(values)
+        else:
+            self.mean, self.covariance, self.observations = _common_sample_moments(values)
+        self._values = values
+        self._complete = ~np.isnan(values).any(axis=1)
+        self._subsets = {} # Sorted column indices -> (mean, covariance, observations) on the subset's complete rows
+        self._lock = threading.Lock()
+
+    def indices(self, tickers):
+        return self.returns_matrix.indices(tickers)
+
+    def _subset_moments(self, idx):
+        columns = np.unique(idx)
+        key = tuple(columns)
+        with self._lock:
+            cached = self._subsets.get(key)
+        if cached is None:
+            complete = ~np.isnan(self._values[:, columns]).any(axis=1)
+            if np.array_equal(complete, self._complete): # Same rows as the whole universe: slice its moments
+                cached = (self.mean[columns], self.covariance[np.ix_(columns, columns)], self.observations[np.ix_(columns, columns)])
+            else:
+                cached = _common_sample_moments(self._values[:, columns])
+            with self._lock:
+                self._subsets[key] = cached
+        order = np.searchsorted(columns, idx)
+        mean, covariance, observations = cached
+        return mean[order], covariance[np.ix_(order, order)], observations[np.ix_(order, order)]
+
+    def moments(self, tickers):
+        """Returns (mean_returns, covariance_matrix) as arrays ordered like `tickers`."""
+        idx = self.indices(tickers)
+        if self.policy == SUBSET_SAMPLE:
+            return self._subset_moments(idx)[:2]
+        covariance = self.covariance[np.ix_(idx, idx)]
+        if self.policy == PAIRWISE:
+            covariance = _positive_semidefinite(covariance)
+        return self.mean[idx], covariance
+
+    def min_observations(self, tickers):
+        """Smallest number of rows behind any mean or covariance entry of the sub-universe."""
+        idx = self.indices(tickers)
+        if len(idx) == 0:
+            return 0
+        if self.policy == SUBSET_SAMPLE:
+            return int(self._subset_moments(idx)[2].min())
+        return int(self.observations[np.ix_(idx, idx)].min())
+
+
+def _positive_semidefinite(covariance):
+    # Pairwise covariances come from different row sets, so the matrix can have negative eigenvalues that
+    # break the optimizers' convexity and Cholesky factorizations; those are raised to a tiny positive floor
+    if not np.isfinite(covariance).all() or len(covariance) == 0:
+        return covariance
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    if eigenvalues.min() >= 0:
+        return covariance
+    eigenvalues = np.maximum(eigenvalues, max(eigenvalues.max(), 0.0) * 1e-10)
+    return (eigenvectors * eigenvalues) @ eigenvectors.T
+
+
+def _common_sample_moments(values):
+    complete = values[~np.isnan(values).any(axis=1)]
+    n_assets = values.shape[1]
+    observations = np.full((n_assets, n_assets), complete.shape[0], dtype=np.int64)
+    if complete.shape[0] < 2:
+        return np.full(n_assets, np.nan), np.full((n_assets, n_assets), np.nan), observations
+    return complete.mean(axis=0), np.cov(complete, rowvar=False).reshape(n_assets, n_assets), observations
+
+
+def _pairwise_moments(values):
+    present = ~np.isnan(values)
+    counts = present.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(counts > 0, np.nansum(values, axis=0) / counts, np.nan)
+
+        # Pairwise-complete covariance (pandas' DataFrame.cov semantics) from three matrix products.
+        # Centering on the column means first keeps the sums small and the subtraction stable.
+        centered = np.where(present, values - np.nan_to_num(mean), 0.0)
+        mask = present.astype(np.float64)
+        pair_counts = mask.T @ mask
+        pair_sums = centered.T @ mask # [i, j]: sum of asset i over the rows where asset j is present
+        cross = centered.T @ centered
+        covariance = (cross - pair_sums * pair_sums.T / pair_counts) / (pair_counts - 1)
+    covariance[pair_counts < 2] = np.nan
+    return mean, covariance, pair_counts.astype(np.int64)
+
+
+def shared_moment_cache(returns_matrix, policy=SUBSET_SAMPLE):
+    """Returns the process-wide MomentCache for this returns snapshot and NaN policy."""
+    key = (returns_matrix.key or id(returns_matrix), policy)
+    with _registry_lock:
+        cache = _registry.get(key)
+        if cache is None:
+            cache = _registry[key] = MomentCache(returns_matrix, policy)
+        return cache
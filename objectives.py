@@ -0,0 +1,197 @@
+import numpy as np
+from scipy import sparse
+from scipy.optimize import OptimizeResult, linprog, minimize
+
+from optimization import DEFAULT_ENGINE, least_distance_weights, solve_with_engine
+
+# --- Alternative Objectives ---
+# Every objective takes the same inputs (daily mean returns, covariance and, for CVaR, the historical
+# scenario matrix of daily returns) and returns a scipy OptimizeResult with long-only, fully-invested
+# weights in x, so they are interchangeable per risk level and share one moment/returns snapshot.
+
+CVAR_CONFIDENCE = 0.95
+
+OBJECTIVE_LABELS = {
+    'max_sharpe': "Sharpe Ratio Optimized",
+    'min_variance': "Minimum Variance",
+    'risk_parity': "Risk Parity",
+    'min_cvar': "Minimum CVaR",
+}
+
+
+def solve_min_variance(covariance_matrix, constraints=None):
+    """
+    Long-only minimum-variance weights. Without turnover slacks this is the tangency QP with a
+    direction of ones (min y' S y s.t. sum(y) >= 1, y >= 0), solved by one NNLS call; otherwise SLSQP.
+    """
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    num_assets = len(covariance_matrix)
+    if constraints is None or not constraints.num_slacks:
+        weights = least_distance_weights(np.ones(num_assets), covariance_matrix,
+                                         constraints.homogeneous_rows() if constraints is not None else None)
+        if weights is not None:
+            return OptimizeResult(x=weights, success=True, nit=1, message="Minimum-variance QP solved",
+                                  fun=weights @ covariance_matrix @ weights)
+
+    num_variables = constraints.num_variables if constraints is not None else num_assets
+    padded = np.zeros((num_variables, num_variables))
+    padded[:num_assets, :num_assets] = covariance_matrix / np.mean(np.diag(covariance_matrix)) # O(1) objective for SLSQP's ftol
+    if constraints is not None:
+        start, bounds, slsqp_constraints = constraints.initial_point(), constraints.bounds(), constraints.slsqp_constraints()
+    else:
+        start, bounds = np.full(num_assets, 1 / num_assets), [(0, 1)] * num_assets
+        slsqp_constraints = [{'type': 'eq', 'fun': lambda w: np.sum(w) - 1, 'jac': lambda w: np.ones_like(w)}]
+    result = minimize(lambda x: x @ padded @ x, start, jac=lambda x: 2 * padded @ x, method='SLSQP',
+                      bounds=bounds, constraints=slsqp_constraints, options={'disp': False, 'maxiter': 200})
+    result.x = result.x[:num_assets]
+    result.fun = result.x @ covariance_matrix @ result.x
+    return result
+
+
+def risk_contributions(weights, covariance_matrix):
+    """Fraction of portfolio variance contributed by each asset (sums to 1)."""
+    marginal = covariance_matrix @ weights
+    return weights * marginal / (weights @ marginal)
+
+
+def _risk_parity_newton(covariance_scaled, budgets, tolerance, max_iterations):
+    # Spinu's convex form: min 0.5 y' S y - b' log(y); at the optimum y_i (S y)_i = b_i, so w = y / sum(y)
+    # has risk contributions proportional to b. Damped Newton keeps y strictly positive.
+    def value(y):
+        return 0.5 * y @ covariance_scaled @ y - budgets @ np.log(y)
+
+    y = budgets / np.sqrt(np.diag(covariance_scaled))
+    for iteration in range(1, max_iterations + 1):
+        gradient = covariance_scaled @ y - budgets / y
+        if np.abs(gradient * y).max() < tolerance:
+            return y, iteration
+        hessian = covariance_scaled + np.diag(budgets / y**2)
+        step = np.linalg.solve(hessian, -gradient)
+        # Largest step keeping y > 0, then backtrack until the objective decreases
+        shrinking = step < 0
+        alpha = min(1.0, 0.99 * np.min(-y[shrinking] / step[shrinking])) if shrinking.any() else 1.0
+        current = value(y)
+        while value(y + alpha * step) > current + 1e-4 * alpha * (gradient @ step) and alpha > 1e-12:
+            alpha *= 0.5
+        y = y + alpha * step
+    return y, None
+
+
+def _risk_parity_cyclical(covariance_scaled, budgets, tolerance, max_sweeps):
+    # Cyclical coordinate descent on the same objective: each y_i solves S_ii y_i^2 + c_i y_i - b_i = 0
+    diagonal = np.diag(covariance_scaled)
+    y = budgets / np.sqrt(diagonal)
+    for sweep in range(1, max_sweeps + 1):
+        for i in range(len(y)):
+            c = covariance_scaled[i] @ y - diagonal[i] * y[i]
+            y[i] = (-c + np.sqrt(c**2 + 4 * diagonal[i] * budgets[i])) / (2 * diagonal[i])
+        if np.abs(y * (covariance_scaled @ y) - budgets).max() < tolerance:
+            return y, sweep
+    return y, None
+
+
+def solve_risk_parity(covariance_matrix, risk_budgets=None, constraints=None, tolerance=1e-10, max_iterations=100):
+    """
+    Long-only weights whose risk contributions match risk_budgets (equal risk contribution by default),
+    by Newton's method with a cyclical coordinate descent fallback. With constraints the unconstrained
+    solution is kept if it already satisfies them; otherwise SLSQP finds the feasible portfolio whose
+    risk contributions are closest to the budgets.
+    """
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    num_assets = len(covariance_matrix)
+    budgets = np.full(num_assets, 1 / num_assets) if risk_budgets is None else np.asarray(risk_budgets, dtype=float) / np.sum(risk_budgets)
+    covariance_scaled = covariance_matrix / np.mean(np.diag(covariance_matrix))
+
+    try:
+        y, iterations = _risk_parity_newton(covariance_scaled, budgets, tolerance, max_iterations)
+    except np.linalg.LinAlgError:
+        iterations = None
+    if iterations is None:
+        y, iterations = _risk_parity_cyclical(covariance_scaled, budgets, tolerance, 50 * max_iterations)
+    weights = y / y.sum()
+    if constraints is None or constraints.violation(weights) <= 1e-6:
+        return OptimizeResult(x=weights, success=iterations is not None, nit=iterations or 0,
+                              message="Risk parity solved" if iterations else "Risk parity did not converge",
+                              fun=np.abs(risk_contributions(weights, covariance_matrix) - budgets).max())
+
+    def objective(x):
+        return np.sum((risk_contributions(x[:num_assets], covariance_matrix) - budgets)**2)
+
+    result = minimize(objective, constraints.initial_point(), method='SLSQP', bounds=constraints.bounds(),
+                      constraints=constraints.slsqp_constraints(), options={'disp': False, 'maxiter': 200})
+    result.x = result.x[:num_assets]
+    if result.success and constraints.violation(np.clip(result.x, 0, None)) > 1e-6:
+        result.success = False
+        result.message = "No portfolio satisfies the category, cap and turnover constraints."
+    return result
+
+
+def solve_min_cvar(scenarios, confidence=CVAR_CONFIDENCE, constraints=None):
+    """
+    Long-only weights minimizing the historical daily CVaR (expected loss beyond the `confidence`
+    quantile) as the Rockafellar-Uryasev LP over variables [x, zeta, u]:
+        min zeta + sum(u) / ((1 - confidence) T)  s.t.  u_t >= -r_t'w - zeta, u >= 0
+    where x is the weights (plus turnover slacks) and each scenario r_t is one day of returns.
+    """
+    scenarios = np.asarray(scenarios, dtype=float)
+    num_days, num_assets = scenarios.shape
+    num_variables = constraints.num_variables if constraints is not None else num_assets
+
+    cost = np.concatenate([np.zeros(num_variables), [1.0], np.full(num_days, 1 / ((1 - confidence) * num_days))])
+    losses = sparse.hstack([sparse.csr_matrix(-scenarios), sparse.csr_matrix((num_days, num_variables - num_assets)),
+                            sparse.csr_matrix(-np.ones((num_days, 1))), -sparse.identity(num_days)])
+    inequalities, upper = [losses], [np.zeros(num_days)]
+    if constraints is not None and len(constraints.b):
+        inequalities.append(sparse.hstack([sparse.csr_matrix(-constraints.A), sparse.csr_matrix((len(constraints.b), 1 + num_days))]))
+        upper.append(-constraints.b)
+    budget = np.concatenate([np.ones(num_assets), np.zeros(num_variables - num_assets + 1 + num_days)])[None, :]
+    bounds = (constraints.bounds() if constraints is not None else [(0, 1)] * num_assets) + [(None, None)] + [(0, None)] * num_days
+
+    result = linprog(cost, A_ub=sparse.vstack(inequalities, format='csr'), b_ub=np.concatenate(upper),
+                     A_eq=budget, b_eq=[1.0], bounds=bounds, method='highs')
+    if result.x is None:
+        return OptimizeResult(x=np.full(num_assets, 1 / num_assets), success=False, nit=result.nit, message=result.message)
+    result.x = result.x[:num_assets]
+    return result
+
+
+def _max_sharpe(mean_returns, covariance_matrix, risk_free_rate_annual, scenarios, engine, constraints):
+    return solve_with_engine(engine, mean_returns, covariance_matrix, risk_free_rate_annual, constraints)
+
+def _min_variance(mean_returns, covariance_matrix, risk_free_rate_annual, scenarios, engine, constraints):
+    return solve_min_variance(covariance_matrix, constraints=constraints)
+
+def _risk_parity(mean_returns, covariance_matrix, risk_free_rate_annual, scenarios, engine, constraints):
+    return solve_risk_parity(covariance_matrix, constraints=constraints)
+
+def _min_cvar(mean_returns, covariance_matrix, risk_free_rate_annual, scenarios, engine, constraints):
+    return solve_min_cvar(scenarios, constraints=constraints)
+
+
+OBJECTIVES = {
+    'max_sharpe': _max_sharpe,
+    'min_variance': _min_variance,
+    'risk_parity': _risk_parity,
+    'min_cvar': _min_cvar,
+}
+SCENARIO_OBJECTIVES = {'min_cvar'} # Need the historical returns, not just the moments
+
+
+def objective_inputs(moment_cache, tickers, objective):
+    """(mean_returns, covariance, scenarios) for `objective` from a shared MomentCache; scenarios is None unless needed."""
+    mean_returns, covariance_matrix = moment_cache.moments(tickers)
+    scenarios = None
+    if objective in SCENARIO_OBJECTIVES:
+        scenarios = np.asarray(moment_cache.returns_matrix.complete_rows(tickers)[0])
+    return mean_returns, covariance_matrix, scenarios
+
+
+def solve_objective(objective, mean_returns, covariance_matrix, risk_free_rate_annual, scenarios=None,
+                    engine=DEFAULT_ENGINE, constraints=None):
+    """Runs the objective registered under `objective`; engine only applies to 'max_sharpe'."""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}'. Available: {', '.join(sorted(OBJECTIVES))}.")
+    if objective in SCENARIO_OBJECTIVES and scenarios is None:
+        raise ValueError(f"Objective '{objective}' needs the historical scenario matrix.")
+    return OBJECTIVES[objective](np.asarray(mean_returns, dtype=float), np.asarray(covariance_matrix, dtype=float),
+                                 risk_free_rate_annual, scenarios, engine, constraints)
@@ -0,0 +1,197 @@
+import os
+
+import numpy as np
+from scipy.optimize import OptimizeResult, minimize, nnls
+
+# --- Max-Sharpe Optimization ---
+# Shared by app.py and app-FINAL.py. Inputs are plain NumPy arrays of *daily* mean returns and
+# covariance; the Sharpe ratio is annualized as in the apps ((1+r)**252 compounding, sqrt(252) volatility).
+
+TRADING_DAYS = 252
+DEFAULT_ENGINE = os.environ.get("OPTIMIZER_ENGINE", "slsqp")
+
+
+def portfolio_variance(weights, covariance):
+    return weights.T @ covariance @ weights
+
+def portfolio_return(weights, returns):
+    return weights.T @ returns
+
+def negative_sharpe_ratio(weights, mean_returns, covariance, risk_free_rate_annual):
+    port_ret_daily = portfolio_return(weights, mean_returns)
+    port_std_daily = np.sqrt(portfolio_variance(weights, covariance))
+
+    annual_port_ret = (1 + port_ret_daily)**TRADING_DAYS - 1
+    annual_port_std = port_std_daily * np.sqrt(TRADING_DAYS)
+
+    if annual_port_std == 0:
+        return -np.inf if annual_port_ret - risk_free_rate_annual > 0 else np.inf
+
+    sharpe = (annual_port_ret - risk_free_rate_annual) / annual_port_std
+    return -sharpe
+
+def negative_sharpe_ratio_gradient(weights, mean_returns, covariance, risk_free_rate_annual):
+    """Closed-form gradient of negative_sharpe_ratio with respect to the weights."""
+    covariance_weights = covariance @ weights
+    port_ret_daily = weights @ mean_returns
+    port_std_daily = np.sqrt(weights @ covariance_weights)
+    if port_std_daily == 0:
+        return np.zeros_like(weights)
+
+    annual_port_ret = (1 + port_ret_daily)**TRADING_DAYS - 1
+    annual_port_std = port_std_daily * np.sqrt(TRADING_DAYS)
+
+    d_annual_ret = TRADING_DAYS * (1 + port_ret_daily)**(TRADING_DAYS - 1) * mean_returns
+    d_annual_std = np.sqrt(TRADING_DAYS) * covariance_weights / port_std_daily
+    d_sharpe = (d_annual_ret * annual_port_std - (annual_port_ret - risk_free_rate_annual) * d_annual_std) / annual_port_std**2
+    return -d_sharpe
+
+def solve_max_sharpe(mean_returns, covariance_matrix, risk_free_rate_annual, use_gradient=True, constraints=None):
+    """
+    Long-only, fully-invested max-Sharpe weights via SLSQP from an equal-weight start.
+    Returns the scipy OptimizeResult; use_gradient=False falls back to finite differences.
+    constraints is an optional constraints.LinearConstraints for the same ticker order.
+    """
+    mean_returns = np.asarray(mean_returns, dtype=float)
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    num_assets = len(mean_returns)
+
+    if constraints is not None:
+        return _solve_max_sharpe_constrained(mean_returns, covariance_matrix, risk_free_rate_annual, constraints)
+
+    initial_weights = np.array([1/num_assets] * num_assets)
+    bounds = tuple((0, 1) for _ in range(num_assets))
+    constraints = ({'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1, 'jac': lambda weights: np.ones_like(weights)})
+
+    return minimize(negative_sharpe_ratio,
+                    initial_weights,
+                    args=(mean_returns, covariance_matrix, risk_free_rate_annual),
+                    jac=negative_sharpe_ratio_gradient if use_gradient else None,
+                    method='SLSQP',
+                    bounds=bounds,
+                    constraints=constraints,
+                    options={'disp': False})
+
+def _solve_max_sharpe_constrained(mean_returns, covariance_matrix, risk_free_rate_annual, constraints):
+    # Variables are [weights, turnover slacks]; the objective only sees the weights
+    n = len(mean_returns)
+    gradient = np.zeros(constraints.num_variables)
+
+    def objective(x):
+        return negative_sharpe_ratio(x[:n], mean_returns, covariance_matrix, risk_free_rate_annual)
+
+    def objective_gradient(x):
+        gradient[:n] = negative_sharpe_ratio_gradient(x[:n], mean_returns, covariance_matrix, risk_free_rate_annual)
+        return gradient.copy()
+
+    result = minimize(objective, constraints.initial_point(), jac=objective_gradient, method='SLSQP',
+                      bounds=constraints.bounds(), constraints=constraints.slsqp_constraints(),
+                      options={'disp': False, 'maxiter': 200})
+    result.x = result.x[:n]
+    if result.success and constraints.violation(np.clip(result.x, 0, None)) > 1e-6:
+        result.success = False
+        result.message = "No portfolio satisfies the category, cap and turnover constraints."
+    return result
+
+def solve_max_sharpe_qp(mean_returns, covariance_matrix, risk_free_rate_annual, constraints=None):
+    """
+    Long-only, fully-invested tangency portfolio as a convex QP, solved in one deterministic pass.
+
+    With excess returns a = mean - rf_daily, max-Sharpe is equivalent to
+        min y' S y  subject to  a'y >= 1, y >= 0,  with weights w = y / sum(y).
+    Writing S = L L' and x = L'y turns this into a least-distance problem (min ||x|| s.t. G x >= h),
+    which is solved exactly by one non-negative least squares call (Lawson & Hanson, ch. 23).
+    This maximizes the arithmetic daily Sharpe ratio; the apps' compounded annual Sharpe differs
+    only through the (1+r)**252 curvature, which is negligible for daily returns.
+    Category bounds and asset caps are homogenized (A w >= b becomes (A - b 1') y >= 0) and added
+    to G; turnover limits need slack variables, so those problems go to SLSQP.
+    """
+    mean_returns = np.asarray(mean_returns, dtype=float)
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    if constraints is not None and constraints.num_slacks:
+        return solve_max_sharpe(mean_returns, covariance_matrix, risk_free_rate_annual, constraints=constraints)
+
+    risk_free_rate_daily = (1 + risk_free_rate_annual)**(1 / TRADING_DAYS) - 1
+    excess_returns = mean_returns - risk_free_rate_daily
+    if not np.any(excess_returns > 0):
+        # No asset beats the risk-free rate, so there is no tangency portfolio: the least negative
+        # Sharpe ratio is not a convex problem, and SLSQP handles it as before
+        return solve_max_sharpe(mean_returns, covariance_matrix, risk_free_rate_annual, constraints=constraints)
+
+    weights = least_distance_weights(excess_returns, covariance_matrix,
+                                     constraints.homogeneous_rows() if constraints is not None else None)
+    if weights is None: # Cannot happen with a positive excess return, but never divide by zero
+        return solve_max_sharpe(mean_returns, covariance_matrix, risk_free_rate_annual, constraints=constraints)
+    return OptimizeResult(x=weights, success=True, nit=1, message="Tangency QP solved",
+                          fun=negative_sharpe_ratio(weights, mean_returns, covariance_matrix, risk_free_rate_annual))
+
+def least_distance_weights(direction, covariance_matrix, extra_rows=None):
+    """
+    Weights w = y / sum(y) for min y' S y subject to direction'y >= 1, y >= 0 and extra_rows y >= 0,
+    via one NNLS call. direction = excess returns gives the tangency portfolio and
+    direction = ones the minimum-variance portfolio. Returns None if the problem is degenerate.
+    """
+    num_assets = len(direction)
+    # Rescaling does not change the solution but keeps the NNLS system well conditioned
+    scale = np.mean(np.diag(covariance_matrix))
+    covariance_scaled = covariance_matrix / scale
+    direction_scaled = direction / np.abs(direction).max()
+    try:
+        cholesky = np.linalg.cholesky(covariance_scaled)
+    except np.linalg.LinAlgError:
+        ridge = 1e-10 * np.trace(covariance_scaled) / num_assets # Singular covariance (e.g. duplicate ETFs)
+        cholesky = np.linalg.cholesky(covariance_scaled + ridge * np.eye(num_assets))
+
+    inverse_cholesky_t = np.linalg.inv(cholesky.T)
+    rows = [direction_scaled, np.eye(num_assets)]
+    if extra_rows is not None:
+        rows.append(extra_rows)
+    constraint_matrix = np.vstack(rows) @ inverse_cholesky_t # G in G x >= h
+    constraint_bounds = np.zeros(len(constraint_matrix))
+    constraint_bounds[0] = 1.0
+
+    target = np.zeros(num_assets + 1)
+    target[-1] = 1.0
+    u, _ = nnls(np.vstack([constraint_matrix.T, constraint_bounds]), target, maxiter=50 * len(constraint_matrix))
+    residual = np.vstack([constraint_matrix.T, constraint_bounds]) @ u - target
+    if abs(residual[-1]) < 1e-14:
+        return None
+
+    x = -residual[:-1] / residual[-1]
+    y = np.maximum(inverse_cholesky_t @ x, 0.0)
+    return y / y.sum()
+
+def optimize_allocation(tickers, mean_returns, covariance_matrix, risk_free_rate_annual, engine=DEFAULT_ENGINE, constraints=None):
+    """
+    Max-Sharpe {ticker: weight} allocation, re-normalized after dropping weights of 1e-4 or less.
+    Returns (allocation, problem): allocation is None when nothing meaningful came out, and problem
+    then explains why in a user-facing sentence.
+    """
+    if len(tickers) == 0:
+        return None, "No tickers provided for optimization."
+    optimized_results = solve_with_engine(engine, mean_returns, covariance_matrix, risk_free_rate_annual, constraints)
+    return allocation_from_result(tickers, optimized_results)
+
+def allocation_from_result(tickers, optimized_results):
+    """(allocation, problem) from any solver's OptimizeResult, filtered and re-normalized as in optimize_allocation."""
+    if not optimized_results.success:
+        return None, f"Optimization failed: {optimized_results.message}"
+
+    optimized_weights = optimized_results.x / np.sum(optimized_results.x) # Re-normalize
+    portfolio_allocation_raw = {tickers[i]: weight for i, weight in enumerate(optimized_weights) if weight > 1e-4}
+    total_weight = sum(portfolio_allocation_raw.values())
+    if total_weight <= 0:
+        return None, "Warning: All optimized weights are near zero after filtering. Optimization might not be meaningful."
+    return {ticker: weight / total_weight for ticker, weight in portfolio_allocation_raw.items()}, None
+
+
+ENGINES = {
+    'slsqp': solve_max_sharpe,
+    'qp': solve_max_sharpe_qp,
+}
+
+def solve_with_engine(engine, mean_returns, covariance_matrix, risk_free_rate_annual, constraints=None):
+    """Runs the max-Sharpe engine registered under `engine` ('slsqp' or 'qp'), optionally with LinearConstraints."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown optimizer engine '{engine}'. Available: {', '.join(sorted(ENGINES))}.")
+    return ENGINES[engine](mean_returns, covariance_matrix, risk_free_rate_annual, constraints=constraints)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from optimization import TRADING_DAYS
+from risk_metrics import allocation_matrix
+
+# --- Portfolio Weight Matrix ---
+# A set of named allocations (e.g. every entry of portfolio_data_fixed) compiled once into a (P x n)
+# weight matrix aligned to a ReturnsMatrix's ticker index. All portfolios' daily returns then come
+# from one returns @ W.T product. Each portfolio still only uses the days on which every ticker it
+# holds has a return, exactly like calculate_portfolio_returns_and_sharpe: missing returns are
+# zero-filled for the product and a second product of the missing-value mask drops those days.
+
+
+class PortfolioMatrix:
+    """Named allocations as a weight matrix over an ordered ticker index."""
+
+    def __init__(self, allocations, tickers):
+        self.tickers = list(tickers)
+        self.names, self.weights = allocation_matrix(allocations, self.tickers)
+        self.row_index = {name: row for row, name in enumerate(self.names)}
+        self.holds = (self.weights > 0).astype(float) # (P x n), for the missing-value mask
+
+    @classmethod
+    def from_returns_matrix(cls, allocations, returns_matrix):
+        return cls(allocations, returns_matrix.tickers)
+
+    def daily_returns(self, returns_matrix):
+        """(T x P) DataFrame of daily portfolio returns, NaN on days a portfolio cannot be valued."""
+        block = np.asarray(returns_matrix.select(self.tickers))
+        missing = np.isnan(block)
+        portfolio_returns = np.where(missing, 0.0, block) @ self.weights.T
+        portfolio_returns[(missing @ self.holds.T) > 0] = np.nan
+        portfolio_returns[:, self.weights.sum(axis=1) == 0] = np.nan # Nothing held has data
+        return pd.DataFrame(portfolio_returns, index=returns_matrix.dates, columns=self.names)
+
+    def evaluate(self, returns_matrix, risk_free_rate_annual):
+        """
+        {'tickers', 'daily_returns', 'growth' (indexed to 100), 'metrics'} for every portfolio at once; 'metrics' has
+        the results page's 'total_return' (%), 'annualized_return' (%), 'sharpe' and 'days' per portfolio.
+        """
+        daily_returns = self.daily_returns(returns_matrix)
+        values = daily_returns.to_numpy()
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        days = valid.sum(axis=0)
+        cumulative_growth = np.cumprod(1 + filled, axis=0)
+        growth = np.where(valid, cumulative_growth * 100, np.nan)
+
+        dates = returns_matrix.dates.to_numpy()
+        first = dates[valid.argmax(axis=0)]
+        last = dates[len(dates) - 1 - valid[::-1].argmax(axis=0)]
+        num_years = (last - first) / np.timedelta64(1, 'D') / 365.25
+        total_return = (cumulative_growth[-1] - 1) * 100
+        annualized_return = np.where(num_years > 0, (cumulative_growth[-1]**(1 / np.maximum(num_years, 1e-9)) - 1) * 100, total_return)
+
+        mean = filled.sum(axis=0) / np.maximum(days, 1)
+        variance = (np.where(valid, values - mean, 0.0)**2).sum(axis=0) / np.maximum(days - 1, 1)
+        annualized_std = np.where(days > 1, np.sqrt(variance) * np.sqrt(TRADING_DAYS), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sharpe = np.where(annualized_std > 1e-6, ((1 + mean)**TRADING_DAYS - 1 - risk_free_rate_annual) / annualized_std, np.nan)
+
+        has_days = days > 0
+        metrics = pd.DataFrame({'total_return': np.where(has_days, total_return, np.nan),
+                                'annualized_return': np.where(has_days, annualized_return, np.nan),
+                                'sharpe': sharpe, 'days': days}, index=self.names)
+        return {'tickers': self.tickers, 'daily_returns': daily_returns,
+                'growth': pd.DataFrame(growth, index=daily_returns.index, columns=self.names),
+                'metrics': metrics}
@@ -0,0 +1,236 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- Price Providers ---
+# Every provider returns daily close prices as a date x ticker DataFrame for [start_date, end_date),
+# so the apps can run against Yahoo Finance or against local files (air-gapped nodes, load tests).
+
+RISK_FREE_TICKER = '^IRX'
+
+
+class PriceProvider:
+    """Source of daily close prices."""
+    cacheable = True # Whether results should be persisted in the on-disk PriceStore
+
+    def fetch(self, tickers, start_date, end_date):
+        raise NotImplementedError
+
+    def first_trade_date(self, ticker):
+        """First date the provider has a price for, or None when it cannot be established."""
+        return None
+
+
+class YFinanceProvider(PriceProvider):
+    """
+    Downloads 'Adj Close' (or 'Close') prices from Yahoo Finance, one ticker per request through
+    a bounded thread pool so a slow or failing symbol cannot hold up or break the others.
+    """
+
+    def __init__(self, max_workers=8, timeout=20, retries=3, backoff=0.5):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.last_status = {} # Per-ticker report of the most recent fetch
+
+    def fetch_one(self, ticker, start_date, end_date):
+        import yfinance as yf # Only needed when actually hitting the network
+        data = yf.download(ticker, start=start_date, end=end_date, progress=False,
+                           threads=False, timeout=self.timeout)
+        error = _download_error(yf, ticker)
+        if error and not any(marker in error for marker in _NO_PRICES_ERRORS):
+            raise RuntimeError(error)
+        if data.empty:
+            return pd.Series(dtype=float, name=ticker)
+        for field in ('Adj Close', 'Close'):
+            if field in data.columns.get_level_values(0):
+                prices = data[field]
+                if isinstance(prices, pd.DataFrame): # Newer yfinance keeps a ticker level
+                    prices = prices.iloc[:, 0]
+                return prices.dropna().rename(ticker)
+        raise ValueError(f"Could not find 'Adj Close' or 'Close' prices for {ticker}. Data columns: {data.columns}")
+
+    def first_trade_date(self, ticker):
+        """Date of the first price in the ticker's full daily history, probed when a window came back empty."""
+        import yfinance as yf
+        try:
+            data = yf.download(ticker, period='max', progress=False, threads=False, timeout=self.timeout)
+        except Exception:
+            return None
+        if data.empty or _download_error(yf, ticker):
+            return None
+        return pd.Timestamp(data.index[0]).tz_localize(None).normalize()
+
+    def fetch(self, tickers, start_date, end_date):
+        price_data, self.last_status = fetch_concurrently(
+            self.fetch_one, tickers, start_date, end_date, max_workers=self.max_workers,
+            timeout=self.timeout, retries=self.retries, backoff=self.backoff, first_trade_date=self.first_trade_date
+        )
+        return price_data
+
+
+# yf.download does not raise per-ticker errors (HTTP, timeout, rate limit): it records them in
+# yf.shared._ERRORS and returns an empty frame. Only a "no prices in this range" error is a real
+# empty reply; anything else is reported as a failure so the window is retried. The dict is shared by
+# concurrent downloads, so an error can be lost; such a reply still only counts as covered when the
+# first_trade_date probe shows the ticker was not listed yet.
+_NO_PRICES_ERRORS = ('YFPricesMissingError', 'no price data found')
+
+
+def _download_error(yf, ticker):
+    errors = getattr(getattr(yf, 'shared', None), '_ERRORS', None) or {}
+    return errors.get(ticker) or errors.get(ticker.upper())
+
+
+def _fetch_with_retries(fetch_one, ticker, start_date, end_date, timeout, retries, backoff):
+    started = time.monotonic()
+    status = {"status": "failed", "attempts": 0, "rows": 0, "error": None}
+    for attempt in range(retries):
+        status["attempts"] = attempt + 1
+        try:
+            prices = fetch_one(ticker, start_date, end_date)
+            if prices is not None and not prices.empty:
+                status.update(status="ok", rows=len(prices), error=None)
+                status["seconds"] = time.monotonic() - started
+                return prices, status
+            status.update(status="empty", error="No rows returned")
+        except Exception as e:
+            status.update(status="failed", error=str(e))
+        delay = backoff * 2**attempt
+        if attempt + 1 == retries or time.monotonic() - started + delay > timeout:
+            break
+        time.sleep(delay)
+    status["seconds"] = time.monotonic() - started
+    return None, status
+
+
+def fetch_concurrently(fetch_one, tickers, start_date, end_date, max_workers=8, timeout=20, retries=3, backoff=0.5,
+                       first_trade_date=None):
+    """
+    Calls fetch_one(ticker, start_date, end_date) -> Series for every ticker in parallel, retrying
+    failures with exponential backoff. Returns the date-aligned frame of the tickers that succeeded
+    and a {ticker: status} report; tickers still running after their time budget are reported as 'timeout'.
+    A ticker that answered without rows every time is kept as an all-NaN column, so a PriceStore records
+    the window as covered, only when first_trade_date(ticker) shows it was not listed before end_date
+    (e.g. an ETF launched later); otherwise it is left out and the window is fetched again next time.
+    """
+    if not tickers:
+        return pd.DataFrame(), {}
+    workers = min(max_workers, len(tickers))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {
+        executor.submit(_fetch_with_retries, fetch_one, ticker, start_date, end_date, timeout, retries, backoff): ticker
+        for ticker in tickers
+    }
+    # Every ticker gets `timeout` seconds of its own once a worker picks it up
+    waves = -(-len(tickers) // workers)
+    done, not_done = wait(futures, timeout=timeout * waves + backoff * 2**retries)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    columns, status = {}, {}
+    for future, ticker in futures.items():
+        if future in not_done:
+            status[ticker] = {"status": "timeout", "attempts": None, "rows": 0, "error": f"No response within {timeout}s"}
+            continue
+        prices, status[ticker] = future.result()
+        if prices is not None:
+            columns[ticker] = prices
+        elif status[ticker]["status"] == "empty" and _listed_after(first_trade_date, ticker, end_date):
+            status[ticker].update(status="not listed", error=None)
+            columns[ticker] = pd.Series(dtype=float, name=ticker)
+
+    failed = {t: s for t, s in status.items() if s["status"] not in ("ok", "not listed")}
+    if failed:
+        logger.warning("Price fetch incomplete for %s", {t: s["error"] for t, s in failed.items()})
+    price_data = pd.DataFrame(columns).sort_index() if columns else pd.DataFrame()
+    return price_data, status
+
+
+def _listed_after(first_trade_date, ticker, end_date):
+    if first_trade_date is None:
+        return False
+    try:
+        first_date = first_trade_date(ticker)
+    except Exception:
+        return False
+    return first_date is not None and pd.Timestamp(first_date) >= pd.Timestamp(end_date)
+
+
+class FilePriceProvider(PriceProvider):
+    """
+    Serves prices from local files: either one wide CSV/Parquet file (date index, one column
+    per ticker) or a directory of per-ticker files such as a PriceStore directory.
+    """
+    cacheable = False
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Price fixture not found: {path}")
+        self.path = path
+        self._wide = None if os.path.isdir(path) else _read_price_file(path)
+
+    def _read_ticker(self, ticker):
+        safe_name = "".join(c if c.isalnum() else "_" for c in ticker)
+        for name in (f"{safe_name}.parquet", f"{safe_name}.csv", f"{ticker}.csv"):
+            ticker_path = os.path.join(self.path, name)
+            if os.path.exists(ticker_path):
+                frame = _read_price_file(ticker_path)
+                return frame.iloc[:, 0].rename(ticker)
+        return None
+
+    def fetch(self, tickers, start_date, end_date):
+        if self._wide is not None:
+            price_data = self._wide[[t for t in tickers if t in self._wide.columns]]
+        else:
+            columns = {t: s for t in tickers if (s := self._read_ticker(t)) is not None}
+            price_data = pd.DataFrame(columns)
+        if price_data.empty:
+            return pd.DataFrame()
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        return price_data[(price_data.index >= start) & (price_data.index < end)].sort_index()
+
+
+def _read_price_file(path):
+    if path.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.read_csv(path, index_col=0)
+    frame.index = pd.to_datetime(frame.index)
+    return frame.astype(float)
+
+
+def save_price_fixture(price_data, path):
+    """Writes a date x ticker price frame as a fixture FilePriceProvider can serve."""
+    frame = price_data.copy()
+    frame.index.name = "Date"
+    if path.endswith(".parquet"):
+        frame.to_parquet(path)
+    else:
+        frame.to_csv(path)
+
+
+def provider_from_env():
+    """
+    Picks the provider from PRICE_PROVIDER ('yfinance' or 'file', default 'yfinance');
+    the file provider reads PRICE_FIXTURE_PATH.
+    """
+    name = os.environ.get("PRICE_PROVIDER", "yfinance").lower()
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "file":
+        return FilePriceProvider(os.environ["PRICE_FIXTURE_PATH"])
+    raise ValueError(f"Unknown PRICE_PROVIDER '{name}'. Use 'yfinance' or 'file'.")
+
+
+def fetch_prices(provider, tickers, start_date, end_date, store=None):
+    """Fetches prices through the on-disk store when the provider's results are worth persisting."""
+    if store is not None and provider.cacheable:
+        return store.get_prices(tickers, start_date, end_date, provider.fetch)
+    return provider.fetch(tickers, start_date, end_date)
+
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+# --- Persistent Price Store ---
+# One Parquet file per ticker plus a small JSON manifest recording the [start, end) windows
+# that have already been requested for each ticker. Requests only fetch the parts of their window
+# not covered yet, so a window far before or after the stored ones never spans a gap that was
+# not downloaded.
+
+DEFAULT_STORE_DIR = os.environ.get(
+    "PRICE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".price_store")
+)
+
+
+def _to_day(value):
+    return pd.Timestamp(value).normalize()
+
+
+class PriceStore:
+    """Local columnar store of daily close prices, partitioned by ticker."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {} # A corrupt manifest only costs a re-download
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _ticker_path(self, ticker):
+        safe_name = "".join(c if c.isalnum() else "_" for c in ticker)
+        return os.path.join(self.root, f"{safe_name}.parquet")
+
+    def covered_ranges(self, ticker):
+        """Returns the sorted, disjoint (start, end) windows already held for a ticker."""
+        covered = self.manifest.get(ticker)
+        if not covered:
+            return []
+        if isinstance(covered[0], str): # Manifests written before coverage could have holes
+            covered = [covered]
+        return [(_to_day(start), _to_day(end)) for start, end in covered]
+
+    def missing_ranges(self, ticker, start_date, end_date):
+        """Returns the [start, end) segments of the requested window not yet on disk."""
+        start, end = _to_day(start_date), min(_to_day(end_date), pd.Timestamp.today().normalize())
+        if start >= end:
+            return []
+        gaps = []
+        for covered_start, covered_end in self.covered_ranges(ticker):
+            if covered_end <= start or covered_start >= end:
+                continue
+            if covered_start > start:
+                gaps.append((start, covered_start))
+            start = max(start, covered_end)
+        if start < end:
+            gaps.append((start, end))
+        return gaps
+
+    def read(self, ticker, start_date=None, end_date=None):
+        path = self._ticker_path(ticker)
+        if not os.path.exists(path):
+            return pd.Series(dtype=float, name=ticker)
+        series = pd.read_parquet(path)["price"].rename(ticker)
+        if start_date is not None:
+            series = series[series.index >= _to_day(start_date)]
+        if end_date is not None:
+            series = series[series.index < _to_day(end_date)]
+        return series
+
+    def write(self, ticker, prices, start_date, end_date):
+        """Merges newly fetched prices for [start_date, end_date) into the ticker's partition."""
+        start, end = _to_day(start_date), _to_day(end_date)
+        with self._lock:
+            existing = self.read(ticker)
+            merged = pd.concat([existing, prices.dropna().astype(float)])
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+            frame = merged.to_frame("price")
+            frame.index.name = "Date"
+
+            path = self._ticker_path(ticker)
+            tmp_path = path + ".tmp"
+            frame.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+
+            windows = []
+            for covered_start, covered_end in sorted(self.covered_ranges(ticker) + [(start, end)]):
+                if windows and covered_start <= windows[-1][1]: # Overlapping or adjacent
+                    windows[-1][1] = max(windows[-1][1], covered_end)
+                else:
+                    windows.append([covered_start, covered_end])
+            self.manifest[ticker] = [[w_start.date().isoformat(), w_end.date().isoformat()] for w_start, w_end in windows]
+            self._save_manifest()
+
+    def get_prices(self, tickers, start_date, end_date, fetch):
+        """
+        Returns a date x ticker price frame for [start_date, end_date), calling
+        fetch(tickers, start, end) only for the segments missing from disk.
+        """
+        # Tickers sharing the same gap are fetched together in one call
+        pending = {}
+        for ticker in tickers:
+            for gap in self.missing_ranges(ticker, start_date, end_date):
+                pending.setdefault(gap, []).append(ticker)
+
+        for (gap_start, gap_end), gap_tickers in pending.items():
+            fetched = fetch(gap_tickers, gap_start.date(), gap_end.date())
+            if fetched is None or fetched.empty:
+                continue # No rows for any ticker (e.g. a failed request or an outage): leave the gap open for a retry
+            for ticker in gap_tickers:
+                # Tickers that failed or came back empty stay uncovered; an all-NaN column is a ticker the
+                # provider showed was not listed before the gap's end, which is covered so it is not fetched again
+                if ticker in fetched.columns:
+                    self.write(ticker, fetched[ticker], gap_start, gap_end)
+
+        columns = {ticker: self.read(ticker, start_date, end_date) for ticker in tickers}
+        price_data = pd.DataFrame(columns)
+        price_data.index.name = "Date"
+        return price_data.sort_index()
@@ -0,0 +1,166 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from optimization import TRADING_DAYS
+
+# --- Monte Carlo Wealth Projection ---
+# Simulates a portfolio's wealth over a multi-year horizon, either as geometric Brownian motion with
+# the portfolio's daily mean and variance (from the moment cache) or by block-bootstrapping its
+# historical daily returns. Paths are generated in seeded chunks, possibly across processes, and only
+# summarized: each chunk is folded into per-step histograms of log wealth, so memory depends on the
+# number of steps and bins, never on the number of paths. Percentile bands are read off the merged
+# histograms. Chunk seeds come from one SeedSequence, so results do not depend on the process count.
+
+PROJECTION_METHODS = ('gbm', 'bootstrap')
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+STEP_DAYS = 21 # One projection step per month of trading days
+PATH_CHUNK_SIZE = 2_000
+NUM_BINS = 2048
+BIN_RANGE_SIGMAS = 6 # Histogram range around the expected log wealth; paths outside land in the edge bins
+
+
+class HistogramQuantiles:
+    """
+    Streaming quantiles of H series at once (e.g. log wealth at every projection step) from fixed-bin
+    histograms over [lower, upper] per series. update() takes (C x H) blocks; merge() adds another
+    estimator with the same bins, so chunks can be summarized in separate processes.
+    """
+
+    def __init__(self, lower, upper, num_bins=NUM_BINS):
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.num_bins = num_bins
+        self.counts = np.zeros((len(self.lower), num_bins), dtype=np.int64)
+        self.count = 0
+
+    @property
+    def bin_width(self):
+        return (self.upper - self.lower) / self.num_bins
+
+    def update(self, values):
+        values = np.atleast_2d(values)
+        bins = np.floor((values - self.lower) / self.bin_width).astype(np.int64)
+        np.clip(bins, 0, self.num_bins - 1, out=bins)
+        flat = bins + np.arange(len(self.lower)) * self.num_bins
+        self.counts += np.bincount(flat.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+        self.count += len(values)
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        return self
+
+    def quantiles(self, levels):
+        """(H x len(levels)) quantiles, interpolating linearly inside the bin that holds each one."""
+        cumulative = np.cumsum(self.counts, axis=1)
+        rows = np.arange(len(self.lower))
+        result = np.empty((len(self.lower), len(levels)))
+        for j, level in enumerate(levels):
+            target = level * self.count
+            bins = np.minimum((cumulative < target).sum(axis=1), self.num_bins - 1)
+            before = np.where(bins > 0, cumulative[rows, np.maximum(bins - 1, 0)], 0)
+            inside = np.maximum(self.counts[rows, bins], 1)
+            fraction = np.clip((target - before) / inside, 0.0, 1.0)
+            result[:, j] = self.lower + (bins + fraction) * self.bin_width
+        return result
+
+
+def lognormal_parameters(daily_mean, daily_variance):
+    """Mean and std of daily log returns for simple returns with this mean and variance (lognormal match)."""
+    log_variance = np.log1p(daily_variance / (1 + daily_mean)**2)
+    return np.log1p(daily_mean) - log_variance / 2, np.sqrt(log_variance)
+
+
+def _gbm_log_growth(log_mean, log_std, num_paths, num_steps, step_days, rng):
+    steps = rng.standard_normal((num_paths, num_steps)) * (log_std * np.sqrt(step_days)) + log_mean * step_days
+    return np.cumsum(steps, axis=1)
+
+
+def _bootstrap_log_growth(log_returns, num_paths, num_steps, step_days, block_size, rng):
+    # Circular blocks laid end to end; every block sum, and the partial block up to each step's end,
+    # is a difference of prefix sums, so the days themselves are never materialized
+    num_history = len(log_returns)
+    prefix = np.zeros(num_history + block_size + 1)
+    np.cumsum(np.r_[log_returns, log_returns[:block_size]], out=prefix[1:])
+    num_days = num_steps * step_days
+    num_blocks = -(-num_days // block_size)
+    starts = rng.integers(0, num_history, size=(num_paths, num_blocks))
+    completed = np.zeros((num_paths, num_blocks + 1))
+    np.cumsum(prefix[starts + block_size] - prefix[starts], axis=1, out=completed[:, 1:])
+    full_blocks, remainder = np.divmod(step_days * np.arange(1, num_steps + 1), block_size)
+    current = starts[:, np.minimum(full_blocks, num_blocks - 1)]
+    return completed[:, full_blocks] + prefix[current + remainder] - prefix[current]
+
+
+def _simulate_chunk(task):
+    method, parameters, size, seed, num_steps, step_days, lower, upper, num_bins = task
+    rng = np.random.default_rng(seed)
+    if method == 'gbm':
+        log_mean, log_std = parameters
+        log_growth = _gbm_log_growth(log_mean, log_std, size, num_steps, step_days, rng)
+    else:
+        log_returns, block_size = parameters
+        log_growth = _bootstrap_log_growth(log_returns, size, num_steps, step_days, block_size, rng)
+    histogram = HistogramQuantiles(lower, upper, num_bins)
+    histogram.update(log_growth)
+    return histogram, np.exp(log_growth).sum(axis=0), int((log_growth[:, -1] < 0).sum())
+
+
+def project_wealth(method, horizon_years, daily_mean=None, daily_variance=None, daily_returns=None, num_paths=20_000,
+                   seed=0, block_size=STEP_DAYS, quantiles=DEFAULT_QUANTILES, initial_value=100.0, processes=None,
+                   chunk_size=PATH_CHUNK_SIZE, step_days=STEP_DAYS, num_bins=NUM_BINS):
+    """
+    Projects the wealth of initial_value over horizon_years in steps of step_days trading days.
+
+    method='gbm' needs the portfolio's daily_mean and daily_variance; 'bootstrap' needs its historical
+    daily_returns and resamples them in circular blocks of block_size days. Returns a dict with
+    'quantiles' (DataFrame indexed by years, one column per quantile level, starting at initial_value),
+    'mean' (expected wealth per step), 'probability_of_loss' (ending below initial_value) and 'num_paths'.
+    processes=None uses one worker per CPU; 1 runs inline.
+    """
+    num_steps = max(int(round(horizon_years * TRADING_DAYS / step_days)), 1)
+    if method == 'gbm':
+        log_mean, log_std = lognormal_parameters(daily_mean, daily_variance)
+        parameters = (log_mean, log_std)
+    elif method == 'bootstrap':
+        log_returns = np.log1p(np.asarray(daily_returns, dtype=float))
+        if len(log_returns) < block_size:
+            raise ValueError(f"Need at least {block_size} days of returns for {block_size}-day blocks, got {len(log_returns)}.")
+        log_mean, log_std = log_returns.mean(), log_returns.std(ddof=1)
+        parameters = (log_returns, block_size)
+    else:
+        raise ValueError(f"Unknown projection method '{method}'. Available: {', '.join(PROJECTION_METHODS)}.")
+
+    days = step_days * np.arange(1, num_steps + 1)
+    half_width = BIN_RANGE_SIGMAS * max(log_std, 1e-6) * np.sqrt(days)
+    lower, upper = log_mean * days - half_width, log_mean * days + half_width
+
+    sizes = [chunk_size] * (num_paths // chunk_size) + ([num_paths % chunk_size] if num_paths % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(method, parameters, size, chunk_seed, num_steps, step_days, lower, upper, num_bins) for size, chunk_seed in zip(sizes, seeds)]
+    processes = min(processes or os.cpu_count() or 1, max(len(tasks), 1))
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            summaries = list(pool.map(_simulate_chunk, tasks))
+    else:
+        summaries = [_simulate_chunk(task) for task in tasks]
+
+    histogram = summaries[0][0]
+    for other, _, _ in summaries[1:]:
+        histogram.merge(other)
+    wealth_sum = sum(summary[1] for summary in summaries)
+    losses = sum(summary[2] for summary in summaries)
+
+    years = np.r_[0.0, days / TRADING_DAYS]
+    levels = list(quantiles)
+    bands = initial_value * np.exp(np.vstack([np.zeros(len(levels)), histogram.quantiles(levels)]))
+    return {
+        'quantiles': pd.DataFrame(bands, index=pd.Index(years, name='years'), columns=levels),
+        'mean': pd.Series(initial_value * np.r_[1.0, wealth_sum / num_paths], index=years),
+        'probability_of_loss': losses / num_paths,
+        'num_paths': num_paths,
+        'method': method,
+    }
@@ -1,20 +1,11 @@
-import streamlit as st
+from scoring import risk_profile
+from universes import questions
 
-# Define a dictionary to store question data and scores
-questions = {
-    1: {"question": "How old are you?", "options": ["Over 60", "45-60", "30-44", "Under 30"], "scores": [1, 2, 3, 4]},
-    2: {"question": "What is your investment experience?", "options": ["I don’t have any experience", "I have some experience", "I have a strong educational background in a related field", "I’m an experienced investor"], "scores": [1, 2, 3, 4]},
-    3: {"question": "What is an ETF?", "options": ["I don’t know", "A diversified investment fund that only trades commodities", "A diversified, index-tracking investment fund that does not trade on exchanges", "A diversified, index-tracking investment fund that trades on exchanges"], "scores": [1, 2, 3, 4]},
-    4: {"question": "Main goal of your investment", "options": ["Capital preservation", "Conservative investment", "General investment", "Capital growth"], "scores": [1, 2, 3, 4]},
-    5: {"question": "What is your investment horizon?", "options": ["<5 years", "5-10 years", "10-15 years", ">15 years"], "scores": [1, 2, 3, 4]},
-    6: {"question": "Do you prefer guaranteed small gains or potential big gains with risk?", "options": ["Guarantees only", "Smaller gains and contained risk", "Moderate gain and moderate risk", "Big gains with high risk"], "scores": [1, 2, 3, 4]},
-    7: {"question": "What is your tolerance of market swings?", "options": ["Low", "Medium-low", "Medium-high", "High"], "scores": [1, 2, 3, 4]},
-    8: {"question": "Do you prefer a strategy that:", "options": ["Try to Beat the market", "It is aligned with Stock market Performance", "It is aligned with Bond market Performance", "It is able to provide reassurance during high volatile market periods"], "scores": [1, 2, 3, 4]},
-    9: {"question": "What’s the worst-case decline you’re comfortable seeing in 1 year?", "options": ["Less than 10%", "10-20%", "20-30%", "More than 30%"], "scores": [1, 2, 3, 4]},
-    10: {"question": "What would you do if you hear the market is down 20%?", "options": ["I sell a majority of my financial assets", "I sell a minority of my financial assets", "I maintain my position", "I buy more"], "scores": [1, 2, 3, 4]},
-    11: {"question": "Do you have any preference for ESG (environmental, social, governance) investments?", "options": ["Yes, I want a portfolio with sustainable investments", "No, I don’t take the sustainable factor into consideration"], "scores": [4, 1]},
-    12: {"question": "Do you have any preference for the investment strategy of your Roboadvisor?", "options": ["Yes, I want an active strategy", "No, I want a passive strategy"], "scores": [4, 1]}
-}
+# This questionnaire has always listed question 8's options in the opposite order to the apps, and each
+# option's score follows its position, so the same answer number keeps the score it always had here
+questions = {**questions, 8: {**questions[8], "options": ["Try to Beat the market", "It is aligned with Stock market Performance",
+                                                          "It is aligned with Bond market Performance",
+                                                          "It is able to provide reassurance during high volatile market periods"]}}
 
 def get_user_info():
     # Collect user information
@@ -73,24 +64,7 @@ def main():
 
     print("\n--- Risk Profile Assessment ---")
 
-    if 10 <= total_score <= 11:
-        risk_label = "Ultra Conservative"
-    elif 12 <= total_score <= 14:
-        risk_label = "Conservative"
-    elif 15 <= total_score <= 19:
-        risk_label = "Cautiously Moderate"
-    elif 20 <= total_score <= 24:
-        risk_label = "Moderate"
-    elif 25 <= total_score <= 29:
-        risk_label = "Moderate Growth"
-    elif 30 <= total_score <= 34:
-        risk_label = "Growth"
-    elif 35 <= total_score <= 38:
-        risk_label = "Opportunistic"
-    elif 39 <= total_score <= 40:
-        risk_label = "Aggressive Growth"
-    else:
-        risk_label = "Undefined Profile"
+    risk_label, _ = risk_profile(total_score)
 
     print(f"Based on your score, your risk profile is: {risk_label}")
 
@@ -0,0 +1,130 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from frontier import portfolio_metrics
+from optimization import TRADING_DAYS
+
+# --- Random Portfolio Cloud ---
+# Long-only Dirichlet weight vectors evaluated in fixed-size chunks, so memory depends on the chunk
+# size and not on the sample count. Each chunk is reduced to summary statistics, the upper hull
+# (best return per volatility bucket) and the best-Sharpe portfolio; only a bounded plotting
+# sample of raw points is kept. Chunk seeds are derived up front, so results do not depend on
+# how chunks are spread across processes. Under linear constraints (constraints.py) samples outside
+# the feasible set are rejected, so the cloud covers the same portfolios the optimizer may pick.
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def _empty_summary(num_assets, hull_bins, max_volatility):
+    return {
+        'count': 0,
+        'sum': np.zeros(3), 'sum_sq': np.zeros(3), # return, volatility, sharpe
+        'min': np.full(3, np.inf), 'max': np.full(3, -np.inf),
+        'hull_edges': np.linspace(0.0, max_volatility, hull_bins + 1),
+        'hull_return': np.full(hull_bins, -np.inf),
+        'hull_volatility': np.full(hull_bins, np.nan),
+        'hull_weights': np.full((hull_bins, num_assets), np.nan),
+        'best_sharpe': -np.inf, 'best_weights': np.full(num_assets, np.nan),
+        'sample': np.empty((0, 3)),
+    }
+
+
+def _simulate_chunk(task):
+    (mean_returns, covariance_matrix, risk_free_rate_annual, size, seed, concentration, hull_bins, max_volatility, sample_size,
+     constraints) = task
+    rng = np.random.default_rng(seed)
+    num_assets = len(mean_returns)
+    weights = rng.dirichlet(np.full(num_assets, concentration), size=size)
+    if constraints is not None:
+        weights = weights[constraints.feasible(weights)]
+    summary = _empty_summary(num_assets, hull_bins, max_volatility)
+    if not len(weights):
+        return summary
+    metrics = portfolio_metrics(weights, mean_returns, covariance_matrix, risk_free_rate_annual)
+    values = np.column_stack([metrics['return'], metrics['volatility'], metrics['sharpe']])
+
+    summary['count'] = len(weights)
+    summary['sum'] = np.nansum(values, axis=0)
+    summary['sum_sq'] = np.nansum(values**2, axis=0)
+    summary['min'] = np.nanmin(values, axis=0)
+    summary['max'] = np.nanmax(values, axis=0)
+
+    # Upper hull: highest return within each volatility bucket
+    buckets = np.clip(np.searchsorted(summary['hull_edges'], values[:, 1], side='right') - 1, 0, hull_bins - 1)
+    order = np.lexsort((values[:, 0], buckets)) # By bucket, then by return; the last of each bucket wins
+    last_of_bucket = order[np.r_[buckets[order][1:] != buckets[order][:-1], True]]
+    hit = buckets[last_of_bucket]
+    summary['hull_return'][hit] = values[last_of_bucket, 0]
+    summary['hull_volatility'][hit] = values[last_of_bucket, 1]
+    summary['hull_weights'][hit] = weights[last_of_bucket]
+
+    best = int(np.nanargmax(values[:, 2])) if np.isfinite(values[:, 2]).any() else 0
+    summary['best_sharpe'] = values[best, 2]
+    summary['best_weights'] = weights[best]
+    summary['sample'] = values[:sample_size]
+    return summary
+
+
+def _merge(total, part, sample_size):
+    total['count'] += part['count']
+    total['sum'] += part['sum']
+    total['sum_sq'] += part['sum_sq']
+    total['min'] = np.minimum(total['min'], part['min'])
+    total['max'] = np.maximum(total['max'], part['max'])
+    better = part['hull_return'] > total['hull_return']
+    total['hull_return'][better] = part['hull_return'][better]
+    total['hull_volatility'][better] = part['hull_volatility'][better]
+    total['hull_weights'][better] = part['hull_weights'][better]
+    if part['best_sharpe'] > total['best_sharpe']:
+        total['best_sharpe'], total['best_weights'] = part['best_sharpe'], part['best_weights']
+    if len(total['sample']) < sample_size:
+        total['sample'] = np.vstack([total['sample'], part['sample'][:sample_size - len(total['sample'])]])
+    return total
+
+
+def simulate_random_portfolios(mean_returns, covariance_matrix, risk_free_rate_annual, num_samples=1_000_000,
+                               chunk_size=DEFAULT_CHUNK_SIZE, seed=0, processes=1, concentration=1.0,
+                               hull_bins=100, sample_size=5_000, constraints=None):
+    """
+    Samples num_samples Dirichlet(concentration) long-only portfolios and returns a dict with:
+      'count', 'mean'/'std'/'min'/'max' (each [return, volatility, sharpe], annualized),
+      'hull_volatility', 'hull_return', 'hull_weights' (best return per volatility bucket),
+      'best_sharpe', 'best_weights' and a 'sample' of at most sample_size (return, volatility, sharpe) rows.
+    processes > 1 evaluates chunks in a process pool. With constraints (a constraints.LinearConstraints
+    for the same ticker order) infeasible samples are discarded, so 'count' is the number kept.
+    """
+    mean_returns = np.asarray(mean_returns, dtype=float)
+    covariance_matrix = np.asarray(covariance_matrix, dtype=float)
+    num_assets = len(mean_returns)
+    # A long-only portfolio is never more volatile than its most volatile asset
+    max_volatility = float(np.sqrt(np.max(np.diag(covariance_matrix)) * TRADING_DAYS))
+
+    sizes = [chunk_size] * (num_samples // chunk_size) + ([num_samples % chunk_size] if num_samples % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(mean_returns, covariance_matrix, risk_free_rate_annual, size, chunk_seed, concentration,
+              hull_bins, max_volatility, sample_size, constraints) for size, chunk_seed in zip(sizes, seeds)]
+
+    total = _empty_summary(num_assets, hull_bins, max_volatility)
+    if processes > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for part in pool.map(_simulate_chunk, tasks):
+                total = _merge(total, part, sample_size)
+    else:
+        for task in tasks:
+            total = _merge(total, _simulate_chunk(task), sample_size)
+
+    count = max(total['count'], 1)
+    mean = total['sum'] / count
+    filled = np.isfinite(total['hull_return'])
+    return {
+        'count': total['count'],
+        'mean': mean,
+        'std': np.sqrt(np.maximum(total['sum_sq'] / count - mean**2, 0.0)),
+        'min': total['min'], 'max': total['max'],
+        'hull_volatility': total['hull_volatility'][filled],
+        'hull_return': total['hull_return'][filled],
+        'hull_weights': total['hull_weights'][filled],
+        'best_sharpe': total['best_sharpe'], 'best_weights': total['best_weights'],
+        'sample': total['sample'],
+    }
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from optimization import TRADING_DAYS
+
+# --- Rebalancing Simulator ---
+# Daily returns of P portfolios with target weights W (P x n) under a rebalancing policy, net of
+# proportional transaction costs. Between rebalances the holdings drift with prices: for a segment
+# starting on day s (weights set at the close of day s - 1), the holdings on day t are
+# W * G[t + 1] / G[s] with G the cumulative growth of every asset, so each policy is a boolean
+# rebalance mask (P x T) and one vectorized pass over it. Only threshold bands are path dependent;
+# they loop over rebalance events and lookahead windows (every portfolio at once), never over days.
+
+CALENDAR_FREQUENCIES = {'monthly': 'M', 'quarterly': 'Q', 'annual': 'Y'}
+POLICIES = ('daily', 'buy_and_hold', *CALENDAR_FREQUENCIES, 'threshold')
+PORTFOLIO_CHUNK_SIZE = 256 # Bounds the (chunk x T x n) working arrays
+
+
+def _cumulative_growth(returns):
+    growth = np.ones((len(returns) + 1, returns.shape[1]))
+    np.cumprod(1 + returns, axis=0, out=growth[1:]) # growth[t] = value of 1 invested before day 0, after day t - 1
+    return growth
+
+
+def calendar_mask(dates, frequency):
+    """(T,) mask of the first trading day of every month/quarter/year ('monthly', 'quarterly', 'annual'), plus day 0."""
+    periods = pd.DatetimeIndex(dates).to_period(CALENDAR_FREQUENCIES[frequency]).asi8
+    return np.r_[True, periods[1:] != periods[:-1]]
+
+
+def threshold_mask(returns, weights, band, lookahead=63):
+    """
+    (P x T) mask rebalancing a portfolio whenever any drifted weight is more than `band` (absolute)
+    away from its target, checked at every close. Each pass scans the next `lookahead` days of every
+    unfinished portfolio, so the work follows the number of rebalances rather than the number of days.
+    """
+    growth = _cumulative_growth(returns)
+    num_days = len(returns)
+    mask = np.zeros((len(weights), num_days), dtype=bool)
+    mask[:, 0] = True
+    start = np.zeros(len(weights), dtype=int) # Day the current segment started
+    cursor = np.ones(len(weights), dtype=int) # Next day that could be a rebalance
+    active = np.arange(len(weights))
+    offsets = np.arange(lookahead)
+    while len(active):
+        days = np.minimum(cursor[active, None] + offsets, num_days - 1) # (A x lookahead)
+        # Drifted weights at the close of day t - 1 for every candidate rebalance day t
+        drifted = weights[active, None, :] * growth[days] / growth[start[active]][:, None, :]
+        drifted /= drifted.sum(axis=2, keepdims=True)
+        breach = np.abs(drifted - weights[active, None, :]).max(axis=2) > band
+        hit = breach.any(axis=1)
+        first = days[np.arange(len(active)), breach.argmax(axis=1)]
+        mask[active[hit], first[hit]] = True
+        start[active[hit]] = first[hit]
+        cursor[active] = np.where(hit, first + 1, cursor[active] + lookahead)
+        active = active[cursor[active] < num_days]
+    return mask
+
+
+def simulate_rebalancing(returns, weights, rebalance_mask, cost_rate=0.0):
+    """
+    Net daily returns (P x T) of target weights (P x n) rebalanced on the days in rebalance_mask ((T,)
+    shared by all portfolios or (P x T)), with cost_rate charged on the traded fraction sum|W - drifted|.
+    Day 0 is always a rebalance; the initial purchase is not charged. Returns (daily_returns, turnover)
+    where turnover (P) is the total traded fraction.
+    """
+    returns = np.asarray(returns, dtype=float)
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    num_days = len(returns)
+    growth = _cumulative_growth(returns)
+    rebalance_mask = np.broadcast_to(rebalance_mask, (len(weights), num_days)).copy()
+    rebalance_mask[:, 0] = True
+
+    daily_returns = np.empty((len(weights), num_days))
+    turnover = np.zeros(len(weights))
+    days = np.arange(num_days)
+    for chunk in range(0, len(weights), PORTFOLIO_CHUNK_SIZE):
+        w = weights[chunk:chunk + PORTFOLIO_CHUNK_SIZE]
+        mask = rebalance_mask[chunk:chunk + PORTFOLIO_CHUNK_SIZE]
+        segment_start = np.maximum.accumulate(np.where(mask, days, 0), axis=1) # (C x T)
+        # Holdings of each day relative to the value at the start of its segment
+        value = np.einsum('ci,cti->ct', w, growth[days + 1][None] / growth[segment_start])
+        previous = np.where(mask, 1.0, np.c_[np.ones(len(w)), value[:, :-1]])
+        gross = value / previous - 1
+
+        # Cost of each rebalance after day 0: distance between the target and the weights that drifted
+        # over the previous segment, charged against that day's return
+        c, t = np.nonzero(mask[:, 1:])
+        t = t + 1
+        drifted = w[c] * growth[t] / growth[segment_start[c, t - 1]]
+        drifted /= drifted.sum(axis=1, keepdims=True)
+        traded = np.abs(w[c] - drifted).sum(axis=1)
+        np.add.at(turnover, chunk + c, traded)
+        gross[c, t] = (1 + gross[c, t]) * (1 - cost_rate * traded) - 1
+        daily_returns[chunk:chunk + len(w)] = gross
+    return daily_returns, turnover
+
+
+def policy_mask(policy, returns, dates, weights, band=0.05):
+    """Rebalance mask for a policy in POLICIES."""
+    if policy == 'daily':
+        return np.ones(len(returns), dtype=bool)
+    if policy == 'buy_and_hold':
+        return np.r_[True, np.zeros(len(returns) - 1, dtype=bool)]
+    if policy in CALENDAR_FREQUENCIES:
+        return calendar_mask(dates, policy)
+    if policy == 'threshold':
+        return threshold_mask(np.asarray(returns, dtype=float), np.atleast_2d(weights), band)
+    raise ValueError(f"Unknown rebalancing policy '{policy}'. Available: {', '.join(POLICIES)}.")
+
+
+def summarize(daily_returns, dates, risk_free_rate_annual):
+    """Total and annualized cumulative return (%) and Sharpe ratio of each row, as on the results page."""
+    growth = np.cumprod(1 + daily_returns, axis=1)
+    total_return = (growth[:, -1] - 1) * 100
+    num_years = (dates[-1] - dates[0]).days / 365.25
+    annualized_return = ((growth[:, -1])**(1 / num_years) - 1) * 100 if num_years > 0 else total_return
+    annual_mean = (1 + daily_returns.mean(axis=1))**TRADING_DAYS - 1
+    annual_std = daily_returns.std(axis=1, ddof=1) * np.sqrt(TRADING_DAYS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(annual_std > 1e-6, (annual_mean - risk_free_rate_annual) / annual_std, np.nan)
+    return total_return, annualized_return, sharpe
+
+
+def compare_policies(returns, dates, weights, risk_free_rate_annual, policies=POLICIES, cost_rate=0.001, band=0.05):
+    """
+    Every policy for every portfolio in weights (P x n), as a DataFrame indexed by (portfolio, policy)
+    with 'total_return', 'annualized_return', 'sharpe', 'turnover', 'rebalances' and 'cost' (% of wealth).
+    """
+    returns = np.asarray(returns, dtype=float)
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    frames = []
+    for policy in policies:
+        mask = np.broadcast_to(policy_mask(policy, returns, dates, weights, band), (len(weights), len(returns)))
+        net, turnover = simulate_rebalancing(returns, weights, mask, cost_rate)
+        gross, _ = simulate_rebalancing(returns, weights, mask)
+        total_return, annualized_return, sharpe = summarize(net, dates, risk_free_rate_annual)
+        frames.append(pd.DataFrame({
+            'portfolio': np.arange(len(weights)), 'policy': policy,
+            'total_return': total_return, 'annualized_return': annualized_return, 'sharpe': sharpe,
+            'turnover': turnover, 'rebalances': mask[:, 1:].sum(axis=1),
+            'cost': (np.prod(1 + gross, axis=1) - np.prod(1 + net, axis=1)) * 100,
+        }))
+    return pd.concat(frames).set_index(['portfolio', 'policy']).sort_index(level=0, sort_remaining=False)
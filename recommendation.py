@@ -0,0 +1,283 @@
+import numpy as np
+import pandas as pd
+
+from batch_optimization import optimize_all_risk_levels
+from constraints import constraint_specs_from_fixed
+from moments import shared_moment_cache
+from optimization import DEFAULT_ENGINE, TRADING_DAYS
+from portfolio_matrix import PortfolioMatrix
+from price_providers import RISK_FREE_TICKER, fetch_prices, provider_from_env
+from price_store import PriceStore
+from returns_matrix import shared_returns_matrix
+from scoring import prefers_optimized, risk_profile, score_answers
+from universes import (analysis_end_date, analysis_start_date, optimization_constraints, resampling_settings,
+                       risk_level_objectives, universe_download_tickers, universes)
+
+# --- Headless Recommendation Engine ---
+# The computations behind the results page without Streamlit. Functions return their results with a
+# list of diagnostics ({'level': 'info' | 'warning' | 'error', 'message': ...}) instead of calling
+# st.info/st.warning/st.error, so the apps, batch jobs and services all run the same code; the apps
+# show the diagnostics with st and batch_recommend.py logs them.
+
+
+def diagnostic(level, message):
+    return {'level': level, 'message': message}
+
+
+def universe_tickers(universe):
+    """Every ticker of a universe's fixed and optimizable portfolios, its benchmark and the risk-free rate ticker."""
+    return list(universe_download_tickers[universe])
+
+
+def load_market_data(tickers, start_date, end_date, provider=None, store=None):
+    """
+    Loads daily prices through the price store (fetching only missing ranges from the provider) and
+    returns a dict with 'prices', 'returns', the annual 'risk_free_rate_annual' from ^IRX and 'diagnostics'.
+    On failure 'prices' and 'returns' are empty and the diagnostics say why.
+    """
+    empty = {'prices': pd.DataFrame(), 'returns': pd.DataFrame(), 'risk_free_rate_annual': 0.0}
+    if not tickers:
+        return {**empty, 'diagnostics': [diagnostic('error', "No tickers provided for download.")]}
+
+    diagnostics = [diagnostic('info', f"Loading historical data for {len(tickers)} assets from {start_date} to {end_date}...")]
+    try:
+        price_data = fetch_prices(provider or provider_from_env(), tickers, start_date, end_date, store)
+        if price_data.empty:
+            diagnostics.append(diagnostic('error', "No data downloaded. Check ticker symbols or date range."))
+            return {**empty, 'diagnostics': diagnostics}
+
+        prices_for_portfolios, returns_data, risk_free_rate_annual = split_prices_and_returns(price_data)
+        available = set(prices_for_portfolios.columns) | ({RISK_FREE_TICKER} if risk_free_rate_annual is not None else set())
+        missing_tickers = [t for t in tickers if t not in available]
+        if missing_tickers:
+            diagnostics.append(diagnostic('warning', f"No price data could be fetched for: {', '.join(missing_tickers)}. Continuing with the remaining assets."))
+        if prices_for_portfolios.empty and risk_free_rate_annual is None:
+            diagnostics.append(diagnostic('error', "After cleaning, no valid price data remains."))
+            return {**empty, 'diagnostics': diagnostics}
+
+        if risk_free_rate_annual is None:
+            risk_free_rate_annual = 0.0
+            diagnostics.append(diagnostic('warning', "'^IRX' ticker not found in downloaded data. Using 0 as risk-free rate for Sharpe calculation."))
+        else:
+            diagnostics.append(diagnostic('info', f"Calculated Annual Risk-Free Rate: {risk_free_rate_annual*100:.2f}%"))
+        return {'prices': prices_for_portfolios, 'returns': returns_data, 'risk_free_rate_annual': risk_free_rate_annual,
+                'diagnostics': diagnostics}
+    except Exception as e:
+        diagnostics.append(diagnostic('error', f"Error downloading or processing data: {e}"))
+        return {**empty, 'diagnostics': diagnostics}
+
+
+def split_prices_and_returns(price_data):
+    """
+    Cleans a raw price frame (all-NaN tickers and days dropped) and returns (prices_for_portfolios,
+    returns_data, risk_free_rate_annual), with the annual risk-free rate compounded from the mean ^IRX
+    quote, or None when ^IRX has no data.
+    """
+    price_data = price_data.dropna(axis=1, how='all').dropna(axis=0, how='all')
+    risk_free_rate_annual = None
+    if RISK_FREE_TICKER in price_data.columns:
+        daily_risk_free_rate = price_data[RISK_FREE_TICKER].mean() / 100.0 / TRADING_DAYS # ^IRX is quoted as an annual percentage
+        risk_free_rate_annual = float((1 + daily_risk_free_rate)**TRADING_DAYS - 1)
+    prices_for_portfolios = price_data.drop(columns=[RISK_FREE_TICKER], errors='ignore')
+    returns_data = prices_for_portfolios.pct_change().dropna(axis=0, how='all').dropna(axis=1, how='all')
+    return prices_for_portfolios, returns_data, risk_free_rate_annual
+
+
+def _redistributed_weight(allocation, available_tickers):
+    # Tickers of the allocation without returns are dropped and the rest scaled up; say so, since the
+    # figures are then those of a different portfolio
+    dropped = [t for t in allocation if t not in available_tickers]
+    total = sum(allocation.values())
+    if not dropped or not total:
+        return []
+    share = sum(allocation[t] for t in dropped) / total
+    return [diagnostic('warning', f"No return data for {', '.join(dropped)}: their {share:.1%} of the portfolio was redistributed "
+                                  f"over the remaining assets, so the reported figures are for that reweighted portfolio.")]
+
+
+def _no_performance(diagnostics):
+    return {'total_return': None, 'annualized_return': None, 'sharpe': None, 'growth': None, 'diagnostics': diagnostics}
+
+
+def portfolio_performance(returns_matrix, allocation, risk_free_rate_annual):
+    """
+    Daily-rebalanced performance of {ticker: weight} over the rows where all its tickers have returns.
+    Returns a dict with 'total_return' and 'annualized_return' (%), 'sharpe', 'growth' (indexed to 100)
+    and 'diagnostics'; values are None when they cannot be computed. Tickers without returns are dropped
+    with a warning and their weight spread over the rest.
+    """
+    portfolio_tickers = [t for t in allocation if t in returns_matrix.column_index]
+    if not portfolio_tickers:
+        return _no_performance([diagnostic('warning', f"Not enough valid historical price data for portfolio {list(allocation.keys())}.")])
+    diagnostics = _redistributed_weight(allocation, returns_matrix.column_index)
+
+    daily_returns_assets, return_dates = returns_matrix.complete_rows(portfolio_tickers)
+    if len(return_dates) < 1:
+        return _no_performance(diagnostics + [diagnostic('warning', f"Not enough valid historical price data for portfolio {portfolio_tickers}.")])
+
+    weights = np.array([allocation[t] for t in portfolio_tickers], dtype=float)
+    if weights.sum() == 0:
+        return _no_performance(diagnostics + [diagnostic('warning', "All weights are zero after reindexing. Cannot calculate portfolio returns.")])
+    weights = weights / weights.sum() # Ensure weights sum to 1 after dropping unavailable tickers
+
+    portfolio_daily_returns = pd.Series(daily_returns_assets @ weights, index=return_dates)
+    portfolio_cumulative_growth = (1 + portfolio_daily_returns).cumprod()
+    total_cumulative_return = (portfolio_cumulative_growth.iloc[-1] - 1) * 100
+
+    time_delta_days = (portfolio_cumulative_growth.index[-1] - portfolio_cumulative_growth.index[0]).days
+    if time_delta_days > 0:
+        num_years = time_delta_days / 365.25
+        annualized_cumulative_return = ((1 + (total_cumulative_return / 100))**(1/num_years) - 1) * 100
+    else:
+        annualized_cumulative_return = total_cumulative_return
+
+    annualized_portfolio_return = (1 + portfolio_daily_returns.mean())**TRADING_DAYS - 1
+    annualized_portfolio_std = portfolio_daily_returns.std() * np.sqrt(TRADING_DAYS)
+
+    sharpe_ratio = None
+    if annualized_portfolio_std > 1e-6:
+        sharpe_ratio = (annualized_portfolio_return - risk_free_rate_annual) / annualized_portfolio_std
+    else:
+        diagnostics.append(diagnostic('warning', "Warning: Annualized portfolio standard deviation is zero or near zero. Sharpe Ratio not meaningful."))
+    return {'total_return': total_cumulative_return, 'annualized_return': annualized_cumulative_return, 'sharpe': sharpe_ratio,
+            'growth': portfolio_cumulative_growth * 100, 'diagnostics': diagnostics}
+
+
+def performance_from_results(portfolio_results, name, allocation):
+    """portfolio_performance's dict for one portfolio of a PortfolioMatrix.evaluate() result."""
+    metrics = portfolio_results['metrics']
+    if name not in metrics.index or metrics.loc[name, 'days'] < 1:
+        return _no_performance([diagnostic('warning', f"Not enough valid historical price data for portfolio {list(allocation.keys())}.")])
+    diagnostics = _redistributed_weight(allocation, set(portfolio_results['tickers']))
+    sharpe_ratio = metrics.loc[name, 'sharpe']
+    if np.isnan(sharpe_ratio):
+        sharpe_ratio = None
+        diagnostics.append(diagnostic('warning', "Warning: Annualized portfolio standard deviation is zero or near zero. Sharpe Ratio not meaningful."))
+    return {'total_return': metrics.loc[name, 'total_return'], 'annualized_return': metrics.loc[name, 'annualized_return'],
+            'sharpe': sharpe_ratio, 'growth': portfolio_results['growth'][name].dropna(), 'diagnostics': diagnostics}
+
+
+def optimize_universe(moment_cache, universe, risk_free_rate_annual, engine=DEFAULT_ENGINE, processes=None):
+    """batch_optimization.optimize_all_risk_levels for a universe with the configured constraints, objectives and resampling."""
+    data = universes[universe]
+    constraint_specs = constraint_specs_from_fixed(data['portfolio_data_fixed'], data['etf_to_category'], **optimization_constraints)
+    return optimize_all_risk_levels(moment_cache, data['risk_level_assets_optimized'], risk_free_rate_annual, engine, processes,
+                                    constraint_specs=constraint_specs, objectives=risk_level_objectives,
+                                    num_resamples=resampling_settings['num_resamples'], resample_seed=resampling_settings['seed'])
+
+
+def evaluate_fixed_portfolios(returns_matrix, universe, risk_free_rate_annual):
+    """Every fixed portfolio of a universe from one PortfolioMatrix product, keyed by risk level."""
+    allocations = {level: data['specific_etf_allocation'] for level, data in universes[universe]['portfolio_data_fixed'].items()}
+    return PortfolioMatrix.from_returns_matrix(allocations, returns_matrix).evaluate(returns_matrix, risk_free_rate_annual)
+
+
+class Recommender:
+    """
+    Recommendations for one universe over one data snapshot. Market data is loaded once, and the
+    optimized and fixed portfolios of every risk level are computed on first use and shared by all clients.
+    """
+
+    def __init__(self, universe='conventional', start_date=analysis_start_date, end_date=analysis_end_date, provider=None,
+                 store=None, engine=DEFAULT_ENGINE, processes=None):
+        if universe not in universes:
+            raise ValueError(f"Unknown universe '{universe}'. Available: {', '.join(universes)}.")
+        self.universe = universe
+        self.data = universes[universe]
+        self.start_date, self.end_date = start_date, end_date
+        self.engine, self.processes = engine, processes
+        market_data = load_market_data(universe_tickers(universe), start_date, end_date, provider,
+                                       store if store is not None else PriceStore())
+        self.diagnostics = market_data['diagnostics']
+        self.risk_free_rate_annual = market_data['risk_free_rate_annual']
+        self.returns_matrix = None
+        self.moment_cache = None
+        if not market_data['returns'].empty:
+            self.returns_matrix = shared_returns_matrix(market_data['returns'])
+            self.moment_cache = shared_moment_cache(self.returns_matrix)
+        self._risk_level_table = None
+        self._fixed_results = None
+        self._performance = {}
+
+    @property
+    def risk_level_table(self):
+        if self._risk_level_table is None:
+            self._risk_level_table = optimize_universe(self.moment_cache, self.universe, self.risk_free_rate_annual,
+                                                       self.engine, self.processes)
+        return self._risk_level_table
+
+    @property
+    def fixed_results(self):
+        if self._fixed_results is None:
+            self._fixed_results = evaluate_fixed_portfolios(self.returns_matrix, self.universe, self.risk_free_rate_annual)
+        return self._fixed_results
+
+    def portfolio(self, risk_level, optimized):
+        """
+        ('Fixed' | 'Optimized', allocation or None, diagnostics) for a risk level, falling back to the
+        fixed portfolio when the level's optimization universe has no data, as the results page does.
+        """
+        diagnostics = []
+        if optimized:
+            selected_tickers = self.data['risk_level_assets_optimized'].get(risk_level, [])
+            available_tickers = [t for t in selected_tickers if t in self.returns_matrix.column_index]
+            if available_tickers:
+                if len(available_tickers) == 1:
+                    diagnostics.append(diagnostic('info', f"Only one asset ({available_tickers[0]}) available for optimization. Allocating 100% to it."))
+                    return 'Optimized', {available_tickers[0]: 1.0}, diagnostics
+                allocation = self.risk_level_table.loc[risk_level, 'allocation']
+                if not allocation:
+                    diagnostics.append(diagnostic('warning', self.risk_level_table.loc[risk_level, 'problem']))
+                    diagnostics.append(diagnostic('error', "Portfolio optimization failed to produce a valid allocation."))
+                    return 'Optimized', None, diagnostics
+                return 'Optimized', allocation, diagnostics
+            diagnostics.append(diagnostic('warning', f"No usable historical data for any of the tickers ({selected_tickers}) in risk level {risk_level} for optimization. Displaying default fixed portfolio if available."))
+            if risk_level not in self.data['portfolio_data_fixed']:
+                diagnostics.append(diagnostic('error', "No valid portfolio can be generated with available data and preferences."))
+                return 'Optimized', None, diagnostics
+            diagnostics.append(diagnostic('warning', "Falling back to fixed portfolio due to insufficient data for optimization."))
+        if risk_level not in self.data['portfolio_data_fixed']:
+            diagnostics.append(diagnostic('error', f"Determined risk level {risk_level} does not have a defined fixed portfolio."))
+            return 'Fixed', None, diagnostics
+        return 'Fixed', self.data['portfolio_data_fixed'][risk_level]['specific_etf_allocation'], diagnostics
+
+    def performance(self, portfolio_kind, risk_level, allocation):
+        """portfolio_performance of a risk level's portfolio, computed once per (kind, level)."""
+        key = (portfolio_kind, risk_level)
+        if key not in self._performance:
+            if portfolio_kind == 'Fixed':
+                self._performance[key] = performance_from_results(self.fixed_results, risk_level, allocation)
+            else:
+                self._performance[key] = portfolio_performance(self.returns_matrix, allocation, self.risk_free_rate_annual)
+        return self._performance[key]
+
+    def recommended_portfolio(self, risk_level, optimized):
+        """
+        'portfolio' ('Fixed' or 'Optimized'), 'allocation', the performance metrics of portfolio_performance
+        and 'diagnostics' of a risk level's recommendation; the same for every client with these inputs.
+        """
+        recommendation = {'portfolio': None, 'allocation': None, **_no_performance([])}
+        if self.returns_matrix is None:
+            recommendation['diagnostics'] = [diagnostic('error', "Cannot proceed with portfolio analysis due to data issues.")]
+            return recommendation
+        portfolio_kind, allocation, diagnostics = self.portfolio(risk_level, optimized)
+        recommendation.update(portfolio=portfolio_kind, allocation=allocation)
+        if allocation:
+            performance = self.performance(portfolio_kind, risk_level, allocation)
+            recommendation.update({k: v for k, v in performance.items() if k != 'diagnostics'})
+            diagnostics = diagnostics + performance['diagnostics']
+        recommendation['diagnostics'] = diagnostics
+        return recommendation
+
+    def recommend(self, answers):
+        """
+        Recommendation for 12 answers (0-based option indices). Returns a dict with 'risk_score',
+        'risk_label', 'risk_level' and the recommended_portfolio of that level.
+        """
+        risk_score = score_answers(answers)
+        risk_label, risk_level = risk_profile(risk_score)
+        recommendation = {'risk_score': risk_score, 'risk_label': risk_label, 'risk_level': risk_level}
+        if risk_level is None:
+            return {**recommendation, 'portfolio': None, 'allocation': None,
+                    **_no_performance([diagnostic('error', "Could not determine a valid risk level.")])}
+        return {**recommendation, **self.recommended_portfolio(risk_level, prefers_optimized(answers))}
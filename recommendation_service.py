@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+from http import HTTPStatus
+
+import numpy as np
+
+from optimization import DEFAULT_ENGINE, ENGINES
+from recommendation import Recommender
+from scoring import (QUESTION_IDS, RISK_LABELS, RISK_LEVELS, UNDEFINED_BAND, answer_errors, risk_bands,
+                     score_answer_matrix, score_answers)
+from universes import analysis_end_date, analysis_start_date, universes
+
+logger = logging.getLogger(__name__)
+
+# --- Recommendation Service ---
+# A small asyncio HTTP/1.1 JSON service around the headless Recommender, for systems that need
+# recommendations programmatically. Every universe has one Recommender per process, so prices, the
+# moment cache, the optimized risk-level table and the fixed portfolio results are computed once and
+# shared by all requests; the portfolio part of the response of each (universe, risk level, ESG/active
+# preference) is serialized to JSON once as well. Requests queued together are scored as one batch
+# (scoring.py), optionally after a short batching window; in-flight requests are capped by a semaphore
+# and requests beyond max_pending get 503.
+#
+#   python recommendation_service.py --port 8080
+#   curl -X POST localhost:8080/recommend -d '{"answers": [4, 3, 2, 4, 3, 3, 2, 1, 3, 3, 1, 2]}'
+#
+# POST /recommend takes 'answers' (12 option numbers starting at 1, as in batch_recommend.py), an
+# optional 'universe' and 'growth' (false leaves out the growth series); GET /health lists the universes.
+
+MAX_CONCURRENCY = 64
+MAX_PENDING = 1024
+BATCH_WINDOW = 0.0 # Seconds to wait for more requests; 0 batches whatever is already queued
+MAX_BATCH = 256
+MAX_BODY_BYTES = 64 * 1024
+NO_RISK_LEVEL = json.dumps({'portfolio': None, 'allocation': None,
+                            'diagnostics': [{'level': 'error', 'message': "Could not determine a valid risk level."}]})
+
+
+class RequestError(Exception):
+    """A client error, answered with its HTTP status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_number(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return float(value)
+
+
+def portfolio_payload(recommendation):
+    """JSON-ready body of a Recommender.recommended_portfolio result; growth as parallel date/value lists."""
+    growth = recommendation['growth']
+    return {
+        'portfolio': recommendation['portfolio'],
+        'allocation': {t: float(w) for t, w in recommendation['allocation'].items()} if recommendation['allocation'] else None,
+        'total_return': _json_number(recommendation['total_return']),
+        'annualized_return': _json_number(recommendation['annualized_return']),
+        'sharpe': _json_number(recommendation['sharpe']),
+        'growth': None if growth is None else {'dates': [d.strftime('%Y-%m-%d') for d in growth.index],
+                                               'values': [_json_number(v) for v in growth.to_numpy()]},
+        'diagnostics': recommendation['diagnostics'],
+    }
+
+
+class RecommendationService:
+    """
+    Recommendations over HTTP for the given universes. start() loads every universe's Recommender and
+    warms its caches in a worker thread, so the first requests do not pay for the optimization.
+    """
+
+    def __init__(self, universe_names=('conventional',), start_date=analysis_start_date, end_date=analysis_end_date,
+                 provider=None, store=None, engine=DEFAULT_ENGINE, max_concurrency=MAX_CONCURRENCY,
+                 max_pending=MAX_PENDING, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        unknown = [u for u in universe_names if u not in universes]
+        if unknown:
+            raise ValueError(f"Unknown universe(s) {', '.join(unknown)}. Available: {', '.join(universes)}.")
+        self.universe_names = list(universe_names)
+        self.recommender_settings = {'start_date': start_date, 'end_date': end_date, 'provider': provider, 'store': store,
+                                     'engine': engine}
+        self.recommenders = {}
+        self.payloads = {} # (universe, risk_level, optimized) -> portfolio_payload as JSON, with and without growth
+        self.max_pending = max_pending
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.pending = 0
+        self.stats = {'requests': 0, 'batches': 0, 'rejected': 0}
+        self._semaphore = None
+        self._queue = None
+        self._batcher = None
+        self._server = None
+        self._max_concurrency = max_concurrency
+
+    def _load_recommender(self, universe):
+        recommender = Recommender(universe, **self.recommender_settings)
+        for item in recommender.diagnostics:
+            logger.log(logging.getLevelName(item['level'].upper()), "%s: %s", universe, item['message'])
+        if recommender.returns_matrix is not None: # Warm the shared caches
+            _ = recommender.risk_level_table
+            _ = recommender.fixed_results
+        return recommender
+
+    async def start(self, host="127.0.0.1", port=8080):
+        loop = asyncio.get_running_loop()
+        for universe in self.universe_names:
+            self.recommenders[universe] = await loop.run_in_executor(None, self._load_recommender, universe)
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+
+    # --- Batching ---
+    async def recommend(self, answers, universe, include_growth=True):
+        """Queues one client's 0-based answers and waits for its batch; returns the JSON response body as bytes."""
+        try:
+            score_answers(answers) # Out-of-range answers are rejected here; in a batch they would fail every request in it
+        except ValueError as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(e))
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((answers, universe, include_growth, future))
+        return await future
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty(): # Everything already waiting
+                batch.append(self._queue.get_nowait())
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._answer_batch(batch)
+            except Exception as e: # Never leave a request waiting on a failed batch
+                logger.exception("Batch of %d requests failed", len(batch))
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _answer_batch(self, batch):
+        self.stats['batches'] += 1
+        answers = np.array([item[0] for item in batch])
+        scores, valid = score_answer_matrix(answers)
+        bands = risk_bands(scores)
+        errors = answer_errors(answers)
+        optimized = (answers[:, 10] == 0) | (answers[:, 11] == 0)
+        keys = [(universe, int(RISK_LEVELS[band]), bool(preference)) if ok and band != UNDEFINED_BAND else None
+                for (_, universe, _, _), band, ok, preference in zip(batch, bands, valid, optimized)]
+        missing = {key for key in keys if key is not None and key not in self.payloads}
+        if missing: # First client of a risk level: performance and growth are computed once, off the event loop
+            payloads = await asyncio.get_running_loop().run_in_executor(None, self._portfolio_payloads, missing)
+            self.payloads.update(payloads)
+        for (_, _, include_growth, future), key, score, band, error in zip(batch, keys, scores, bands, errors):
+            if future.done(): # The client went away
+                continue
+            if error is not None:
+                future.set_exception(RequestError(HTTPStatus.BAD_REQUEST, error))
+                continue
+            client = json.dumps({'risk_score': int(score), 'risk_label': RISK_LABELS[band],
+                                 'risk_level': None if key is None else key[1]})
+            portfolio = NO_RISK_LEVEL if key is None else self.payloads[key][0 if include_growth else 1]
+            future.set_result(f"{client[:-1]}, {portfolio[1:]}".encode())
+
+    def _portfolio_payloads(self, keys):
+        payloads = {}
+        for universe, level, optimized in keys:
+            payload = portfolio_payload(self.recommenders[universe].recommended_portfolio(level, optimized))
+            payloads[(universe, level, optimized)] = (json.dumps(payload), json.dumps({k: v for k, v in payload.items() if k != 'growth'}))
+        return payloads
+
+    # --- HTTP ---
+    def _parse_recommend(self, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON.")
+        if not isinstance(request, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object.")
+        answers = request.get('answers')
+        if not isinstance(answers, list) or len(answers) != len(QUESTION_IDS) or \
+                not all(isinstance(a, int) and not isinstance(a, bool) for a in answers):
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"'answers' must be a list of {len(QUESTION_IDS)} option numbers starting at 1.")
+        universe = request.get('universe', self.universe_names[0])
+        if universe not in self.recommenders:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"Unknown universe '{universe}'. Available: {', '.join(self.recommenders)}.")
+        if self.recommenders[universe].returns_matrix is None:
+            raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, f"No market data for universe '{universe}'.")
+        return [a - 1 for a in answers], universe, bool(request.get('growth', True))
+
+    async def _respond(self, method, path, body):
+        if path == "/health":
+            if method != "GET":
+                raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET /health.")
+            return HTTPStatus.OK, {'status': 'ok', 'universes': self.universe_names, **self.stats}
+        if path != "/recommend":
+            raise RequestError(HTTPStatus.NOT_FOUND, f"Unknown path '{path}'.")
+        if method != "POST":
+            raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST /recommend.")
+        if self.pending >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many pending requests, retry later.")
+        self.pending += 1
+        try:
+            async with self._semaphore:
+                self.stats['requests'] += 1
+                answers, universe, include_growth = self._parse_recommend(body)
+                return HTTPStatus.OK, await self.recommend(answers, universe, include_growth)
+        finally:
+            self.pending -= 1
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True: # HTTP/1.1 keep-alive: one request after another on the same connection
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body_unread = False
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY_BYTES:
+                        body_unread = True # It would be parsed as the next request, so the connection is closed
+                        raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large.")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self._respond(method, path.split("?")[0], body)
+                except RequestError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except ValueError:
+                    status, payload, version = HTTPStatus.BAD_REQUEST, {'error': "Malformed request."}, "HTTP/1.0"
+                except Exception:
+                    logger.exception("Request failed")
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Internal error."}
+                keep_alive = not body_unread and version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service, host, port):
+    host, port = await service.start(host, port)
+    logger.info("Serving recommendations for %s on http://%s:%d", ", ".join(service.universe_names), host, port)
+    started = time.perf_counter()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        logger.info("Served %d requests in %d batches over %.0fs", service.stats['requests'], service.stats['batches'],
+                    time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve portfolio recommendations as JSON over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--universe", action="append", choices=sorted(universes),
+                        help="Universe to serve (repeatable; the first is the default). Default: conventional")
+    parser.add_argument("--start", default=analysis_start_date.isoformat(), help="Start of the analysis window")
+    parser.add_argument("--end", default=analysis_end_date.isoformat(), help="End of the analysis window")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default=DEFAULT_ENGINE, help="Max-Sharpe optimizer engine")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY, help="Requests processed at once")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="Requests accepted before answering 503")
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW * 1000, help="How long a batch waits for more requests")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    service = RecommendationService(args.universe or ['conventional'], args.start, args.end, engine=args.engine,
+                                    max_concurrency=args.max_concurrency, max_pending=args.max_pending,
+                                    batch_window=args.batch_window_ms / 1000)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
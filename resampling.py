@@ -0,0 +1,94 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from objectives import solve_objective
+from optimization import DEFAULT_ENGINE
+
+# --- Resampled (Bootstrap) Optimization ---
+# Michaud-style resampled efficiency: the daily returns are bootstrapped many times, each resample is
+# optimized with the same objective and constraints, and the weights are averaged. The average of
+# long-only, fully-invested portfolios satisfies the same linear constraints, and the spread of the
+# resampled weights shows how much of an allocation is noise. Resample seeds are derived up front
+# from one SeedSequence, so results do not depend on how chunks are spread across processes.
+
+DEFAULT_NUM_RESAMPLES = 200
+RESAMPLE_CHUNK_SIZE = 25
+
+
+def bootstrap_indices(num_days, num_resamples, rng, block_size=1):
+    """
+    (num_resamples x num_days) row indices drawn with replacement. block_size > 1 draws moving blocks
+    of consecutive days, keeping short-range autocorrelation and volatility clustering.
+    """
+    if block_size <= 1:
+        return rng.integers(0, num_days, size=(num_resamples, num_days))
+    num_blocks = -(-num_days // block_size)
+    starts = rng.integers(0, num_days - block_size + 1, size=(num_resamples, num_blocks))
+    return (starts[:, :, None] + np.arange(block_size)).reshape(num_resamples, -1)[:, :num_days]
+
+
+def resampled_moments(samples):
+    """Mean returns (R x n) and covariance matrices (R x n x n) of (R x T x n) resamples, in one batched pass."""
+    mean_returns = samples.mean(axis=1)
+    centered = samples - mean_returns[:, None, :]
+    covariance = np.einsum('rti,rtj->rij', centered, centered) / (samples.shape[1] - 1)
+    return mean_returns, covariance
+
+
+def _optimize_chunk(task):
+    returns, risk_free_rate_annual, size, seed, block_size, objective, engine, constraints = task
+    rng = np.random.default_rng(seed)
+    samples = returns[bootstrap_indices(len(returns), size, rng, block_size)] # (size x T x n)
+    mean_returns, covariance = resampled_moments(samples)
+    weights = np.full((size, returns.shape[1]), np.nan)
+    for r in range(size):
+        result = solve_objective(objective, mean_returns[r], covariance[r], risk_free_rate_annual, samples[r], engine, constraints)
+        if result.success:
+            w = np.clip(result.x, 0, None)
+            weights[r] = w / w.sum()
+    return weights
+
+
+def resampled_optimization(returns, risk_free_rate_annual, num_resamples=DEFAULT_NUM_RESAMPLES, seed=0, processes=None,
+                           objective='max_sharpe', engine=DEFAULT_ENGINE, constraints=None, block_size=1,
+                           chunk_size=RESAMPLE_CHUNK_SIZE):
+    """
+    Bootstraps the (T x n) daily returns num_resamples times and optimizes each resample.
+
+    Returns a dict with 'weights' (the average, re-normalized), 'std', 'p05' and 'p95' of each asset's
+    weight across resamples, 'selection_frequency' (share of resamples holding the asset above 1e-4),
+    'num_resamples' and 'num_failed'. processes=None uses one worker per CPU; 1 runs inline.
+    """
+    if num_resamples < 1:
+        raise ValueError(f"num_resamples must be at least 1, got {num_resamples}.")
+    returns = np.ascontiguousarray(returns, dtype=float)
+    sizes = [chunk_size] * (num_resamples // chunk_size) + ([num_resamples % chunk_size] if num_resamples % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(returns, risk_free_rate_annual, size, chunk_seed, block_size, objective, engine, constraints)
+             for size, chunk_seed in zip(sizes, seeds)]
+
+    processes = min(processes or os.cpu_count() or 1, max(len(tasks), 1))
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            weights = np.vstack(list(pool.map(_optimize_chunk, tasks)))
+    else:
+        weights = np.vstack([_optimize_chunk(task) for task in tasks])
+
+    solved = weights[~np.isnan(weights).any(axis=1)]
+    num_assets = returns.shape[1]
+    if not len(solved):
+        nan = np.full(num_assets, np.nan)
+        return {'weights': nan, 'std': nan, 'p05': nan, 'p95': nan, 'selection_frequency': nan,
+                'num_resamples': num_resamples, 'num_failed': num_resamples}
+    average = solved.mean(axis=0)
+    return {
+        'weights': average / average.sum(),
+        'std': solved.std(axis=0),
+        'p05': np.percentile(solved, 5, axis=0),
+        'p95': np.percentile(solved, 95, axis=0),
+        'selection_frequency': (solved > 1e-4).mean(axis=0),
+        'num_resamples': num_resamples,
+        'num_failed': num_resamples - len(solved),
+    }
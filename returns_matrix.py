@@ -0,0 +1,89 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+# --- Shared Returns Matrix ---
+# A read-only, memory-mapped (dates x tickers) float array with a ticker -> column index and a
+# date index. One instance per data snapshot is shared by every session in the process, and the
+# backing .npy file is reused by other processes, which then share the same OS page cache.
+
+DEFAULT_MATRIX_DIR = os.environ.get("RETURNS_MATRIX_DIR", os.path.join(tempfile.gettempdir(), "portfolio_returns"))
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class ReturnsMatrix:
+    """Daily returns as a read-only array; columns are stored contiguously (Fortran order)."""
+
+    def __init__(self, values, tickers, dates, key=None):
+        self.values = values
+        self.key = key # Snapshot hash, used to key caches derived from this matrix
+        self.tickers = list(tickers)
+        self.dates = pd.DatetimeIndex(dates)
+        self.column_index = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def from_frame(cls, returns_df, directory=DEFAULT_MATRIX_DIR, dtype=np.float64, key=None):
+        """Writes returns_df to a memory-mapped .npy file (once per snapshot) and opens it read-only."""
+        values = np.asfortranarray(returns_df.to_numpy(dtype=dtype))
+        key = key or snapshot_key(returns_df, dtype)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"returns_{key}.npy")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=values.shape, fortran_order=True)
+            out[:] = values
+            out.flush()
+            del out
+            os.replace(tmp_path, path)
+        return cls(np.load(path, mmap_mode="r"), returns_df.columns, returns_df.index, key=key)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def indices(self, tickers):
+        """Integer column positions for the given tickers."""
+        return np.array([self.column_index[t] for t in tickers], dtype=np.intp)
+
+    def select(self, tickers):
+        """
+        Returns the (T x n) block for the given tickers. A single ticker or a run of adjacent
+        columns is a zero-copy view; any other subset gathers only those columns.
+        """
+        idx = self.indices(tickers)
+        if len(idx) and np.array_equal(idx, np.arange(idx[0], idx[0] + len(idx))):
+            return self.values[:, idx[0]:idx[0] + len(idx)]
+        return self.values[:, idx]
+
+    def complete_rows(self, tickers):
+        """Returns (block, dates) restricted to the rows where every selected ticker has a return."""
+        block = self.select(tickers)
+        mask = ~np.isnan(block).any(axis=1)
+        if mask.all():
+            return block, self.dates
+        return block[mask], self.dates[mask]
+
+
+def snapshot_key(returns_df, dtype=np.float64):
+    """Content hash identifying a returns snapshot (tickers, dates, values and dtype)."""
+    digest = hashlib.sha1()
+    digest.update(np.dtype(dtype).str.encode())
+    digest.update("|".join(map(str, returns_df.columns)).encode())
+    digest.update(returns_df.index.asi8.tobytes())
+    digest.update(np.ascontiguousarray(returns_df.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def shared_returns_matrix(returns_df, dtype=np.float64):
+    """Returns the process-wide ReturnsMatrix for this snapshot, building it on first use."""
+    key = snapshot_key(returns_df, dtype)
+    with _registry_lock:
+        matrix = _registry.get(key)
+        if matrix is None:
+            matrix = _registry[key] = ReturnsMatrix.from_frame(returns_df, dtype=dtype, key=key)
+        return matrix
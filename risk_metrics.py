@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from optimization import TRADING_DAYS
+
+# --- Batched Risk Metrics ---
+# Metrics for a (P x n) matrix of portfolio weights over (T x n) daily returns, computed column-wise
+# on the (T x P) portfolio returns of one matrix product. Portfolios are rebalanced daily, as in
+# calculate_portfolio_returns_and_sharpe; annualization matches the apps.
+
+PORTFOLIO_CHUNK_SIZE = 2048 # Bounds the (T x chunk) working arrays
+METRIC_COLUMNS = ['return', 'cagr', 'volatility', 'sharpe', 'sortino', 'max_drawdown', 'calmar', 'var', 'cvar',
+                  'beta', 'tracking_error', 'information_ratio']
+
+
+def allocation_matrix(allocations, tickers):
+    """
+    (P x n) weights for {name: {ticker: weight}} aligned to `tickers`; weights on tickers outside the
+    index are dropped and each row re-normalized, as on the results page. Returns (names, weights).
+    """
+    column = {ticker: i for i, ticker in enumerate(tickers)}
+    names = list(allocations)
+    weights = np.zeros((len(names), len(tickers)))
+    for row, name in enumerate(names):
+        for ticker, weight in allocations[name].items():
+            if ticker in column:
+                weights[row, column[ticker]] = weight
+    totals = weights.sum(axis=1, keepdims=True)
+    return names, np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+
+
+def _max_drawdown(portfolio_returns):
+    growth = np.cumprod(1 + portfolio_returns, axis=0)
+    peaks = np.maximum.accumulate(np.vstack([np.ones(growth.shape[1]), growth]), axis=0)[1:]
+    return (growth / peaks - 1).min(axis=0), growth[-1]
+
+
+def _chunk_metrics(portfolio_returns, risk_free_rate_annual, benchmark_returns, confidence):
+    num_days = len(portfolio_returns)
+    risk_free_rate_daily = (1 + risk_free_rate_annual)**(1 / TRADING_DAYS) - 1
+    mean = portfolio_returns.mean(axis=0)
+    annual_return = (1 + mean)**TRADING_DAYS - 1
+    volatility = portfolio_returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+    downside = np.sqrt(np.mean(np.minimum(portfolio_returns - risk_free_rate_daily, 0.0)**2, axis=0)) * np.sqrt(TRADING_DAYS)
+    max_drawdown, final_growth = _max_drawdown(portfolio_returns)
+    cagr = final_growth**(TRADING_DAYS / num_days) - 1
+
+    # Historical VaR/CVaR as positive daily losses at `confidence`
+    cutoff = max(int(np.floor((1 - confidence) * num_days)), 1)
+    tail = np.partition(portfolio_returns, cutoff - 1, axis=0)[:cutoff]
+    var = -tail.max(axis=0)
+    cvar = -tail.mean(axis=0)
+
+    metrics = {'return': annual_return, 'cagr': cagr, 'volatility': volatility, 'var': var, 'cvar': cvar, 'max_drawdown': max_drawdown}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics['sharpe'] = np.where(volatility > 1e-6, (annual_return - risk_free_rate_annual) / volatility, np.nan)
+        metrics['sortino'] = np.where(downside > 1e-9, (annual_return - risk_free_rate_annual) / downside, np.nan)
+        metrics['calmar'] = np.where(max_drawdown < -1e-9, cagr / -max_drawdown, np.nan)
+        if benchmark_returns is not None:
+            benchmark_centered = benchmark_returns - benchmark_returns.mean()
+            active = portfolio_returns - benchmark_returns[:, None]
+            metrics['beta'] = benchmark_centered @ (portfolio_returns - mean) / (benchmark_centered @ benchmark_centered)
+            metrics['tracking_error'] = active.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+            benchmark_annual = (1 + benchmark_returns.mean())**TRADING_DAYS - 1
+            metrics['information_ratio'] = np.where(metrics['tracking_error'] > 1e-9,
+                                                    (annual_return - benchmark_annual) / metrics['tracking_error'], np.nan)
+    return metrics
+
+
+def risk_metric_suite(weights, returns, risk_free_rate_annual, benchmark_returns=None, confidence=0.95, names=None):
+    """
+    Risk metrics of every row of a (P x n) weights matrix over complete (T x n) daily returns, as a
+    DataFrame with METRIC_COLUMNS: annualized 'return' ((1+mean)**252 - 1) and 'cagr', 'volatility',
+    'sharpe', 'sortino' (downside deviation below the daily risk-free rate), 'max_drawdown' (negative),
+    'calmar' (cagr / |max_drawdown|), daily historical 'var'/'cvar' at `confidence` (positive losses),
+    and 'beta', 'tracking_error', 'information_ratio' against benchmark_returns (T) when given.
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    returns = np.asarray(returns, dtype=float)
+    if benchmark_returns is not None:
+        benchmark_returns = np.asarray(benchmark_returns, dtype=float)
+    columns = {name: np.full(len(weights), np.nan) for name in METRIC_COLUMNS}
+    for chunk in range(0, len(weights), PORTFOLIO_CHUNK_SIZE):
+        rows = slice(chunk, chunk + PORTFOLIO_CHUNK_SIZE)
+        for name, values in _chunk_metrics(returns @ weights[rows].T, risk_free_rate_annual, benchmark_returns, confidence).items():
+            columns[name][rows] = values
+    return pd.DataFrame(columns, index=names)[METRIC_COLUMNS]
+
+
+def risk_metrics_for_allocations(returns_matrix, allocations, risk_free_rate_annual, benchmark=None, confidence=0.95):
+    """
+    risk_metric_suite for {name: {ticker: weight}} allocations over the complete rows of a ReturnsMatrix
+    for every ticker they hold (plus the benchmark ticker), so all portfolios share one window.
+    """
+    tickers = sorted({t for allocation in allocations.values() for t in allocation if t in returns_matrix.column_index})
+    if benchmark is not None and benchmark not in returns_matrix.column_index:
+        benchmark = None
+    block, dates = returns_matrix.complete_rows(tickers + ([benchmark] if benchmark and benchmark not in tickers else []))
+    block = np.asarray(block)
+    names, weights = allocation_matrix(allocations, tickers)
+    benchmark_returns = block[:, (tickers + [benchmark]).index(benchmark)] if benchmark else None
+    metrics = risk_metric_suite(weights, block[:, :len(tickers)], risk_free_rate_annual, benchmark_returns, confidence, names)
+    metrics.attrs['start_date'], metrics.attrs['end_date'] = (dates[0], dates[-1]) if len(dates) else (None, None)
+    return metrics
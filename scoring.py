@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from universes import questions, risk_profiles
+
+# --- Questionnaire Scoring ---
+# Scores questionnaire answers and maps them to the risk_profiles bands, one client at a time (the apps,
+# questionnaire.py) or a whole answer matrix at once. The bulk path looks every answer up in a
+# (questions x options) score table, sums the rows and finds each score's band with searchsorted over
+# the band edges, so a million clients take a few array operations instead of a Python loop.
+
+QUESTION_IDS = sorted(questions)
+OPTION_COUNTS = np.array([len(questions[q]['scores']) for q in QUESTION_IDS])
+SCORE_TABLE = np.zeros((len(QUESTION_IDS), OPTION_COUNTS.max()), dtype=np.int16) # Padded with 0 past each question's options
+for _row, _question_id in enumerate(QUESTION_IDS):
+    SCORE_TABLE[_row, :OPTION_COUNTS[_row]] = questions[_question_id]['scores']
+
+BAND_LOWS = np.array([low for low, _, _, _ in risk_profiles])
+BAND_HIGHS = np.array([high for _, high, _, _ in risk_profiles])
+RISK_LABELS = [label for _, _, label, _ in risk_profiles] + ["Undefined Profile"]
+RISK_LEVELS = np.array([level for _, _, _, level in risk_profiles] + [0])
+UNDEFINED_BAND = len(risk_profiles)
+
+
+def score_answers(answers):
+    """Total questionnaire score of 12 answers given as 0-based option indices, in question order."""
+    if len(answers) != len(questions):
+        raise ValueError(f"Expected {len(questions)} answers, got {len(answers)}.")
+    total_score = 0
+    for question_id, answer in zip(QUESTION_IDS, answers):
+        scores = questions[question_id]['scores']
+        if not 0 <= answer < len(scores):
+            raise ValueError(f"Answer {answer + 1} to question {question_id} is not between 1 and {len(scores)}.")
+        total_score += scores[answer]
+    return total_score
+
+
+def risk_profile(score):
+    """(risk label, risk level) of a total score; ("Undefined Profile", None) outside every band."""
+    for low, high, label, risk_level in risk_profiles:
+        if low <= score <= high:
+            return label, risk_level
+    return "Undefined Profile", None
+
+
+def prefers_optimized(answers):
+    """Whether the client asked for a sustainable portfolio (Q11) or an active strategy (Q12)."""
+    return answers[10] == 0 or answers[11] == 0
+
+
+def score_answer_matrix(answers):
+    """
+    Scores an (N x 12) matrix of 0-based option indices. Returns (scores, valid): rows with an answer
+    outside its question's options are not valid and score 0.
+    """
+    answers = np.asarray(answers)
+    valid = ((answers >= 0) & (answers < OPTION_COUNTS)).all(axis=1)
+    if not valid.all():
+        answers = np.where(valid[:, None], answers, 0)
+    scores = SCORE_TABLE[np.arange(len(QUESTION_IDS)), answers].sum(axis=1, dtype=np.int32)
+    return np.where(valid, scores, 0), valid
+
+
+def risk_bands(scores):
+    """Index into risk_profiles of every score, UNDEFINED_BAND where no band contains it."""
+    scores = np.asarray(scores)
+    bands = np.searchsorted(BAND_LOWS, scores, side='right') - 1
+    inside = (bands >= 0) & (scores <= BAND_HIGHS[np.maximum(bands, 0)])
+    return np.where(inside, bands, UNDEFINED_BAND)
+
+
+def answer_errors(answers):
+    """The score_answers error message of every row of a 0-based answer matrix (None for valid rows)."""
+    answers = np.asarray(answers)
+    invalid = (answers < 0) | (answers >= OPTION_COUNTS)
+    errors = np.full(len(answers), None, dtype=object)
+    for row in np.flatnonzero(invalid.any(axis=1)):
+        column = invalid[row].argmax()
+        errors[row] = f"Answer {answers[row, column] + 1} to question {QUESTION_IDS[column]} is not between 1 and {OPTION_COUNTS[column]}."
+    return errors
+
+
+def score_clients(answers):
+    """
+    Scores a (N x 12) matrix of 0-based option indices. Returns a DataFrame with 'risk_score',
+    'risk_label' (categorical), 'risk_level' (nullable; missing for invalid answers or scores outside every band),
+    'optimized' (prefers_optimized) and 'error' (the score_answers message of invalid rows).
+    """
+    answers = np.asarray(answers)
+    if answers.ndim != 2 or answers.shape[1] != len(QUESTION_IDS):
+        raise ValueError(f"Expected an answer matrix with {len(QUESTION_IDS)} columns, got shape {answers.shape}.")
+    scores, valid = score_answer_matrix(answers)
+    bands = np.where(valid, risk_bands(scores), UNDEFINED_BAND)
+    defined = bands != UNDEFINED_BAND
+    return pd.DataFrame({
+        'risk_score': pd.Series(scores, dtype='Int64').mask(~valid),
+        'risk_label': pd.Categorical.from_codes(np.where(valid, bands, -1), categories=RISK_LABELS),
+        'risk_level': pd.Series(RISK_LEVELS[bands], dtype='Int64').mask(~defined),
+        'optimized': (answers[:, 10] == 0) | (answers[:, 11] == 0),
+        'error': answer_errors(answers),
+    })
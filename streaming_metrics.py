@@ -0,0 +1,136 @@
+import json
+import math
+import os
+import threading
+
+import pandas as pd
+
+from optimization import TRADING_DAYS
+
+# --- Streaming Portfolio Metrics ---
+# Running state per portfolio (Welford mean/variance of daily returns, running growth product and
+# peak for drawdown) so a daily feed updates the results-page metrics in O(1) per new trading day
+# instead of recomputing cumprod/mean/std over the whole history. States persist as one JSON file.
+
+DEFAULT_METRICS_PATH = os.environ.get(
+    "METRICS_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".metrics_store.json")
+)
+
+
+class MetricsAccumulator:
+    """Incremental total/annualized return, Sharpe ratio and max drawdown of one portfolio's daily returns."""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, growth=1.0, peak=1.0, max_drawdown=0.0, first_date=None, last_date=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2 # Sum of squared deviations from the mean
+        self.growth = growth
+        self.peak = peak
+        self.max_drawdown = max_drawdown
+        self.first_date = pd.Timestamp(first_date) if first_date is not None else None
+        self.last_date = pd.Timestamp(last_date) if last_date is not None else None
+
+    def update(self, daily_return, date):
+        """Adds one trading day. Dates must increase; a date already seen is ignored."""
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date <= self.last_date:
+            return False
+        self.count += 1
+        delta = daily_return - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (daily_return - self.mean)
+        self.growth *= 1 + daily_return
+        self.peak = max(self.peak, self.growth)
+        self.max_drawdown = min(self.max_drawdown, self.growth / self.peak - 1)
+        if self.first_date is None:
+            self.first_date = date
+        self.last_date = date
+        return True
+
+    def update_many(self, daily_returns):
+        """Adds the days of a date-indexed Series after last_date; returns how many were new."""
+        if self.last_date is not None:
+            daily_returns = daily_returns[daily_returns.index > self.last_date]
+        for date, daily_return in daily_returns.items():
+            self.update(float(daily_return), date)
+        return len(daily_returns)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float('nan')
+
+    def total_return(self):
+        """Total cumulative return in %."""
+        return (self.growth - 1) * 100
+
+    def annualized_return(self):
+        """Annualized cumulative return in %, over calendar days as on the results page."""
+        time_delta_days = (self.last_date - self.first_date).days if self.count else 0
+        if time_delta_days <= 0:
+            return self.total_return()
+        return (self.growth**(1 / (time_delta_days / 365.25)) - 1) * 100
+
+    def sharpe_ratio(self, risk_free_rate_annual):
+        """(1+mean)**252 - 1 over std * sqrt(252), as on the results page; None when volatility is ~0."""
+        annualized_std = self.std * math.sqrt(TRADING_DAYS)
+        if not annualized_std > 1e-6:
+            return None
+        return ((1 + self.mean)**TRADING_DAYS - 1 - risk_free_rate_annual) / annualized_std
+
+    def metrics(self, risk_free_rate_annual):
+        return {'total_return': self.total_return(), 'annualized_return': self.annualized_return(),
+                'sharpe_ratio': self.sharpe_ratio(risk_free_rate_annual), 'max_drawdown': self.max_drawdown * 100,
+                'growth_indexed': self.growth * 100, 'days': self.count,
+                'last_date': self.last_date.date().isoformat() if self.last_date is not None else None}
+
+    def to_dict(self):
+        state = {k: getattr(self, k) for k in ('count', 'mean', 'm2', 'growth', 'peak', 'max_drawdown')}
+        state['first_date'] = self.first_date.isoformat() if self.first_date is not None else None
+        state['last_date'] = self.last_date.isoformat() if self.last_date is not None else None
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(**state)
+
+
+class MetricsStore:
+    """MetricsAccumulators keyed by portfolio id (e.g. 'fixed:5'), persisted to one JSON file."""
+
+    def __init__(self, path=DEFAULT_METRICS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.accumulators = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return {key: MetricsAccumulator.from_dict(state) for key, state in json.load(f).items()}
+        except (OSError, ValueError, TypeError):
+            return {} # A corrupt file only costs one full recompute
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({key: acc.to_dict() for key, acc in self.accumulators.items()}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        return self.accumulators.setdefault(key, MetricsAccumulator())
+
+    def update(self, key, daily_returns, save=True):
+        """Feeds a portfolio's date-indexed daily returns; only days after its last update are applied."""
+        with self._lock:
+            added = self.get(key).update_many(daily_returns)
+        if added and save:
+            self.save()
+        return added
+
+    def reset(self, key):
+        """Drops a portfolio's state, e.g. after its allocation changed."""
+        with self._lock:
+            self.accumulators.pop(key, None)
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from risk_metrics import allocation_matrix
+
+# --- Historical Stress Scenarios ---
+# Replays historical market episodes against many allocations at once. Each scenario window runs from
+# before the sell-off to well after it, so the drawdown, the trough and the time to get back to the
+# previous peak can all be read off one (T x P) matrix of portfolio growth. Many ETFs postdate the
+# earlier episodes: tickers without a price on the window's first day are left out, the remaining
+# weights are scaled back to 100%, and portfolios with too little of their weight covered are skipped.
+
+STRESS_SCENARIOS = {
+    'gfc_2008': {'label': '2008 Global Financial Crisis', 'start': '2007-10-01', 'end': '2012-12-31'},
+    'covid_2020': {'label': '2020 COVID Crash', 'start': '2020-02-01', 'end': '2021-06-30'},
+    'rate_shock_2022': {'label': '2022 Rate Shock', 'start': '2022-01-01', 'end': '2024-12-31'},
+}
+MAX_MISSING_DAYS = 5 # Business days a window's prices may lack at either end or in between (holidays, market closures)
+STRESS_COLUMNS = ['drawdown', 'peak_date', 'trough_date', 'recovery_date', 'recovery_days', 'total_return', 'coverage', 'missing']
+
+
+def scenario_returns(price_data):
+    """
+    Daily returns of a scenario window's prices. Gaps after a ticker's first price are forward-filled
+    (a zero return); days before it stay NaN, which is how stress_test spots late launches.
+    """
+    price_data = price_data.dropna(axis=1, how='all').sort_index()
+    return price_data.ffill().pct_change().iloc[1:]
+
+
+def window_problems(dates, start_date, end_date, max_missing_days=MAX_MISSING_DAYS):
+    """
+    What is wrong with the dates of a scenario window's prices for [start_date, end_date): no prices,
+    a first or last day more than max_missing_days business days inside the window, or a hole longer
+    than that. Empty when the prices cover the window.
+    """
+    if len(dates) == 0:
+        return ["no prices"]
+    days = pd.DatetimeIndex(dates).sort_values().values.astype('datetime64[D]')
+    start, end = np.datetime64(pd.Timestamp(start_date).date()), np.datetime64(pd.Timestamp(end_date).date())
+    problems = []
+    if np.busday_count(start, days[0]) > max_missing_days:
+        problems.append(f"prices start on {days[0]}")
+    if np.busday_count(days[-1], end) > max_missing_days:
+        problems.append(f"prices end on {days[-1]}")
+    holes = np.flatnonzero(np.busday_count(days[:-1], days[1:]) > max_missing_days)
+    problems += [f"no prices from {days[i]} to {days[i + 1]}" for i in holes]
+    return problems
+
+
+def stress_test(returns_matrix, allocations, min_coverage=0.8):
+    """
+    Replays a scenario's ReturnsMatrix against {name: {ticker: weight}} allocations, daily rebalanced
+    as on the results page. Returns a DataFrame indexed by name with STRESS_COLUMNS: the maximum
+    'drawdown' (negative) with its 'peak_date' and 'trough_date', the 'recovery_date' and
+    'recovery_days' (trading days from trough back to the peak; NaT/NaN if it never got there), the
+    window's 'total_return', the 'coverage' (share of the weight that existed) and the 'missing' tickers.
+    """
+    tickers = sorted({t for allocation in allocations.values() for t in allocation})
+    names, weights = allocation_matrix(allocations, tickers)
+    present = [i for i, t in enumerate(tickers) if t in returns_matrix.column_index]
+    returns = np.full((len(returns_matrix), len(tickers)), np.nan)
+    returns[:, present] = returns_matrix.select([tickers[i] for i in present])
+    available = ~np.isnan(returns[0]) if len(returns) else np.zeros(len(tickers), dtype=bool)
+
+    covered = weights * available
+    coverage = covered.sum(axis=1)
+    usable = coverage >= min_coverage
+    covered[usable] /= coverage[usable, None]
+    growth = np.cumprod(1 + np.nan_to_num(returns) @ covered[usable].T, axis=0) # (T x usable)
+
+    dates = returns_matrix.dates
+    peaks = np.maximum.accumulate(np.vstack([np.ones(growth.shape[1]), growth]), axis=0)[1:]
+    drawdowns = growth / peaks - 1
+    trough = drawdowns.argmin(axis=0)
+    columns = np.arange(growth.shape[1])
+    peak_value = peaks[trough, columns]
+    before_trough = np.arange(len(growth))[:, None] <= trough
+    peak = np.where(before_trough & (growth >= peak_value), np.arange(len(growth))[:, None], -1).max(axis=0)
+    recovered = (~before_trough) & (growth >= peak_value)
+    fell = drawdowns[trough, columns] < 0
+    has_recovered = recovered.any(axis=0) | ~fell
+    recovery = np.where(fell, recovered.argmax(axis=0), trough)
+
+    rows = np.flatnonzero(usable)
+    table = {column: np.full(len(names), np.nan) for column in ('drawdown', 'recovery_days', 'total_return')}
+    table.update({column: np.full(len(names), np.datetime64('NaT'), dtype='datetime64[ns]')
+                  for column in ('peak_date', 'trough_date', 'recovery_date')})
+    if len(growth):
+        table['drawdown'][rows] = drawdowns[trough, columns]
+        table['peak_date'][rows] = dates[np.maximum(peak, 0)]
+        table['trough_date'][rows] = dates[trough]
+        table['recovery_date'][rows[has_recovered]] = dates[recovery[has_recovered]]
+        table['recovery_days'][rows] = np.where(has_recovered, recovery - trough, np.nan)
+        table['total_return'][rows] = growth[-1] - 1
+    table['coverage'] = coverage
+    table['missing'] = [', '.join(t for t, w, a in zip(tickers, row, available) if w > 0 and not a) for row in weights]
+    return pd.DataFrame(table, index=names)[STRESS_COLUMNS]
+
+
+def stress_test_scenarios(scenario_matrices, allocations, min_coverage=0.8):
+    """stress_test for every {scenario: ReturnsMatrix or None}, concatenated with 'scenario' as the first index level."""
+    tables = {scenario: stress_test(returns_matrix, allocations, min_coverage)
+              for scenario, returns_matrix in scenario_matrices.items() if returns_matrix is not None and len(returns_matrix)}
+    if not tables:
+        return pd.DataFrame(columns=STRESS_COLUMNS)
+    return pd.concat(tables, names=['scenario'])
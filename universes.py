@@ -0,0 +1,230 @@
+from datetime import date
+
+from price_providers import RISK_FREE_TICKER
+
+# --- Recommendation Configuration ---
+# Static data behind a recommendation, shared by the Streamlit apps, the batch CLI and anything else
+# that imports recommendation.py: the questionnaire and its score bands, the fixed and optimizable portfolios
+# of each universe ('conventional' for app.py, 'esg' for app-FINAL.py), the optimization settings and the
+# results page's settings. Everything here is built once per process, on import, not on every Streamlit rerun.
+
+# --- Risk Questionnaire Definitions ---
+questions = {
+    1: {"question": "How old are you?", "options": ["Over 60", "45-60", "30-44", "Under 30"], "scores": [1, 2, 3, 4]},
+    2: {"question": "What is your investment experience?", "options": ["I don’t have any experience", "I have some experience", "I have a strong educational background in a related field", "I’m an experienced investor"], "scores": [1, 2, 3, 4]},
+    3: {"question": "What is an ETF?", "options": ["I don’t know", "A diversified investment fund that only trades commodities", "A diversified, index-tracking investment fund that does not trade on exchanges", "A diversified, index-tracking investment fund that trades on exchanges"], "scores": [1, 2, 3, 4]},
+    4: {"question": "Main goal of your investment", "options": ["Capital preservation", "Conservative investment", "General investment", "Capital growth"], "scores": [1, 2, 3, 4]},
+    5: {"question": "What is your investment horizon?", "options": ["<5 years", "5-10 years", "10-15 years", ">15 years"], "scores": [1, 2, 3, 4]},
+    6: {"question": "Do you prefer guaranteed small gains or potential big gains with risk?", "options": ["Guarantees only", "Smaller gains and contained risk", "Moderate gain and moderate risk", "Big gains with high risk"], "scores": [1, 2, 3, 4]},
+    7: {"question": "What is your tolerance of market swings?", "options": ["Low", "Medium-low", "Medium-high", "High"], "scores": [1, 2, 3, 4]},
+    8: {"question": "Do you prefer a strategy that:", "options": ["It is able to provide reassurance during high volatile market periods", "It is aligned with Stock market Performance", "It is aligned with Bond market Performance", "Tries to beat the market"], "scores": [1, 2, 3, 4]},
+    9: {"question": "What’s the worst-case decline you’re comfortable seeing in 1 year?", "options": ["Less than 10%", "10-20%", "20-30%", "More than 30%"], "scores": [1, 2, 3, 4]},
+    10: {"question": "What would you do if you hear the market is down 20%?", "options": ["I sell a majority of my financial assets", "I sell a minority of my financial assets", "I maintain my position", "I buy more"], "scores": [1, 2, 3, 4]},
+    11: {"question": "Do you have any preference for ESG (environmental, social, governance) investments?", "options": ["Yes, I want a portfolio with sustainable investments", "No, I don’t take the sustainable factor into consideration"], "scores": [4, 1]},
+    12: {"question": "Do you have any preference for the investment strategy of your Roboadvisor?", "options": ["Yes, I want an active strategy", "No, I want a passive strategy"], "scores": [4, 1]}
+}
+
+# Total score bands (inclusive) -> (risk label, risk level)
+risk_profiles = [
+    (10, 11, "Ultra Conservative", 2),
+    (12, 14, "Conservative", 3),
+    (15, 19, "Cautiously Moderate", 4),
+    (20, 24, "Moderate", 5),
+    (25, 29, "Moderate Growth", 6),
+    (30, 34, "Growth", 7),
+    (35, 38, "Opportunistic", 8),
+    (39, 40, "Aggressive Growth", 9),
+]
+
+# --- Risk Level Recommendations ---
+risk_level_recommendations = {
+    "Ultra Conservative": {
+        "title": "Your Ultra-Conservative Portfolio",
+        "text": "This portfolio prioritizes capital preservation above all else. It's designed for investors who are highly risk-averse and seek minimal exposure to market volatility. Expect modest returns, but with strong protection against significant downturns. Consider this if capital security is your top priority."
+    },
+    "Conservative": {
+        "title": "Your Conservative Portfolio",
+        "text": "This portfolio focuses on capital protection while aiming for stable, consistent returns. It's suitable if you have a low tolerance for market fluctuations and prefer slow, steady growth over aggressive gains. Ideal for those who value stability and predictable income."
+    },
+    "Cautiously Moderate": {
+        "title": "Your Cautiously Moderate Portfolio",
+        "text": "This portfolio seeks a balance between capital preservation and moderate growth. You're willing to take on a small amount of risk to potentially outperform traditional fixed-income investments, but significant market swings are still a concern. It's a prudent choice for measured growth."
+    },
+    "Moderate": {
+        "title": "Your Moderate Portfolio",
+        "text": "This portfolio is built for balanced growth with an acceptable level of risk. You are comfortable with some market fluctuations, understanding they are part of achieving long-term capital appreciation. This strategy aims to provide a healthy mix of stability and growth potential."
+    },
+    "Moderate Growth": {
+        "title": "Your Moderate Growth Portfolio",
+        "text": "This portfolio is designed for investors seeking substantial long-term capital growth and are prepared to accept a moderate to higher level of risk. Short-term market volatility is acceptable, as your focus remains on maximizing growth opportunities over time."
+    },
+    "Growth": {
+        "title": "Your Growth Portfolio",
+        "text": "This portfolio is focused on maximizing capital appreciation over the long term. You possess a higher risk tolerance and are comfortable with notable market fluctuations as a means to pursue strong returns. This strategy is for those prioritizing aggressive wealth accumulation."
+    },
+    "Opportunistic": {
+        "title": "Your Opportunistic Portfolio",
+        "text": "This portfolio actively seeks out investment opportunities with high return potential. You have a significant appetite for risk and are prepared for substantial market volatility and potential drawdowns. This strategy suits investors with a long-term horizon and a strong belief in market recovery."
+    },
+    "Aggressive Growth": {
+        "title": "Your Aggressive Growth Portfolio",
+        "text": "This represents the highest level of risk tolerance. Your primary goal is maximum capital growth, and you are comfortable with the highest possible level of market volatility and potential for large swings. This strategy is best for investors with an extremely high risk tolerance and a very long investment horizon."
+    }
+}
+
+# Historical window the recommendations are evaluated on
+analysis_start_date = date(2023, 1, 1)
+analysis_end_date = date(2024, 12, 31)
+
+# --- Portfolio Universes ---
+# portfolio_data_fixed is used unless the client prefers ESG (Q11) or an active strategy (Q12), in which
+# case the risk level's risk_level_assets_optimized are optimized; etf_to_category maps ETFs to the
+# categories used for plotting and for the category constraints
+universes = {
+    'conventional': {
+        'portfolio_data_fixed': {
+            2: {
+                'category_allocation': {'Bond': 1.00, 'Equity': 0.00, 'Real Estate': 0.00, 'Crypto': 0.00},
+                'specific_etf_allocation': {'SHY': 0.5 ,'AGG': 0.4 ,'BOND': 0.1} # Changed BOND to BND
+            },
+            3: {
+                'category_allocation': {'Bond': 1.0, 'Equity': 0.0, 'Real Estate': 0.00, 'Crypto': 0.00},
+                'specific_etf_allocation': {'SHY': 0.5 ,'AGG': 0.25 ,'BOND': 0.25} # Changed BOND to BND
+            },
+            4: {
+                'category_allocation': {'Bond': 0.85, 'Equity': 0.15, 'Real Estate': 0.00, 'Crypto': 0.00},
+                'specific_etf_allocation': {'SHY': 0.4306 ,'AGG': 0.085 ,'BOND': 0.3419, 'VTI':0.015 , 'SPLG': 0.0525, 'VOO': 0.075} # Changed BOND to BND
+            },
+            5: {
+                'category_allocation': {'Bond': 0.75, 'Equity': 0.25, 'Real Estate': 0.00,'Crypto': 0.00},
+                'specific_etf_allocation': {'SHY': 0.3081 ,'AGG': 0.0705 ,'BOND': 0.3719, 'VTI':0.0375 , 'SPLG':0.145, 'VOO': 0.0625} # Changed BOND to BND
+            },
+            6: {
+                'category_allocation': {'Bond': 0.60, 'Equity': 0.40, 'Real Estate': 0.00, 'Crypto': 0.00},
+                'specific_etf_allocation': {'AGG': 0.3085 ,'BOND': 0.3085, 'VTI':0.1415 , 'SPLG':0.1415 , 'VOO':0.2415} # Changed BOND to BND, removed SHY (as it was 0 anyway)
+            },
+            7: {
+                'category_allocation': {'Bond': 0.00, 'Equity': 0.90, 'Real Estate': 0.10,'Crypto': 0.00},
+                'specific_etf_allocation': {'VTI':0.21 , 'SPLG':0.2422 , 'VOO':0.4522, 'XLRE':0.0478 ,'SCHH':0.0478 }
+            },
+            8: {
+                'category_allocation': {'Bond': 0.0, 'Equity': 0.7, 'Real Estate': 0.30,'Crypto': 0.00},
+                'specific_etf_allocation': {'VTI': 0.2822, 'SPLG': 0.1422 , 'VOO': 0.2822, 'XLRE':0.1467 ,'SCHH':0.1467}
+            },
+            9: {
+                'category_allocation': {'Bond': 0.00, 'Equity': 0.65, 'Real Estate': 0.3, 'Crypto': 0.05},
+                'specific_etf_allocation': {'VTI': 0.195, 'SPLG':0.13 , 'VOO': 0.325, 'XLRE':0.195 ,'SCHH':0.105, 'GBTC': 0.05}
+            },
+        },
+        'risk_level_assets_optimized': {
+            2: ['SHY','AGG','BOND',],
+            3: ['SHY','AGG','BOND',],
+            4: ['SHY','AGG','BOND','SPLG','VOO'],
+            5: ['SHY','AGG','BOND','VTI','SPLG','VOO'],
+            6: ['AGG','BOND','VTI','SPLG','VOO'],
+            7: ['VTI','SPLG','VOO','XLRE','SCHH'],
+            8: ['VTI','SPLG','VOO','XLRE','SCHH'],
+            9: ['VTI','SPLG','VOO','XLRE','SCHH','GBTC']
+        },
+        'etf_to_category': {
+            'SHY': 'Bond', 'AGG': 'Bond', 'BOND': 'Bond',
+            'VTI': 'Equity', 'SPLG': 'Equity', 'VOO': 'Equity',
+            'XLRE': 'Real Estate', 'SCHH': 'Real Estate', 'GBTC':'Crypto'
+        },
+        'benchmark_etf': 'VTI', # For beta, tracking error and information ratio in the risk metrics
+    },
+    'esg': {
+        'portfolio_data_fixed': {
+            2: {
+                'category_allocation': {'Bond': 1.00, 'Equity': 0.00, 'Real Estate': 0.00},
+                'specific_etf_allocation': {'SUSB': 0.45, 'EAGG': 0.41, 'VCEB': 0.14}
+            },
+            3: {
+                'category_allocation': {'Bond': 1.0, 'Equity': 0.0, 'Real Estate': 0.00},
+                'specific_etf_allocation': {'SUSB': 0.5, 'EAGG': 0.36, 'VCEB': 0.14}
+            },
+            4: {
+                'category_allocation': {'Bond': 0.89, 'Equity': 0.11, 'Real Estate': 0.00},
+                'specific_etf_allocation': {'SUSB': 0.4493, 'EAGG': 0.1902, 'VCEB': 0.2591, 'ESGV': 0.0507, 'USSG': 0.0507}
+            },
+            5: {
+                'category_allocation': {'Bond': 0.75, 'Equity': 0.25, 'Real Estate': 0.00},
+                'specific_etf_allocation': {'SUSB': 0.133, 'EAGG': 0.133, 'VCEB': 0.134, 'ESGV': 0.30, 'USSG': 0.30}
+            },
+            6: {
+                'category_allocation': {'Bond': 0.63, 'Equity': 0.37, 'Real Estate': 0.00},
+                'specific_etf_allocation': {'SUSB': 0.061 ,'EAGG': 0.3764, 'VCEB': 0.19, 'USSG': 0.1863, 'ESGU': 0.1863}
+            },
+            7: {
+                'category_allocation': {'Bond': 0.00, 'Equity': 1.0, 'Real Estate': 0.0},
+                'specific_etf_allocation': {'ESGV': 0.1, 'USSG': 0.55, 'ESGU': 0.35}
+            },
+            8: {
+                'category_allocation': {'Bond': 0.00, 'Equity': 0.61, 'Real Estate': 0.39},
+                'specific_etf_allocation': {'ESGV': 0.2535, 'USSG': 0.2265, 'ESGU': 0.2335, 'GRES':0.1365, 'NURE':0.15}
+            },
+            9: {
+                'category_allocation': {'Bond': 0.00, 'Equity': 0.90, 'Real Estate': 0.10, 'Cash': 0.00},
+                'specific_etf_allocation': {'ESGV': 0.3353, 'USSG': 0.3353, 'ESGU': 0.30, 'GRES':0.1647, 'NURE':0.1647}
+            },
+        },
+        'risk_level_assets_optimized': {
+            2: ['SUSB','EAGG','VCEB'],
+            3: ['SUSB','EAGG','VCEB'],
+            4: ['SUSB','EAGG','VCEB','ESGV','USSG','ESGU'],
+            5: ['SUSB','EAGG','VCEB','ESGV','USSG','ESGU'],
+            6: ['SUSB', 'EAGG', 'ESGV', 'USSG', 'ESGU'],
+            7: ['ESGV','USSG','ESGU'],
+            8: ['ESGV','USSG','ESGU','GRES','NURE'],
+            9: ['ESGV','USSG','ESGU','GRES','NURE']
+        },
+        'etf_to_category': {
+            'SUSB': 'Bond', 'EAGG': 'Bond', 'VCEB': 'Bond',
+            'ESGV': 'Equity', 'USSG': 'Equity', 'ESGU': 'Equity', 'VOO': 'Equity', 'IBIT': 'Equity',
+            'XLRE': 'Real Estate', 'SCHH': 'Real Estate', 'GRES': 'Real Estate', 'NURE': 'Real Estate',
+        },
+        'benchmark_etf': 'ESGV', # For beta, tracking error and information ratio in the risk metrics
+    },
+}
+
+# Every ticker a universe downloads: its fixed and optimizable portfolios, its benchmark and the risk-free rate
+universe_download_tickers = {
+    name: sorted(set(
+        [etf for portfolio in data['portfolio_data_fixed'].values() for etf in portfolio['specific_etf_allocation']] +
+        [etf for tickers in data['risk_level_assets_optimized'].values() for etf in tickers] +
+        [data['benchmark_etf'], RISK_FREE_TICKER]
+    ))
+    for name, data in universes.items()
+}
+
+# Constraints on the optimized portfolios (None disables one): each category stays within
+# +/- category_tolerance of the fixed portfolio's category_allocation for the same risk level,
+# no asset exceeds max_asset_weight, and turnover against the fixed portfolio stays below max_turnover
+optimization_constraints = {'category_tolerance': 0.10, 'max_asset_weight': None, 'max_turnover': None}
+
+# Objective per risk level for the optimized portfolios (see objectives.OBJECTIVES); levels not listed
+# use 'max_sharpe'. E.g. {2: 'min_variance', 3: 'risk_parity', 4: 'risk_parity', 9: 'min_cvar'}
+risk_level_objectives = {}
+
+# Resampled optimization: num_resamples > 0 averages the optimized weights over that many bootstrap
+# resamples of the returns (seeded, so reruns agree) and shows how much each weight varies
+resampling_settings = {'num_resamples': 0, 'seed': 0}
+
+# --- Results Page Settings ---
+# Walk-forward backtest of the optimized portfolios: re-optimize every `step` trading days on the
+# previous `window` days (or all days since history_start when expanding) and hold until the next rebalance
+walk_forward_settings = {'history_start': date(2015, 1, 1), 'window': 252, 'step': 21, 'expanding': False}
+
+# Rebalancing policies compared on the results page, net of a proportional cost on every trade
+rebalancing_settings = {'cost_rate': 0.001, 'threshold_band': 0.05}
+
+# Monte Carlo wealth projection on the results page: 'gbm' simulates the portfolio's daily mean and
+# variance, 'bootstrap' resamples its historical daily returns in blocks of block_size trading days
+projection_settings = {'method': 'gbm', 'num_paths': 20_000, 'block_size': 21, 'seed': 0}
+
+# Projection horizon in years for each answer to the investment horizon question (Q5)
+investment_horizon_years = {0: 5, 1: 10, 2: 15, 3: 30}
+
+# Historical episodes replayed against every portfolio (see stress_scenarios.STRESS_SCENARIOS); a
+# portfolio is skipped in a scenario when ETFs covering less than min_coverage of it existed back then
+stress_test_settings = {'scenarios': ['gfc_2008', 'covid_2020', 'rate_shock_2022'], 'min_coverage': 0.8}